@@ -3,29 +3,91 @@ APP_VERSION = "v1.0 (stable)"
 APP_YEAR = "2025"
 APP_AUTHOR = "А. Бисеналин"
 
+import time
+
+# Отметки времени запуска (см. --profile-startup)
+STARTUP_T0 = time.perf_counter()
+STARTUP_TIMINGS = []
+
+import argparse
+import multiprocessing
 import threading
 import webbrowser
-import tkinter as tk
-from werkzeug.serving import make_server
+from werkzeug.exceptions import HTTPException
+from werkzeug.serving import BaseWSGIServer
 import os
+import pathlib
 import sys
 import base64
+import calendar
+import codecs
+import csv
+import gzip
 import hashlib
+import heapq
+import io
+import json
+import sqlite3
+import pickle
+import re
+import shutil
+import tempfile
+import zipfile
+from urllib.parse import urlsplit, urlunsplit
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache, wraps
 from io import BytesIO
-from datetime import datetime, timedelta
-
-import qrcode
-from openpyxl import Workbook
-
-from flask import Flask, render_template, request, redirect, url_for, send_file
+from itertools import islice
+from types import SimpleNamespace
+from datetime import date, datetime, timedelta, timezone
+
+from flask import (
+    Flask, Response, abort, g, has_app_context, jsonify, make_response,
+    render_template, request, redirect, url_for, send_file, stream_template,
+    stream_with_context,
+)
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import delete, event, insert, tuple_, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateIndex, CreateTable
+from sqlalchemy.orm import Session, aliased, joinedload
 
 import logging
 from logging.handlers import RotatingFileHandler
 
+# qrcode (с PIL) и openpyxl тяжёлые и нужны только свидетельствам и Excel,
+# поэтому импортируются внутри соответствующих функций
+
+
+def startup_mark(label):
+    STARTUP_TIMINGS.append((label, time.perf_counter()))
+
 
-# Папка, где лежит exe/скрипт (для portable-версии)
-BASE_DIR = os.path.dirname(os.path.abspath(sys.argv[0]))
+def print_startup_report():
+    print("Время запуска:")
+    prev = STARTUP_T0
+    for label, moment in STARTUP_TIMINGS:
+        print(f"  {label:<32} {(moment - prev) * 1000:8.1f} мс")
+        prev = moment
+    print(f"  {'итого':<32} {(prev - STARTUP_T0) * 1000:8.1f} мс")
+
+
+startup_mark("импорт модулей")
+
+
+# Папка, где лежит exe/скрипт (для portable-версии): шаблоны и статика
+if getattr(sys, "frozen", False):
+    BASE_DIR = os.path.dirname(os.path.abspath(sys.executable))
+else:
+    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Папка данных: БД, журналы, кэши, выгрузки, архивы и резервные копии.
+# По умолчанию — рядом с программой; HYGIENE_DATA_DIR — другая папка
+# (замеры, тесты), чтобы не засорять каталог программы.
+DATA_DIR = os.environ.get("HYGIENE_DATA_DIR") or BASE_DIR
+os.makedirs(DATA_DIR, exist_ok=True)
 
 app = Flask(
     __name__,
@@ -33,11 +95,69 @@ app = Flask(
     static_folder=os.path.join(BASE_DIR, "static"),
 )
 
-# БД рядом с exe (portable)
-db_path = os.path.join(BASE_DIR, "hygiene.db")
+# БД рядом с exe (portable); HYGIENE_DB — другой файл (например, для замеров)
+db_path = os.environ.get("HYGIENE_DB") or os.path.join(DATA_DIR, "hygiene.db")
 app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{db_path}"
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
+# Профиль SQLite: PRAGMA, выполняемые на каждом новом соединении.
+# WAL позволяет читать БД с других рабочих мест, пока идёт запись.
+# Любой параметр можно переопределить переменной окружения
+# HYGIENE_SQLITE_<ИМЯ>, например HYGIENE_SQLITE_SYNCHRONOUS=FULL.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",          # в режиме WAL безопасно и быстрее FULL
+    "cache_size": -16000,             # ~16 МБ кэша страниц (в КиБ со знаком минус)
+    "mmap_size": 128 * 1024 * 1024,   # 128 МБ
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,             # мс ожидания блокировки вместо ошибки
+    "foreign_keys": "ON",             # ON DELETE CASCADE выполняет сама БД
+}
+for _name in SQLITE_PRAGMAS:
+    _value = os.environ.get(f"HYGIENE_SQLITE_{_name.upper()}")
+    if _value:
+        SQLITE_PRAGMAS[_name] = _value
+app.config["SQLITE_PRAGMAS"] = SQLITE_PRAGMAS
+
+# Пул соединений: по соединению на одновременно обрабатываемый запрос
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+    "pool_size": int(os.environ.get("HYGIENE_DB_POOL_SIZE", 8)),
+    "max_overflow": int(os.environ.get("HYGIENE_DB_MAX_OVERFLOW", 4)),
+    "pool_timeout": 30,
+    "pool_recycle": 3600,
+    "connect_args": {
+        "timeout": int(SQLITE_PRAGMAS["busy_timeout"]) / 1000,
+    },
+}
+
+
+@event.listens_for(Engine, "connect")
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in app.config["SQLITE_PRAGMAS"].items():
+        cursor.execute(f"PRAGMA {name} = {value}")
+    cursor.close()
+
+
+def register_sqlite_functions(dbapi_connection):
+    # control_hash() заполняет trainings.control_hash (см. fill_control_hashes)
+    dbapi_connection.create_function(
+        "control_hash", 4, _control_hash, deterministic=True
+    )
+    # exam_percent() — то же округление, что и в формах, для пересчёта в SQL
+    dbapi_connection.create_function(
+        "exam_percent", 2, calc_exam_percent, deterministic=True
+    )
+
+
+@event.listens_for(Engine, "connect")
+def register_engine_functions(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        register_sqlite_functions(dbapi_connection)
+
+
 db = SQLAlchemy(app)
 
 # Секрет для генерации контрольного кода (держать в секрете, можно поменять)
@@ -47,7 +167,7 @@ SECRET_KEY = "POL2KST-SECRET-2025"
 # ----------------- ЛОГ ФАЙЛ ------------------
 
 
-LOG_PATH = os.path.join(BASE_DIR, "error.log")
+LOG_PATH = os.path.join(DATA_DIR, "error.log")
 
 handler = RotatingFileHandler(
     LOG_PATH,
@@ -71,10 +191,186 @@ app.logger.setLevel(logging.ERROR)
 
 @app.errorhandler(Exception)
 def handle_exception(e):
+    # 400/404 и т.п. — штатные ответы, а не внутренние ошибки
+    if isinstance(e, HTTPException):
+        return e
     app.logger.error("Unhandled exception", exc_info=e)
     return "Произошла внутренняя ошибка. Обратитесь к администратору.", 500
 
 
+# ------------- ЗАМЕРЫ ЗАПРОСОВ --------------
+
+
+# Границы корзин гистограммы времени ответа, секунды
+REQUEST_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Запросы дольше этого (секунды) пишутся в slow.log вместе с SQL
+SLOW_REQUEST_SECONDS = float(os.environ.get("HYGIENE_SLOW_REQUEST_SECONDS", 1.0))
+SLOW_LOG_MAX_STATEMENTS = 10
+
+SLOW_LOG_PATH = os.path.join(DATA_DIR, "slow.log")
+
+perf_logger = logging.getLogger("hygiene.perf")
+perf_logger.setLevel(logging.WARNING)
+perf_logger.propagate = False
+_perf_handler = RotatingFileHandler(
+    SLOW_LOG_PATH,
+    maxBytes=2 * 1024 * 1024,
+    backupCount=3,
+    encoding="utf-8",
+    delay=True,
+)
+_perf_handler.setFormatter(formatter)
+perf_logger.addHandler(_perf_handler)
+
+
+class RequestMetrics:
+    """SQL одного запроса: число команд, суммарное время и сами команды."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.statements = []
+
+    def add_statement(self, statement, seconds):
+        self.sql_count += 1
+        self.sql_seconds += seconds
+        self.statements.append((seconds, statement))
+
+
+class MetricsRegistry:
+    """Накопленные по эндпоинтам счётчики для /metrics."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def observe(self, endpoint, seconds, metrics: RequestMetrics, slow):
+        with self._lock:
+            item = self._endpoints.get(endpoint)
+            if item is None:
+                item = self._endpoints[endpoint] = {
+                    "buckets": [0] * len(self.buckets),
+                    "count": 0,
+                    "sum": 0.0,
+                    "sql_count": 0,
+                    "sql_seconds": 0.0,
+                    "slow": 0,
+                }
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    item["buckets"][i] += 1
+            item["count"] += 1
+            item["sum"] += seconds
+            item["sql_count"] += metrics.sql_count
+            item["sql_seconds"] += metrics.sql_seconds
+            item["slow"] += int(slow)
+
+    def prometheus_text(self) -> str:
+        with self._lock:
+            endpoints = {k: dict(v, buckets=list(v["buckets"])) for k, v in self._endpoints.items()}
+
+        lines = [
+            "# HELP hygiene_request_duration_seconds Время обработки запроса.",
+            "# TYPE hygiene_request_duration_seconds histogram",
+        ]
+        for endpoint, item in sorted(endpoints.items()):
+            label = f'endpoint="{endpoint}"'
+            for bound, count in zip(self.buckets, item["buckets"]):
+                lines.append(
+                    f'hygiene_request_duration_seconds_bucket{{{label},le="{bound}"}} {count}'
+                )
+            lines.append(
+                f'hygiene_request_duration_seconds_bucket{{{label},le="+Inf"}} {item["count"]}'
+            )
+            lines.append(f"hygiene_request_duration_seconds_sum{{{label}}} {item['sum']:.6f}")
+            lines.append(f"hygiene_request_duration_seconds_count{{{label}}} {item['count']}")
+
+        counters = [
+            ("hygiene_sql_statements_total", "Число SQL-команд.", "sql_count", "{}"),
+            ("hygiene_sql_seconds_total", "Суммарное время SQL, секунды.", "sql_seconds", "{:.6f}"),
+            ("hygiene_slow_requests_total", "Число медленных запросов.", "slow", "{}"),
+        ]
+        for name, help_text, key, fmt in counters:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for endpoint, item in sorted(endpoints.items()):
+                lines.append(f'{name}{{endpoint="{endpoint}"}} {fmt.format(item[key])}')
+
+        return "\n".join(lines) + "\n"
+
+
+metrics_registry = MetricsRegistry(REQUEST_LATENCY_BUCKETS)
+
+
+# Время старта хранится в контексте выполнения команды: он свой у каждой
+# команды и исчезает вместе с ней, даже если команда завершилась ошибкой
+@event.listens_for(Engine, "before_cursor_execute")
+def sql_timer_start(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.query_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def sql_timer_stop(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "query_started", None)
+    if started is not None and has_app_context():
+        metrics = g.get("request_metrics")
+        if metrics is not None:
+            metrics.add_statement(statement, time.perf_counter() - started)
+
+
+@app.before_request
+def start_request_metrics():
+    g.request_metrics = RequestMetrics()
+
+
+@app.after_request
+def finish_request_metrics(response):
+    metrics = g.get("request_metrics")
+    if metrics is None or request.endpoint == "metrics":
+        return response
+
+    endpoint = request.endpoint or "unknown"
+    path = request.full_path.rstrip("?")
+    method = request.method
+
+    def record():
+        seconds = time.perf_counter() - metrics.started
+        slow = seconds >= SLOW_REQUEST_SECONDS
+        metrics_registry.observe(endpoint, seconds, metrics, slow)
+        if slow:
+            top = sorted(metrics.statements, key=lambda item: item[0], reverse=True)
+            queries = "\n".join(
+                f"    {sql_seconds * 1000:.1f} мс: {' '.join(statement.split())}"
+                for sql_seconds, statement in top[:SLOW_LOG_MAX_STATEMENTS]
+            )
+            perf_logger.warning(
+                "Медленный запрос %s %s -> %s: %.3f с, SQL: %d команд, %.3f с\n%s",
+                method, path, response.status_code, seconds,
+                metrics.sql_count, metrics.sql_seconds, queries,
+            )
+
+    # Потоковые ответы (журнал) формируются уже после after_request,
+    # поэтому для них время фиксируется при закрытии ответа. Файлы
+    # (send_file) к этому моменту уже готовы и отдаются напрямую.
+    if response.is_streamed and not response.direct_passthrough:
+        response.call_on_close(record)
+    else:
+        record()
+    return response
+
+
+@app.route("/metrics")
+def metrics():
+    return Response(
+        metrics_registry.prometheus_text(),
+        mimetype="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
 # ----------------- МОДЕЛИ БД -----------------
 
 
@@ -87,10 +383,31 @@ class Program(db.Model):
     theory_hours = db.Column(db.Integer, nullable=True)       # часы теории
     exam_hours = db.Column(db.Integer, nullable=True)         # часы экзамена
 
+    # Для синхронизации между установками; заполняются триггерами БД
+    uuid = db.Column(db.String(32), nullable=True)            # постоянный ID записи
+    updated_at = db.Column(db.String(23), nullable=True)      # UTC, ГГГГ-ММ-ДД чч:мм:сс.ссс
+    sync_seq = db.Column(db.Integer, nullable=True)           # номер локального изменения
+    sync_origin = db.Column(db.String(32), nullable=True)     # установка-источник; NULL — эта
+
+    # Дочерние строки удаляет БД (ON DELETE CASCADE), без загрузки в память
     trainings = db.relationship(
         "Training",
         back_populates="program",
         cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
+    scoring_policy = db.relationship(
+        "ScoringPolicy",
+        back_populates="program",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+        uselist=False,
+    )
+
+    __table_args__ = (
+        db.Index("ix_programs_name", "name"),
+        db.Index("ix_programs_uuid", "uuid", unique=True),
+        db.Index("ix_programs_sync_seq", "sync_seq"),
     )
 
 
@@ -108,10 +425,24 @@ class Participant(db.Model):
     position = db.Column(db.String(255), nullable=True)       # должность
     activity_type = db.Column(db.String(255), nullable=True)  # вид деятельности/услуг
 
+    # Для синхронизации между установками; заполняются триггерами БД
+    uuid = db.Column(db.String(32), nullable=True)            # постоянный ID записи
+    updated_at = db.Column(db.String(23), nullable=True)      # UTC, ГГГГ-ММ-ДД чч:мм:сс.ссс
+    sync_seq = db.Column(db.Integer, nullable=True)           # номер локального изменения
+    sync_origin = db.Column(db.String(32), nullable=True)     # установка-источник; NULL — эта
+
     trainings = db.relationship(
         "Training",
         back_populates="participant",
         cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
+
+    __table_args__ = (
+        db.Index("ix_participants_full_name_id", "full_name", "id"),
+        db.Index("ix_participants_iin", "iin"),
+        db.Index("ix_participants_uuid", "uuid", unique=True),
+        db.Index("ix_participants_sync_seq", "sync_seq"),
     )
 
 
@@ -119,8 +450,12 @@ class Training(db.Model):
     __tablename__ = "trainings"
 
     id = db.Column(db.Integer, primary_key=True)
-    participant_id = db.Column(db.Integer, db.ForeignKey("participants.id"), nullable=False)
-    program_id = db.Column(db.Integer, db.ForeignKey("programs.id"), nullable=False)
+    participant_id = db.Column(
+        db.Integer, db.ForeignKey("participants.id", ondelete="CASCADE"), nullable=False
+    )
+    program_id = db.Column(
+        db.Integer, db.ForeignKey("programs.id", ondelete="CASCADE"), nullable=False
+    )
 
     training_start_date = db.Column(db.Date, nullable=True)
     training_end_date = db.Column(db.Date, nullable=True)
@@ -135,9 +470,70 @@ class Training(db.Model):
 
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Контрольный код свидетельства; триггеры БД сбрасывают его при изменении
+    # ФИО, даты или результата, заново его считает fill_control_hashes()
+    control_hash = db.Column(db.String(64), nullable=True)
+
+    # Для синхронизации между установками; заполняются триггерами БД
+    uuid = db.Column(db.String(32), nullable=True)            # постоянный ID записи
+    updated_at = db.Column(db.String(23), nullable=True)      # UTC, ГГГГ-ММ-ДД чч:мм:сс.ссс
+    sync_seq = db.Column(db.Integer, nullable=True)           # номер локального изменения
+    sync_origin = db.Column(db.String(32), nullable=True)     # установка-источник; NULL — эта
+
     participant = db.relationship("Participant", back_populates="trainings")
     program = db.relationship("Program", back_populates="trainings")
 
+    __table_args__ = (
+        # журнал, список обучений и их курсоры сортируются по (дата, ID)
+        db.Index("ix_trainings_exam_date_id", "exam_date", "id"),
+        db.Index("ix_trainings_participant_exam", "participant_id", "exam_date", "id"),
+        db.Index("ix_trainings_program_exam", "program_id", "exam_date"),
+        db.Index("ix_trainings_next_exam_participant", "next_exam_date", "participant_id"),
+        db.Index("ix_trainings_control_hash", "control_hash"),
+        db.Index("ix_trainings_uuid", "uuid", unique=True),
+        db.Index("ix_trainings_sync_seq", "sync_seq"),
+    )
+
+
+class ScoringPolicy(db.Model):
+    """
+    Правила оценки экзамена: проходной процент и срок действия результата.
+    Строка с program_id = NULL — общие правила, остальные — для программы.
+    """
+    __tablename__ = "scoring_policies"
+
+    id = db.Column(db.Integer, primary_key=True)
+    program_id = db.Column(
+        db.Integer, db.ForeignKey("programs.id", ondelete="CASCADE"), nullable=True
+    )
+    pass_threshold = db.Column(db.Float, nullable=False, default=80.0)   # проходной %
+    validity_months = db.Column(db.Integer, nullable=False, default=12)  # до следующего экзамена
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    program = db.relationship("Program", back_populates="scoring_policy")
+
+    __table_args__ = (
+        db.Index("ix_scoring_policies_program", "program_id", unique=True),
+    )
+
+
+class Job(db.Model):
+    """Фоновая задача (выгрузка); файл результата лежит в EXPORTS_DIR."""
+    __tablename__ = "jobs"
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    params = db.Column(db.Text, nullable=True)                # параметры в JSON
+    status = db.Column(db.String(20), nullable=False, default="queued")
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer, nullable=True)
+    file_name = db.Column(db.String(255), nullable=True)      # имя файла в EXPORTS_DIR
+    download_name = db.Column(db.String(255), nullable=True)
+    error = db.Column(db.Text, nullable=True)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
 
 # -------------- УТИЛИТЫ ----------------------
 
@@ -147,11 +543,23 @@ def generate_control_hash(training: Training) -> str:
     Создаёт криптографический хэш SHA-256 для свидетельства.
     Включаем ID, ФИО, дату экзамена, результат и секретный ключ.
     """
+    return _control_hash(
+        training.id,
+        training.participant.full_name,
+        training.exam_date.strftime('%Y-%m-%d'),
+        training.exam_result,
+    )
+
+
+@lru_cache(maxsize=4096)
+def _control_hash(training_id, full_name, exam_date_str, exam_result) -> str:
+    # Все поля хэша — аргументы кэша, поэтому после их изменения
+    # хэш просто считается заново
     data_string = (
-        f"{training.id}|"
-        f"{training.participant.full_name}|"
-        f"{training.exam_date.strftime('%Y-%m-%d')}|"
-        f"{training.exam_result}|"
+        f"{training_id}|"
+        f"{full_name}|"
+        f"{exam_date_str}|"
+        f"{exam_result}|"
         f"POL2KST|"
         f"{SECRET_KEY}"
     )
@@ -159,11 +567,25 @@ def generate_control_hash(training: Training) -> str:
     return hashlib.sha256(data_string.encode("utf-8")).hexdigest()
 
 
+def certificate_qr_data(training: Training, control_hash: str) -> str:
+    """Данные, включаемые в QR-код свидетельства."""
+    return (
+        f"КГП \"Поликлиника № 2 города Костанай\"\n"
+        f"Свидетельство № {training.id}\n"
+        f"ФИО: {training.participant.full_name}\n"
+        f"Дата экзамена: {training.exam_date.strftime('%d.%m.%Y')}\n"
+        f"Результат: {training.exam_result} ({training.exam_percent:.1f} %)\n"
+        f"Контрольный код: {control_hash}"
+    )
+
+
 def generate_qr_base64(data: str) -> str:
     """
     Генерирует QR-код по строке data и возвращает base64-строку
     для вставки в <img src="data:image/png;base64,...">
     """
+    import qrcode
+
     qr = qrcode.QRCode(
         version=2,
         error_correction=qrcode.constants.ERROR_CORRECT_M,
@@ -181,10 +603,848 @@ def generate_qr_base64(data: str) -> str:
     return base64.b64encode(img_bytes).decode("utf-8")
 
 
+# Кэш QR-кодов свидетельств
+QR_CACHE_SIZE = 512                                  # записей в памяти
+QR_CACHE_DIR = os.path.join(DATA_DIR, "qr_cache")    # None — только память
+QR_CACHE_MAX_FILES = 5000
+
+
+class QRCache:
+    """
+    LRU-кэш готовых QR-кодов (base64 PNG) в памяти и, если задан cache_dir,
+    на диске. Ключ — SHA-256 от строки QR-кода. В строку входят номер, ФИО,
+    дата, результат и контрольный код, поэтому после изменения записи ключ
+    меняется и код строится заново, а устаревшие записи со временем
+    вытесняются.
+    """
+
+    def __init__(self, max_size, cache_dir=None, max_files=QR_CACHE_MAX_FILES):
+        self.max_size = max_size
+        self.cache_dir = cache_dir
+        self.max_files = max_files
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(data: str) -> str:
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def get(self, data: str):
+        """Возвращает QR-код из кэша или None."""
+        key = self.key(data)
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key]
+
+        qr_image = self._load(key)
+        if qr_image is not None:
+            self._remember(key, qr_image)
+        return qr_image
+
+    def put(self, data: str, qr_image: str):
+        key = self.key(data)
+        self._remember(key, qr_image)
+        self._save(key, qr_image)
+
+    def get_or_create(self, data: str) -> str:
+        qr_image = self.get(data)
+        if qr_image is None:
+            qr_image = generate_qr_base64(data)
+            self.put(data, qr_image)
+        return qr_image
+
+    def _remember(self, key, qr_image):
+        with self._lock:
+            self._items[key] = qr_image
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.png")
+
+    def _load(self, key):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._path(key), "rb") as f:
+                return base64.b64encode(f.read()).decode("utf-8")
+        except OSError:
+            return None
+
+    def _save(self, key, qr_image):
+        if not self.cache_dir:
+            return
+        try:
+            with open(self._path(key), "wb") as f:
+                f.write(base64.b64decode(qr_image))
+        except OSError:
+            app.logger.error("Не удалось сохранить QR-код в кэш", exc_info=True)
+            return
+
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self._prune()
+
+    def _prune(self):
+        # Удаляем самые старые файлы сверх max_files
+        try:
+            entries = sorted(os.scandir(self.cache_dir), key=lambda e: e.stat().st_mtime)
+        except OSError:
+            return
+        for entry in entries[:max(0, len(entries) - self.max_files)]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+qr_cache = QRCache(QR_CACHE_SIZE, QR_CACHE_DIR)
+
+
+# Пул процессов для генерации QR-кодов при пакетной печати
+QR_POOL_WORKERS = os.cpu_count() or 1
+QR_POOL_MIN_BATCH = 8   # меньшие пачки быстрее сделать в текущем процессе
+
+_qr_pool = None
+_qr_pool_lock = threading.Lock()
+
+
+def get_qr_pool() -> ProcessPoolExecutor:
+    global _qr_pool
+    with _qr_pool_lock:
+        if _qr_pool is None:
+            _qr_pool = ProcessPoolExecutor(max_workers=QR_POOL_WORKERS)
+        return _qr_pool
+
+
+def generate_qr_batch(payloads: list) -> list:
+    """
+    Возвращает QR-коды для списка строк (в том же порядке).
+    Готовые берутся из кэша, недостающие строятся параллельно в пуле
+    процессов и складываются в кэш.
+    """
+    global _qr_pool
+
+    images = [qr_cache.get(data) for data in payloads]
+    missing = [i for i, image in enumerate(images) if image is None]
+    todo = [payloads[i] for i in missing]
+
+    results = None
+    if QR_POOL_WORKERS > 1 and len(todo) >= QR_POOL_MIN_BATCH:
+        chunksize = max(1, len(todo) // (QR_POOL_WORKERS * 4))
+        try:
+            results = list(get_qr_pool().map(generate_qr_base64, todo, chunksize=chunksize))
+        except BrokenProcessPool:
+            app.logger.error("Пул генерации QR-кодов остановлен", exc_info=True)
+            with _qr_pool_lock:
+                _qr_pool = None
+    if results is None:
+        results = [generate_qr_base64(data) for data in todo]
+
+    for i, image in zip(missing, results):
+        images[i] = image
+        qr_cache.put(payloads[i], image)
+    return images
+
+
+# ---------- ОБНОВЛЕНИЕ СХЕМЫ БД -------------
+
+# Прибавляет (sign="+") или вычитает (sign="-") одно обучение {row}
+# из сводной таблицы статистики
+STATS_ADD_SQL = (
+    "INSERT INTO training_stats (month, program_id, workplace, total, passed, "
+    "percent_sum) VALUES (substr({row}.exam_date, 1, 7), {row}.program_id, "
+    "coalesce((SELECT workplace FROM participants WHERE id = {row}.participant_id), ''), "
+    "{sign}1, {sign}({row}.exam_result = 'Положительный'), {sign}{row}.exam_percent) "
+    "ON CONFLICT (month, program_id, workplace) DO UPDATE SET "
+    "total = total + excluded.total, passed = passed + excluded.passed, "
+    "percent_sum = percent_sum + excluded.percent_sum"
+)
+
+# То же для всех обучений слушателя OLD/NEW при смене места работы
+STATS_MOVE_SQL = (
+    "INSERT INTO training_stats (month, program_id, workplace, total, passed, "
+    "percent_sum) SELECT substr(exam_date, 1, 7), program_id, "
+    "coalesce({workplace}, ''), {sign}count(*), "
+    "{sign}sum(exam_result = 'Положительный'), {sign}sum(exam_percent) "
+    "FROM trainings WHERE participant_id = OLD.id GROUP BY 1, 2 "
+    "ON CONFLICT (month, program_id, workplace) DO UPDATE SET "
+    "total = total + excluded.total, passed = passed + excluded.passed, "
+    "percent_sum = percent_sum + excluded.percent_sum"
+)
+
+# Выражение для trainings.control_hash; {row} — псевдоним строки trainings
+CONTROL_HASH_SQL = (
+    "control_hash({row}.id, (SELECT p.full_name FROM participants p "
+    "WHERE p.id = {row}.participant_id), {row}.exam_date, {row}.exam_result)"
+)
+CONTROL_HASH_BACKFILL_BATCH = 2000
+
+
+def fill_control_hashes(conn):
+    """
+    Считает control_hash обучениям, у которых он пуст: новым и изменённым.
+    Функция control_hash() есть только у соединений ИС, поэтому триггеры
+    код лишь сбрасывают, а считается он здесь — и запись в БД сторонними
+    программами не ломается. conn — соединение или сессия. Записи через ORM
+    досчитываются при commit (fill_control_hashes_on_commit), остальные
+    пути записи (db.engine, sqlite3) вызывают эту функцию сами.
+    """
+    # Пачками, чтобы не держать в памяти весь пересчёт сразу
+    while True:
+        result = conn.execute(db.text(
+            "UPDATE trainings SET control_hash = "
+            f"{CONTROL_HASH_SQL.format(row='trainings')} "
+            "WHERE id IN (SELECT id FROM trainings "
+            f"WHERE control_hash IS NULL LIMIT {CONTROL_HASH_BACKFILL_BATCH})"
+        ))
+        if result.rowcount == 0:
+            break
+
+
+def control_hashes_missing(conn):
+    return conn.execute(
+        db.text("SELECT 1 FROM trainings WHERE control_hash IS NULL LIMIT 1")
+    ).first() is not None
+
+
+def ensure_control_hashes():
+    """Досчитывает коды строк, записанных в БД другими программами."""
+    if control_hashes_missing(db.session):
+        fill_control_hashes(db.session)
+        db.session.commit()
+
+
+@event.listens_for(Session, "before_commit")
+def fill_control_hashes_on_commit(session):
+    # Код считается в той же транзакции, что и запись обучения
+    session.flush()
+    if control_hashes_missing(session):
+        fill_control_hashes(session)
+
+
+def create_control_hash_triggers(conn):
+    """Триггеры, сбрасывающие control_hash при изменении полей кода."""
+    conn.exec_driver_sql(
+        "CREATE TRIGGER IF NOT EXISTS trainings_control_hash_au "
+        "AFTER UPDATE OF participant_id, exam_date, exam_result ON trainings BEGIN "
+        "UPDATE trainings SET control_hash = NULL WHERE id = NEW.id; END"
+    )
+    conn.exec_driver_sql(
+        "CREATE TRIGGER IF NOT EXISTS participants_control_hash_au "
+        "AFTER UPDATE OF full_name ON participants BEGIN "
+        "UPDATE trainings SET control_hash = NULL WHERE participant_id = NEW.id; END"
+    )
+
+
+def add_control_hash(conn):
+    """Колонка control_hash с индексом, триггеры и заполнение старых строк."""
+    columns = {
+        row[1] for row in conn.exec_driver_sql("PRAGMA table_info(trainings)")
+    }
+    if "control_hash" not in columns:
+        conn.exec_driver_sql("ALTER TABLE trainings ADD COLUMN control_hash TEXT")
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_trainings_control_hash "
+        "ON trainings (control_hash)"
+    )
+    create_control_hash_triggers(conn)
+    fill_control_hashes(conn)
+
+
+def control_hash_without_sql_function(conn):
+    """
+    Прежние триггеры считали код функцией control_hash(), и запись
+    в trainings из sqlite3 и других программ без неё завершалась ошибкой.
+    """
+    for name in ("trainings_control_hash_ai", "trainings_control_hash_au",
+                 "participants_control_hash_au"):
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+    create_control_hash_triggers(conn)
+    fill_control_hashes(conn)
+
+
+def rebuild_table(conn, table):
+    """
+    Пересоздаёт таблицу по текущему описанию модели, сохраняя данные,
+    индексы и триггеры: внешние ключи SQLite через ALTER TABLE не меняются.
+    """
+    model_table = db.metadata.tables[table]
+    saved_sql = [
+        row[0]
+        for row in conn.exec_driver_sql(
+            "SELECT sql FROM sqlite_master "
+            "WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL",
+            (table,),
+        )
+    ]
+    # Колонки, которых в старой таблице ещё нет, добавят следующие шаги
+    existing = {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})")}
+    columns = ", ".join(c.name for c in model_table.columns if c.name in existing)
+    create_sql = str(CreateTable(model_table).compile(dialect=conn.dialect))
+    create_sql = create_sql.replace(f"CREATE TABLE {table} ", f"CREATE TABLE {table}_new ", 1)
+
+    conn.exec_driver_sql(f"DROP TABLE IF EXISTS {table}_new")
+    conn.exec_driver_sql(create_sql)
+    conn.exec_driver_sql(
+        f"INSERT INTO {table}_new ({columns}) SELECT {columns} FROM {table}"
+    )
+    conn.exec_driver_sql(f"DROP TABLE {table}")
+    # Триггеры других таблиц ссылаются на {table}, которой в этот момент
+    # нет; в режиме legacy переименование их не проверяет
+    conn.exec_driver_sql("PRAGMA legacy_alter_table = ON")
+    conn.exec_driver_sql(f"ALTER TABLE {table}_new RENAME TO {table}")
+    conn.exec_driver_sql("PRAGMA legacy_alter_table = OFF")
+    for sql in saved_sql:
+        conn.exec_driver_sql(sql)
+    conn.exec_driver_sql(f"ANALYZE {table}")
+
+
+ORPHAN_CONDITIONS = {
+    "trainings": "participant_id NOT IN (SELECT id FROM participants) "
+                 "OR program_id NOT IN (SELECT id FROM programs)",
+    "scoring_policies": "program_id IS NOT NULL "
+                        "AND program_id NOT IN (SELECT id FROM programs)",
+}
+
+
+def cascade_foreign_keys(conn):
+    """Внешние ключи обучений и правил оценки с ON DELETE CASCADE."""
+    # Строки, осиротевшие до включения foreign_keys, ключи уже не пропустят.
+    # Перед их удалением снимается резервная копия, а число строк пишется в журнал.
+    orphans = {
+        table: conn.exec_driver_sql(f"SELECT count(*) FROM {table} WHERE {condition}").scalar()
+        for table, condition in ORPHAN_CONDITIONS.items()
+    }
+    if any(orphans.values()):
+        path = backup_database(label="-orphans")
+        app.logger.error(
+            "Обновление схемы удаляет записи без слушателя или программы: "
+            + ", ".join(f"{table} — {count}" for table, count in orphans.items())
+            + f". Копия БД до удаления: {path}"
+        )
+        for table, condition in ORPHAN_CONDITIONS.items():
+            conn.exec_driver_sql(f"DELETE FROM {table} WHERE {condition}")
+    for table in ("trainings", "scoring_policies"):
+        on_delete = {
+            row[6] for row in conn.exec_driver_sql(f"PRAGMA foreign_key_list({table})")
+        }
+        if on_delete != {"CASCADE"}:
+            rebuild_table(conn, table)
+
+
+# Таблицы, изменения которых отслеживаются для условных GET-запросов
+VERSIONED_TABLES = ("programs", "participants", "trainings")
+
+# Таблицы, которые синхронизируются между установками (см. раздел СИНХРОНИЗАЦИЯ)
+SYNC_TABLES = ("programs", "participants", "trainings")
+# Колонки отслеживания изменений и прочие служебные колонки,
+# которые в пакеты синхронизации не входят как данные
+SYNC_TRACKING_COLUMNS = ("uuid", "updated_at", "sync_seq", "sync_origin")
+SYNC_SERVICE_COLUMNS = ("id", "control_hash") + SYNC_TRACKING_COLUMNS
+SYNC_NOW_SQL = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+SYNC_UUID_SQL = "lower(hex(randomblob(16)))"
+# Следующий номер изменения; после него счётчик увеличивается
+SYNC_NEXT_SEQ_SQL = "(SELECT seq FROM sync_state) + 1"
+SYNC_BUMP_SQL = "UPDATE sync_state SET seq = seq + 1"
+# Установка, чей пакет сейчас загружается; вне загрузки — NULL
+SYNC_ORIGIN_SQL = "(SELECT site_id FROM sync_applying)"
+
+
+def sync_columns(table):
+    """Колонки таблицы, которые переносятся между установками."""
+    return [
+        c.name for c in db.metadata.tables[table].columns
+        if c.name not in SYNC_SERVICE_COLUMNS
+    ]
+
+
+def add_sync_tracking(conn):
+    """
+    UUID, время изменения и номер изменения у программ, слушателей и обучений,
+    надгробия удалённых записей и служебные таблицы синхронизации.
+    """
+    conn.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS sync_state ("
+        "id INTEGER PRIMARY KEY CHECK (id = 1), "
+        "site_id TEXT NOT NULL, "
+        "seq INTEGER NOT NULL)"
+    )
+    conn.exec_driver_sql(
+        f"INSERT OR IGNORE INTO sync_state (id, site_id, seq) VALUES (1, {SYNC_UUID_SQL}, 1)"
+    )
+    conn.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS sync_tombstones ("
+        "uuid TEXT PRIMARY KEY, "
+        "table_name TEXT NOT NULL, "
+        "deleted_at TEXT NOT NULL, "
+        "sync_seq INTEGER NOT NULL)"
+    )
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_sync_tombstones_seq ON sync_tombstones (sync_seq)"
+    )
+    # Пока в таблице есть строка, удаления не порождают надгробий
+    # (перенос в архив — не удаление данных)
+    conn.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS sync_suppress (id INTEGER PRIMARY KEY)"
+    )
+    # UUID записи, слитой с записью другой установки, -> оставшийся UUID
+    conn.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS sync_aliases ("
+        "uuid TEXT PRIMARY KEY, target TEXT NOT NULL)"
+    )
+    # Куда и до какого номера изменений уже выгружали пакеты
+    conn.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS sync_peers ("
+        "peer TEXT PRIMARY KEY, "
+        "exported_seq INTEGER NOT NULL, "
+        "exported_at TEXT NOT NULL)"
+    )
+    # Чьи пакеты и до какого номера уже загружены
+    conn.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS sync_sources ("
+        "site_id TEXT PRIMARY KEY, "
+        "imported_seq INTEGER NOT NULL, "
+        "imported_at TEXT NOT NULL)"
+    )
+
+    for table in SYNC_TABLES:
+        existing = {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})")}
+        for column, sql_type in (("uuid", "VARCHAR(32)"), ("updated_at", "VARCHAR(23)"),
+                                 ("sync_seq", "INTEGER")):
+            if column not in existing:
+                conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {sql_type}")
+        # Старые строки: новый UUID, время — момент обновления схемы
+        conn.exec_driver_sql(
+            f"UPDATE {table} SET uuid = coalesce(uuid, {SYNC_UUID_SQL}), "
+            f"updated_at = coalesce(updated_at, {SYNC_NOW_SQL}), "
+            "sync_seq = coalesce(sync_seq, 1) "
+            "WHERE uuid IS NULL OR updated_at IS NULL OR sync_seq IS NULL"
+        )
+        conn.exec_driver_sql(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS ix_{table}_uuid ON {table} (uuid)"
+        )
+        conn.exec_driver_sql(
+            f"CREATE INDEX IF NOT EXISTS ix_{table}_sync_seq ON {table} (sync_seq)"
+        )
+
+        # Явно заданные uuid/updated_at (загрузка пакета) сохраняются,
+        # иначе заполняются здесь; номер изменения — всегда локальный
+        conn.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS {table}_sync_ai AFTER INSERT ON {table} BEGIN "
+            f"UPDATE {table} SET uuid = coalesce(NEW.uuid, {SYNC_UUID_SQL}), "
+            f"updated_at = coalesce(NEW.updated_at, {SYNC_NOW_SQL}), "
+            f"sync_seq = {SYNC_NEXT_SEQ_SQL} WHERE id = NEW.id; "
+            f"{SYNC_BUMP_SQL}; END"
+        )
+        conn.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS {table}_sync_au "
+            f"AFTER UPDATE OF {', '.join(sync_columns(table))} ON {table} BEGIN "
+            f"UPDATE {table} SET updated_at = CASE WHEN NEW.updated_at IS OLD.updated_at "
+            f"THEN {SYNC_NOW_SQL} ELSE NEW.updated_at END, "
+            f"sync_seq = {SYNC_NEXT_SEQ_SQL} WHERE id = NEW.id; "
+            f"{SYNC_BUMP_SQL}; END"
+        )
+        conn.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS {table}_sync_ad AFTER DELETE ON {table} "
+            "WHEN OLD.uuid IS NOT NULL AND NOT EXISTS (SELECT 1 FROM sync_suppress) BEGIN "
+            "INSERT OR REPLACE INTO sync_tombstones (uuid, table_name, deleted_at, sync_seq) "
+            f"VALUES (OLD.uuid, '{table}', {SYNC_NOW_SQL}, {SYNC_NEXT_SEQ_SQL}); "
+            f"{SYNC_BUMP_SQL}; END"
+        )
+
+
+def add_sync_archived(conn):
+    """
+    Записи, перенесённые в архив. Пакеты других установок их в рабочую БД
+    не возвращают, а пакеты этой установки сообщают о переносе остальным.
+    """
+    conn.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS sync_archived ("
+        "uuid TEXT PRIMARY KEY, "
+        "table_name TEXT NOT NULL, "
+        "archived_at TEXT NOT NULL, "
+        "sync_seq INTEGER NOT NULL)"
+    )
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_sync_archived_seq ON sync_archived (sync_seq)"
+    )
+    # Уже созданные архивы; в архивах без UUID записи до синхронизации
+    # не доходили, и другим установкам они неизвестны
+    for year in archive_years():
+        archive = open_archive(year)
+        try:
+            for table in ("participants", "trainings"):
+                columns = {row[1] for row in archive.execute(f"PRAGMA table_info({table})")}
+                if "uuid" not in columns:
+                    continue
+                for (uuid,) in archive.execute(
+                    f"SELECT uuid FROM {table} WHERE uuid IS NOT NULL"
+                ):
+                    conn.execute(
+                        db.text(
+                            "INSERT OR IGNORE INTO sync_archived "
+                            "(uuid, table_name, archived_at, sync_seq) "
+                            f"SELECT :uuid, :table, {SYNC_NOW_SQL}, {SYNC_NEXT_SEQ_SQL} "
+                            f"WHERE NOT EXISTS (SELECT 1 FROM {table} WHERE uuid = :uuid)"
+                        ),
+                        {"uuid": uuid, "table": table},
+                    )
+        finally:
+            archive.close()
+    conn.exec_driver_sql(SYNC_BUMP_SQL)
+
+
+def add_sync_origin(conn):
+    """
+    Установка, от которой пришло последнее изменение записи, надгробия или
+    отметки об архиве. Пакет для установки их не содержит: иначе загруженные
+    от неё изменения возвращались бы к ней же с каждым следующим пакетом.
+    """
+    # Пока идёт загрузка пакета, здесь одна строка — ID его установки
+    conn.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS sync_applying (site_id TEXT NOT NULL)"
+    )
+    for table in SYNC_TABLES + ("sync_tombstones", "sync_archived"):
+        existing = {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})")}
+        if "sync_origin" not in existing:
+            conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN sync_origin VARCHAR(32)")
+    # ID установки-получателя, если её пакеты сюда уже загружались
+    existing = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(sync_peers)")}
+    if "site_id" not in existing:
+        conn.exec_driver_sql("ALTER TABLE sync_peers ADD COLUMN site_id TEXT")
+
+    for table in SYNC_TABLES:
+        for suffix in ("ai", "au", "ad"):
+            conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {table}_sync_{suffix}")
+        conn.exec_driver_sql(
+            f"CREATE TRIGGER {table}_sync_ai AFTER INSERT ON {table} BEGIN "
+            f"UPDATE {table} SET uuid = coalesce(NEW.uuid, {SYNC_UUID_SQL}), "
+            f"updated_at = coalesce(NEW.updated_at, {SYNC_NOW_SQL}), "
+            f"sync_seq = {SYNC_NEXT_SEQ_SQL}, sync_origin = {SYNC_ORIGIN_SQL} "
+            "WHERE id = NEW.id; "
+            f"{SYNC_BUMP_SQL}; END"
+        )
+        conn.exec_driver_sql(
+            f"CREATE TRIGGER {table}_sync_au "
+            f"AFTER UPDATE OF {', '.join(sync_columns(table))} ON {table} BEGIN "
+            f"UPDATE {table} SET updated_at = CASE WHEN NEW.updated_at IS OLD.updated_at "
+            f"THEN {SYNC_NOW_SQL} ELSE NEW.updated_at END, "
+            f"sync_seq = {SYNC_NEXT_SEQ_SQL}, sync_origin = {SYNC_ORIGIN_SQL} "
+            "WHERE id = NEW.id; "
+            f"{SYNC_BUMP_SQL}; END"
+        )
+        conn.exec_driver_sql(
+            f"CREATE TRIGGER {table}_sync_ad AFTER DELETE ON {table} "
+            "WHEN OLD.uuid IS NOT NULL AND NOT EXISTS (SELECT 1 FROM sync_suppress) BEGIN "
+            "INSERT OR REPLACE INTO sync_tombstones "
+            "(uuid, table_name, deleted_at, sync_seq, sync_origin) "
+            f"VALUES (OLD.uuid, '{table}', {SYNC_NOW_SQL}, {SYNC_NEXT_SEQ_SQL}, "
+            f"{SYNC_ORIGIN_SQL}); "
+            f"{SYNC_BUMP_SQL}; END"
+        )
+
+# db.create_all() создаёт только отсутствующие таблицы и не трогает уже
+# существующий hygiene.db. Поэтому изменения схемы оформляются шагами:
+# номер последнего выполненного шага хранится в PRAGMA user_version,
+# каждый шаг выполняется один раз. Шаг — список SQL-команд или функция,
+# принимающая соединение. Шаги должны быть безопасны и для новой БД,
+# уже созданной через create_all().
+MIGRATIONS = [
+    # 1: индексы для сортировок и фильтров
+    [
+        "CREATE INDEX IF NOT EXISTS ix_trainings_exam_date_id "
+        "ON trainings (exam_date, id)",
+        "CREATE INDEX IF NOT EXISTS ix_trainings_participant_exam "
+        "ON trainings (participant_id, exam_date, id)",
+        "CREATE INDEX IF NOT EXISTS ix_trainings_program_exam "
+        "ON trainings (program_id, exam_date)",
+        "CREATE INDEX IF NOT EXISTS ix_trainings_next_exam_participant "
+        "ON trainings (next_exam_date, participant_id)",
+        "CREATE INDEX IF NOT EXISTS ix_participants_full_name_id "
+        "ON participants (full_name, id)",
+        "CREATE INDEX IF NOT EXISTS ix_participants_iin "
+        "ON participants (iin)",
+        "CREATE INDEX IF NOT EXISTS ix_programs_name "
+        "ON programs (name)",
+        "ANALYZE",
+    ],
+    # 2: полнотекстовый поиск по слушателям (FTS5, синхронизация триггерами)
+    [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS participants_fts USING fts5("
+        "full_name, iin, workplace, position, activity_type, lmk_number, "
+        "content='participants', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        "CREATE TRIGGER IF NOT EXISTS participants_fts_ai "
+        "AFTER INSERT ON participants BEGIN "
+        "INSERT INTO participants_fts(rowid, full_name, iin, workplace, "
+        "position, activity_type, lmk_number) VALUES (new.id, new.full_name, "
+        "new.iin, new.workplace, new.position, new.activity_type, "
+        "new.lmk_number); END",
+        "CREATE TRIGGER IF NOT EXISTS participants_fts_ad "
+        "AFTER DELETE ON participants BEGIN "
+        "INSERT INTO participants_fts(participants_fts, rowid, full_name, iin, "
+        "workplace, position, activity_type, lmk_number) VALUES ('delete', "
+        "old.id, old.full_name, old.iin, old.workplace, old.position, "
+        "old.activity_type, old.lmk_number); END",
+        "CREATE TRIGGER IF NOT EXISTS participants_fts_au "
+        "AFTER UPDATE OF full_name, iin, workplace, position, activity_type, "
+        "lmk_number ON participants BEGIN "
+        "INSERT INTO participants_fts(participants_fts, rowid, full_name, iin, "
+        "workplace, position, activity_type, lmk_number) VALUES ('delete', "
+        "old.id, old.full_name, old.iin, old.workplace, old.position, "
+        "old.activity_type, old.lmk_number); "
+        "INSERT INTO participants_fts(rowid, full_name, iin, workplace, "
+        "position, activity_type, lmk_number) VALUES (new.id, new.full_name, "
+        "new.iin, new.workplace, new.position, new.activity_type, "
+        "new.lmk_number); END",
+        "INSERT INTO participants_fts(participants_fts) VALUES ('rebuild')",
+    ],
+    # 3: сводная таблица для статистики (месяц x программа x место работы),
+    # поддерживается триггерами при любом изменении обучений
+    [
+        "CREATE TABLE IF NOT EXISTS training_stats ("
+        "month TEXT NOT NULL, "
+        "program_id INTEGER NOT NULL, "
+        "workplace TEXT NOT NULL, "
+        "total INTEGER NOT NULL DEFAULT 0, "
+        "passed INTEGER NOT NULL DEFAULT 0, "
+        "percent_sum REAL NOT NULL DEFAULT 0, "
+        "PRIMARY KEY (month, program_id, workplace)) WITHOUT ROWID",
+        "DROP TRIGGER IF EXISTS training_stats_ai",
+        "DROP TRIGGER IF EXISTS training_stats_ad",
+        "DROP TRIGGER IF EXISTS training_stats_au",
+        "DROP TRIGGER IF EXISTS training_stats_participant_au",
+        "DROP TRIGGER IF EXISTS training_stats_participant_bd",
+        "CREATE TRIGGER training_stats_ai AFTER INSERT ON trainings BEGIN "
+        + STATS_ADD_SQL.format(row="NEW", sign="+") + "; END",
+        # Если слушатель уже удалён (каскадом из БД), его обучения
+        # вычел триггер training_stats_participant_bd. Строки с нулями
+        # не удаляются: они не мешают и не требуют просмотра таблицы.
+        "CREATE TRIGGER training_stats_ad AFTER DELETE ON trainings "
+        "WHEN EXISTS (SELECT 1 FROM participants WHERE id = OLD.participant_id) "
+        "BEGIN "
+        + STATS_ADD_SQL.format(row="OLD", sign="-") + "; END",
+        "CREATE TRIGGER training_stats_au AFTER UPDATE OF exam_date, program_id, "
+        "participant_id, exam_result, exam_percent ON trainings BEGIN "
+        + STATS_ADD_SQL.format(row="OLD", sign="-") + "; "
+        + STATS_ADD_SQL.format(row="NEW", sign="+") + "; END",
+        "CREATE TRIGGER training_stats_participant_au AFTER UPDATE OF workplace "
+        "ON participants BEGIN "
+        + STATS_MOVE_SQL.format(workplace="OLD.workplace", sign="-") + "; "
+        + STATS_MOVE_SQL.format(workplace="NEW.workplace", sign="+") + "; END",
+        "CREATE TRIGGER training_stats_participant_bd BEFORE DELETE ON participants "
+        "BEGIN "
+        + STATS_MOVE_SQL.format(workplace="OLD.workplace", sign="-") + "; END",
+        "DELETE FROM training_stats",
+        "INSERT INTO training_stats (month, program_id, workplace, total, passed, "
+        "percent_sum) "
+        "SELECT substr(t.exam_date, 1, 7), t.program_id, coalesce(p.workplace, ''), "
+        "count(*), sum(t.exam_result = 'Положительный'), sum(t.exam_percent) "
+        "FROM trainings t JOIN participants p ON p.id = t.participant_id "
+        "GROUP BY 1, 2, 3",
+    ],
+    # 4: счётчики версий данных для ETag/Last-Modified
+    [
+        "CREATE TABLE IF NOT EXISTS data_versions ("
+        "table_name TEXT PRIMARY KEY, "
+        "version INTEGER NOT NULL DEFAULT 0, "
+        "changed_at TEXT NOT NULL)",
+    ] + [
+        sql
+        for table in VERSIONED_TABLES
+        for sql in (
+            f"INSERT OR IGNORE INTO data_versions (table_name, version, changed_at) "
+            f"VALUES ('{table}', 0, strftime('%Y-%m-%d %H:%M:%S', 'now'))",
+            *(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_version_{op.lower()} "
+                f"AFTER {op} ON {table} BEGIN UPDATE data_versions "
+                f"SET version = version + 1, "
+                f"changed_at = strftime('%Y-%m-%d %H:%M:%S', 'now') "
+                f"WHERE table_name = '{table}'; END"
+                for op in ("INSERT", "UPDATE", "DELETE")
+            ),
+        )
+    ],
+    # 5: хранимый контрольный код свидетельства
+    add_control_hash,
+    # 6: правила оценки экзамена (общие — как было зашито в коде)
+    [
+        "CREATE TABLE IF NOT EXISTS scoring_policies ("
+        "id INTEGER NOT NULL PRIMARY KEY, "
+        "program_id INTEGER REFERENCES programs (id), "
+        "pass_threshold FLOAT NOT NULL, "
+        "validity_months INTEGER NOT NULL, "
+        "updated_at DATETIME)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_scoring_policies_program "
+        "ON scoring_policies (program_id)",
+        "INSERT INTO scoring_policies (program_id, pass_threshold, validity_months, updated_at) "
+        "SELECT NULL, 80.0, 12, datetime('now') "
+        "WHERE NOT EXISTS (SELECT 1 FROM scoring_policies WHERE program_id IS NULL)",
+    ],
+    # 7: каскадное удаление средствами БД
+    cascade_foreign_keys,
+    # 8: отслеживание изменений для синхронизации установок
+    add_sync_tracking,
+    # 9: триггеры control_hash без SQL-функций приложения
+    control_hash_without_sql_function,
+    # 10: учёт перенесённых в архив записей при синхронизации
+    add_sync_archived,
+    # 11: источник изменений, чтобы не возвращать их установке-источнику
+    add_sync_origin,
+]
+
+
+def upgrade_schema():
+    """Выполняет ещё не применённые к БД шаги из MIGRATIONS."""
+    with db.engine.connect() as conn:
+        version = conn.exec_driver_sql("PRAGMA user_version").scalar()
+
+    for number, step in enumerate(MIGRATIONS, start=1):
+        if number <= version:
+            continue
+        with db.engine.begin() as conn:
+            if callable(step):
+                step(conn)
+            else:
+                for sql in step:
+                    conn.exec_driver_sql(sql)
+            conn.exec_driver_sql(f"PRAGMA user_version = {number}")
+
+
 # ----------- ИНИЦИАЛИЗАЦИЯ БД --------------
 
-with app.app_context():
-    db.create_all()
+# Создание таблиц и обновление схемы выполняются не при импорте модуля,
+# а после запуска сервера (или перед первым запросом), чтобы окно
+# и порт появлялись сразу.
+_db_ready = False
+_db_init_lock = threading.Lock()
+
+
+def init_db():
+    global _db_ready
+    if _db_ready:
+        return
+    with _db_init_lock:
+        if _db_ready:
+            return
+        with app.app_context():
+            db.create_all()
+            upgrade_schema()
+            # Обучения, добавленные в БД другими программами
+            with db.engine.begin() as conn:
+                fill_control_hashes(conn)
+            fail_interrupted_jobs()
+        _db_ready = True
+
+
+@app.before_request
+def ensure_db():
+    init_db()
+
+
+# ------------- УСЛОВНЫЕ ЗАПРОСЫ -------------
+
+
+def data_version(tables):
+    """
+    Версия данных для набора таблиц: (строка версий, время последнего
+    изменения). Счётчики увеличивают триггеры при каждой записи.
+    """
+    rows = db.session.execute(
+        db.text(
+            "SELECT table_name, version, changed_at FROM data_versions "
+            "ORDER BY table_name"
+        )
+    ).all()
+    rows = [row for row in rows if row.table_name in tables]
+    versions = ",".join(f"{row.table_name}:{row.version}" for row in rows)
+    changed_at = max(
+        (datetime.strptime(row.changed_at, "%Y-%m-%d %H:%M:%S") for row in rows),
+        default=None,
+    )
+    if changed_at is not None:
+        changed_at = changed_at.replace(tzinfo=timezone.utc)
+    return versions, changed_at
+
+
+def conditional_get(*tables, daily=False):
+    """
+    ETag и Last-Modified для страниц, зависящих только от таблиц tables
+    (и, при daily=True, от сегодняшней даты). Если у браузера актуальная
+    копия, страница не строится заново — отдаётся 304.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            versions, changed_at = data_version(tables)
+            key = f"{APP_VERSION}|{request.full_path}|{versions}"
+            if daily:
+                key += f"|{date.today().isoformat()}"
+            etag = hashlib.sha1(key.encode("utf-8")).hexdigest()
+            g.data_etag = etag
+
+            not_modified = (
+                request.if_none_match.contains(etag)
+                if request.if_none_match
+                else (
+                    not daily
+                    and changed_at is not None
+                    and request.if_modified_since is not None
+                    and changed_at <= request.if_modified_since
+                )
+            )
+            if not_modified:
+                response = Response(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+
+            response.set_etag(etag)
+            if changed_at is not None and not daily:
+                response.last_modified = changed_at
+            # Кэшировать можно, но перед показом — всегда сверяться с сервером
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
+
+
+# ---------- МАССОВОЕ УДАЛЕНИЕ --------------
+
+
+# Сколько записей можно удалить одним нажатием
+BULK_DELETE_MAX = 1000
+
+
+def bulk_delete(model, list_endpoint):
+    """
+    Удаляет отмеченные в списке записи одним DELETE; связанные обучения
+    удаляет сама БД (ON DELETE CASCADE). Возвращает на ту же страницу.
+    """
+    ids = request.form.getlist("ids", type=int)[:BULK_DELETE_MAX]
+    if ids:
+        db.session.execute(delete(model).where(model.id.in_(ids)))
+        db.session.commit()
+
+    return redirect(local_url(request.form.get("next")) or url_for(list_endpoint))
+
+
+def local_url(url):
+    """
+    Ссылка на страницу этого же сайта или None — возвращаемся только
+    на свою страницу, а не по произвольной ссылке. Браузеры читают «\\»
+    как «/», поэтому «/\\evil.example» тоже ведёт на чужой сайт.
+    """
+    parts = urlsplit((url or "").replace("\\", "/"))
+    if parts.scheme or parts.netloc or not parts.path.startswith("/"):
+        return None
+    return urlunsplit(parts)
 
 
 # ----------------- ГЛАВНАЯ ------------------
@@ -199,6 +1459,7 @@ def index():
 
 
 @app.route("/programs")
+@conditional_get("programs")
 def list_programs():
     programs = Program.query.order_by(Program.name).all()
     return render_template("programs.html", programs=programs)
@@ -260,13 +1521,71 @@ def delete_program(program_id):
     return redirect(url_for("list_programs"))
 
 
+@app.route("/programs/delete", methods=["POST"])
+def delete_programs():
+    return bulk_delete(Program, "list_programs")
+
+
 # --------- СПРАВОЧНИК СЛУШАТЕЛЕЙ ------------
 
 
+# Сколько найденных слушателей показывать
+SEARCH_LIMIT = 200
+
+
+def fts_query(text):
+    """
+    Превращает строку поиска в запрос FTS5: каждое слово ищется по началу,
+    все слова должны встретиться. Возвращает None, если искать нечего.
+    """
+    words = "".join(ch if ch.isalnum() else " " for ch in text or "").split()
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def participant_search(match):
+    """ID слушателей, подходящих под запрос FTS5, — для подзапроса IN (...)."""
+    return (
+        db.select(db.literal_column("participants_fts.rowid"))
+        .select_from(db.table("participants_fts"))
+        .where(db.text("participants_fts MATCH :fts_match").bindparams(fts_match=match))
+    )
+
+
+def search_participants(match, limit):
+    """Слушатели по запросу FTS5, самые релевантные (bm25) сверху."""
+    ranked = db.session.execute(
+        db.text(
+            "SELECT rowid FROM participants_fts "
+            "WHERE participants_fts MATCH :fts_match ORDER BY rank LIMIT :limit"
+        ),
+        {"fts_match": match, "limit": limit},
+    ).scalars().all()
+    by_id = {
+        p.id: p
+        for p in Participant.query.filter(Participant.id.in_(ranked))
+    }
+    return [by_id[i] for i in ranked if i in by_id]
+
+
 @app.route("/participants")
+@conditional_get("participants")
 def list_participants():
-    participants = Participant.query.order_by(Participant.full_name).all()
-    return render_template("participants.html", participants=participants)
+    q = (request.args.get("q") or "").strip()
+    match = fts_query(q)
+
+    if match:
+        participants = search_participants(match, SEARCH_LIMIT)
+    else:
+        participants = Participant.query.order_by(Participant.full_name).all()
+
+    return render_template(
+        "participants.html",
+        participants=participants,
+        q=q,
+        search_limit=SEARCH_LIMIT,
+    )
 
 
 @app.route("/participants/new", methods=["GET", "POST"])
@@ -345,33 +1664,274 @@ def delete_participant(participant_id):
     return redirect(url_for("list_participants"))
 
 
+@app.route("/participants/delete", methods=["POST"])
+def delete_participants():
+    return bulk_delete(Participant, "list_participants")
+
+
 # ------------ ОБУЧЕНИЯ / ЭКЗАМЕНЫ ------------
 
 
-@app.route("/trainings")
-def list_trainings():
-    trainings = (
-        Training.query
-        .order_by(Training.exam_date.desc(), Training.id.desc())
-        .all()
+# Правила на случай, если общая строка scoring_policies отсутствует
+DEFAULT_PASS_THRESHOLD = 80.0
+DEFAULT_VALIDITY_MONTHS = 12
+
+
+def load_scoring_policies():
+    """Словарь program_id -> (проходной %, срок в месяцах); None — общие."""
+    policies = {None: (DEFAULT_PASS_THRESHOLD, DEFAULT_VALIDITY_MONTHS)}
+    rows = db.session.execute(
+        db.select(
+            ScoringPolicy.program_id,
+            ScoringPolicy.pass_threshold,
+            ScoringPolicy.validity_months,
+        )
     )
-    return render_template("trainings.html", trainings=trainings)
+    for program_id, threshold, months in rows:
+        policies[program_id] = (threshold, months)
+    return policies
 
 
-@app.route("/trainings/new", methods=["GET", "POST"])
-def new_training():
-    participants = Participant.query.order_by(Participant.full_name).all()
-    programs = Program.query.order_by(Program.name).all()
+def calc_exam_percent(questions_total, correct_answers):
+    if questions_total and questions_total > 0:
+        return round(correct_answers / questions_total * 100, 1)
+    return 0.0
 
-    if request.method == "POST":
-        participant_id = int(request.form.get("participant_id"))
-        program_id = int(request.form.get("program_id"))
 
-        training_start_date_str = request.form.get("training_start_date")
-        training_end_date_str = request.form.get("training_end_date")
-        exam_date_str = request.form.get("exam_date")
+def add_months(value, months):
+    """Дата через months месяцев; 31-е число переходит в последний день месяца."""
+    month_index = value.month - 1 + months
+    year = value.year + month_index // 12
+    month = month_index % 12 + 1
+    last_day = calendar.monthrange(year, month)[1]
+    return value.replace(year=year, month=month, day=min(value.day, last_day))
 
-        questions_total = int(request.form.get("questions_total"))
+
+def compute_exam_result(questions_total, correct_answers, exam_date,
+                        program_id=None, policies=None):
+    """
+    Считает процент правильных ответов, результат экзамена и дату
+    очередного экзамена (только при положительном результате) по правилам
+    программы или общим правилам. policies — результат
+    load_scoring_policies(), чтобы не читать их на каждую строку импорта.
+    Возвращает (exam_percent, exam_result, next_exam_date).
+    """
+    if policies is None:
+        policies = load_scoring_policies()
+    threshold, validity_months = policies.get(program_id, policies[None])
+
+    exam_percent = calc_exam_percent(questions_total, correct_answers)
+    exam_result = "Положительный" if exam_percent >= threshold else "Отрицательный"
+
+    next_exam_date = None
+    if exam_result == "Положительный":
+        next_exam_date = add_months(exam_date, validity_months)
+
+    return exam_percent, exam_result, next_exam_date
+
+
+# Размеры страницы списка обучений
+TRAININGS_PAGE_SIZES = (25, 50, 100, 200)
+TRAININGS_DEFAULT_PAGE_SIZE = 50
+
+
+def parse_cursor(value):
+    """
+    Разбирает курсор страницы вида "2025-03-01.123" (дата экзамена и ID).
+    Возвращает кортеж (date, id) или None, если курсор пустой или испорчен.
+    """
+    if not value:
+        return None
+    try:
+        date_str, id_str = value.split(".", 1)
+        return datetime.strptime(date_str, "%Y-%m-%d").date(), int(id_str)
+    except ValueError:
+        return None
+
+
+def make_cursor(training: Training) -> str:
+    return f"{training.exam_date.strftime('%Y-%m-%d')}.{training.id}"
+
+
+def cursor_arg(name):
+    """Курсор из параметра запроса; 400, если он задан, но испорчен."""
+    value = request.args.get(name)
+    cursor = parse_cursor(value)
+    if value and cursor is None:
+        abort(400, "Неверный курсор страницы")
+    return cursor
+
+
+def int_arg(name):
+    """Целое число из параметра запроса; 400, если оно испорчено."""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        abort(400, f"Неверное число: {name}")
+
+
+def date_arg(name, args=None):
+    """Дата ГГГГ-ММ-ДД из параметра запроса (или args); 400, если она испорчена."""
+    value = (request.args if args is None else args).get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        abort(400, f"Неверная дата: {name}")
+
+
+@app.route("/trainings")
+@conditional_get("programs", "participants", "trainings")
+def list_trainings():
+    page_size = int_arg("page_size")
+    if page_size not in TRAININGS_PAGE_SIZES:
+        page_size = TRAININGS_DEFAULT_PAGE_SIZE
+
+    after = cursor_arg("after")
+    before = cursor_arg("before")
+    q = (request.args.get("q") or "").strip()
+
+    # Слушатель и программа подтягиваются тем же запросом (без N+1)
+    query = Training.query.options(
+        joinedload(Training.participant),
+        joinedload(Training.program),
+    )
+    match = fts_query(q)
+    if match:
+        query = query.filter(Training.participant_id.in_(participant_search(match)))
+    key = tuple_(Training.exam_date, Training.id)
+
+    # Keyset-пагинация: (exam_date, id) последней/первой строки страницы,
+    # поэтому время ответа не зависит от того, насколько далеко листать
+    if before:
+        rows = (
+            query
+            .filter(key > before)
+            .order_by(Training.exam_date.asc(), Training.id.asc())
+            .limit(page_size + 1)
+            .all()
+        )
+        if not rows:
+            return redirect(url_for("list_trainings", page_size=page_size, q=q or None))
+        has_prev = len(rows) > page_size
+        has_next = True
+        trainings = rows[:page_size][::-1]
+    else:
+        if after:
+            query = query.filter(key < after)
+        rows = (
+            query
+            .order_by(Training.exam_date.desc(), Training.id.desc())
+            .limit(page_size + 1)
+            .all()
+        )
+        has_prev = after is not None
+        has_next = len(rows) > page_size
+        trainings = rows[:page_size]
+
+    return render_template(
+        "trainings.html",
+        trainings=trainings,
+        page_size=page_size,
+        page_sizes=TRAININGS_PAGE_SIZES,
+        q=q,
+        prev_cursor=make_cursor(trainings[0]) if has_prev and trainings else None,
+        next_cursor=make_cursor(trainings[-1]) if has_next and trainings else None,
+    )
+
+
+# Подсказок в виджете выбора слушателя/программы: по умолчанию и максимум
+SUGGEST_LIMIT = 15
+SUGGEST_MAX_LIMIT = 50
+
+
+def participant_label(p: Participant) -> str:
+    label = p.full_name
+    if p.iin:
+        label += f", ИИН {p.iin}"
+    if p.workplace:
+        label += f" ({p.workplace})"
+    return label
+
+
+def form_reference_id(model, field_name):
+    """ID из скрытого поля виджета выбора; 400, если такой записи нет."""
+    value = request.form.get(field_name, type=int)
+    if value is None or db.session.get(model, value) is None:
+        abort(400)
+    return value
+
+
+def like_escape(value):
+    """Экранирует спецсимволы LIKE (escape-символ — обратная косая черта)."""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def suggest_limit():
+    try:
+        limit = int(request.args.get("limit") or SUGGEST_LIMIT)
+    except ValueError:
+        abort(400, "limit должен быть целым числом")
+    return max(1, min(limit, SUGGEST_MAX_LIMIT))
+
+
+@app.route("/api/participants/suggest")
+def suggest_participants():
+    q = (request.args.get("q") or "").strip()
+    limit = suggest_limit()
+
+    if q.isdigit():
+        # Начало ИИН — диапазон по индексу ix_participants_iin
+        upper = q[:-1] + chr(ord(q[-1]) + 1)
+        participants = (
+            Participant.query
+            .filter(Participant.iin >= q, Participant.iin < upper)
+            .order_by(Participant.iin)
+            .limit(limit)
+            .all()
+        )
+    else:
+        match = fts_query(q)
+        if not match:
+            return jsonify([])
+        participants = search_participants(match, limit)
+
+    return jsonify([
+        {"id": p.id, "label": participant_label(p)} for p in participants
+    ])
+
+
+@app.route("/api/programs/suggest")
+def suggest_programs():
+    q = (request.args.get("q") or "").strip()
+    query = Program.query
+    if q:
+        # LIKE в SQLite не различает регистр только для латиницы;
+        # % и _ из строки поиска — обычные символы, а не шаблон
+        query = query.filter(db.or_(*(
+            Program.name.like(f"%{like_escape(variant)}%", escape="\\")
+            for variant in (q, q.lower(), q.capitalize())
+        )))
+    programs = query.order_by(Program.name).limit(suggest_limit()).all()
+
+    return jsonify([{"id": pr.id, "label": pr.name} for pr in programs])
+
+
+@app.route("/trainings/new", methods=["GET", "POST"])
+def new_training():
+    if request.method == "POST":
+        participant_id = form_reference_id(Participant, "participant_id")
+        program_id = form_reference_id(Program, "program_id")
+
+        training_start_date_str = request.form.get("training_start_date")
+        training_end_date_str = request.form.get("training_end_date")
+        exam_date_str = request.form.get("exam_date")
+
+        questions_total = int(request.form.get("questions_total"))
         correct_answers = int(request.form.get("correct_answers"))
 
         training_start_date = (
@@ -384,19 +1944,9 @@ def new_training():
         )
         exam_date = datetime.strptime(exam_date_str, "%Y-%m-%d").date()
 
-        if questions_total > 0:
-            exam_percent = round(correct_answers / questions_total * 100, 1)
-        else:
-            exam_percent = 0.0
-
-        exam_result = "Положительный" if exam_percent >= 80.0 else "Отрицательный"
-
-        next_exam_date = None
-        if exam_result == "Положительный":
-            try:
-                next_exam_date = exam_date.replace(year=exam_date.year + 1)
-            except ValueError:
-                next_exam_date = exam_date + timedelta(days=365)
+        exam_percent, exam_result, next_exam_date = compute_exam_result(
+            questions_total, correct_answers, exam_date, program_id
+        )
 
         t = Training(
             participant_id=participant_id,
@@ -417,8 +1967,8 @@ def new_training():
     return render_template(
         "training_form.html",
         training=None,
-        participants=participants,
-        programs=programs,
+        participant_label="",
+        program_label="",
         action_url=url_for("new_training"),
         submit_label="Сохранить",
     )
@@ -427,12 +1977,10 @@ def new_training():
 @app.route("/trainings/edit/<int:training_id>", methods=["GET", "POST"])
 def edit_training(training_id):
     training = Training.query.get_or_404(training_id)
-    participants = Participant.query.order_by(Participant.full_name).all()
-    programs = Program.query.order_by(Program.name).all()
 
     if request.method == "POST":
-        training.participant_id = int(request.form.get("participant_id"))
-        training.program_id = int(request.form.get("program_id"))
+        training.participant_id = form_reference_id(Participant, "participant_id")
+        training.program_id = form_reference_id(Program, "program_id")
 
         training_start_date_str = request.form.get("training_start_date")
         training_end_date_str = request.form.get("training_end_date")
@@ -451,34 +1999,25 @@ def edit_training(training_id):
         training.questions_total = int(request.form.get("questions_total"))
         training.correct_answers = int(request.form.get("correct_answers"))
 
-        if training.questions_total > 0:
-            training.exam_percent = round(
-                training.correct_answers / training.questions_total * 100, 1
-            )
-        else:
-            training.exam_percent = 0.0
-
-        training.exam_result = (
-            "Положительный" if training.exam_percent >= 80.0 else "Отрицательный"
+        (
+            training.exam_percent,
+            training.exam_result,
+            training.next_exam_date,
+        ) = compute_exam_result(
+            training.questions_total,
+            training.correct_answers,
+            training.exam_date,
+            training.program_id,
         )
 
-        training.next_exam_date = None
-        if training.exam_result == "Положительный":
-            try:
-                training.next_exam_date = training.exam_date.replace(
-                    year=training.exam_date.year + 1
-                )
-            except ValueError:
-                training.next_exam_date = training.exam_date + timedelta(days=365)
-
         db.session.commit()
         return redirect(url_for("list_trainings"))
 
     return render_template(
         "training_form.html",
         training=training,
-        participants=participants,
-        programs=programs,
+        participant_label=participant_label(training.participant),
+        program_label=training.program.name,
         action_url=url_for("edit_training", training_id=training_id),
         submit_label="Обновить",
     )
@@ -492,91 +2031,261 @@ def delete_training(training_id):
     return redirect(url_for("list_trainings"))
 
 
+@app.route("/trainings/delete", methods=["POST"])
+def delete_trainings():
+    return bulk_delete(Training, "list_trainings")
+
+
 # ----------------- ЖУРНАЛ -------------------
 
 
+# Сколько записей журнала читается из БД за один запрос
+JOURNAL_CHUNK_SIZE = 500
+
+# Сколько фрагментов шаблона копится перед отправкой клиенту
+STREAM_BUFFER_SIZE = 200
+
+
+def iter_journal(chunk_size=JOURNAL_CHUNK_SIZE, date_from=None, date_to=None):
+    """
+    Отдаёт записи журнала по порядку (дата экзамена, ID), читая их из БД
+    порциями по chunk_size вместе со слушателями (один запрос на порцию).
+    В памяти одновременно держится не больше одной порции.
+    """
+    last = None
+    while True:
+        query = Training.query.options(joinedload(Training.participant))
+        if date_from:
+            query = query.filter(Training.exam_date >= date_from)
+        if date_to:
+            query = query.filter(Training.exam_date <= date_to)
+        if last:
+            query = query.filter(tuple_(Training.exam_date, Training.id) > last)
+        chunk = (
+            query
+            .order_by(Training.exam_date.asc(), Training.id.asc())
+            .limit(chunk_size)
+            .all()
+        )
+        if not chunk:
+            return
+        yield from chunk
+        last = (chunk[-1].exam_date, chunk[-1].id)
+        if len(chunk) < chunk_size:
+            return
+
+
+def stream_page(template_name, **context):
+    """
+    Рендерит шаблон потоком: браузер получает начало страницы сразу,
+    а строки таблицы дописываются по мере чтения из БД.
+    """
+    chunks = stream_template(template_name, **context)
+
+    def buffered():
+        # Мелкие фрагменты шаблона отправляются пачками
+        while batch := list(islice(chunks, STREAM_BUFFER_SIZE)):
+            yield "".join(batch)
+
+    return Response(buffered(), mimetype="text/html")
+
+
+def journal_range(args=None):
+    """
+    Период журнала из параметров запроса (или args): (дата с, дата по).
+    Испорченная дата — 400, а не журнал за всё время.
+    """
+    return date_arg("date_from", args), date_arg("date_to", args)
+
+
+def journal_trainings(date_from=None, date_to=None):
+    """
+    Записи журнала за период по порядку (дата экзамена, ID). Если период
+    задан, к рабочей БД добавляются архивы затронутых лет.
+    """
+    current = iter_journal(date_from=date_from, date_to=date_to)
+    if date_from is None and date_to is None:
+        return current
+
+    years = [
+        year for year in archive_years()
+        if (date_from is None or year >= date_from.year)
+        and (date_to is None or year <= date_to.year)
+    ]
+    if not years:
+        return current
+    return heapq.merge(
+        current,
+        *(iter_archived_trainings(year, date_from, date_to) for year in years),
+        key=lambda t: (t.exam_date, t.id),
+    )
+
+
 @app.route("/journal")
+@conditional_get("participants", "trainings")
 def journal():
-    trainings = (
-        Training.query
-        .order_by(Training.exam_date.asc(), Training.id.asc())
-        .all()
+    date_from, date_to = journal_range()
+    return stream_page(
+        "journal.html",
+        trainings=journal_trainings(date_from, date_to),
+        date_from=date_from,
+        date_to=date_to,
+        archive_years=archive_years(),
     )
-    return render_template("journal.html", trainings=trainings)
 
 
-@app.route("/journal/excel")
-def journal_excel():
-    trainings = (
-        Training.query
-        .order_by(Training.exam_date.asc(), Training.id.asc())
-        .all()
-    )
+# Журнал для Excel держится в памяти до этого размера, дальше — на диске
+EXCEL_SPOOL_MAX_SIZE = 8 * 1024 * 1024
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Журнал"
+JOURNAL_HEADERS = [
+    "№",
+    "ФИО слушателя",
+    "Место работы, должность, вид деятельности/услуг",
+    "Период обучения",
+    "Дата экзамена",
+    "Результат экзамена",
+    "Дата очередного экзамена",
+]
 
-    headers = [
-        "№",
-        "ФИО слушателя",
-        "Место работы, должность, вид деятельности/услуг",
-        "Период обучения",
-        "Дата экзамена",
-        "Результат экзамена",
-        "Дата очередного экзамена",
-    ]
-    ws.append(headers)
 
-    for idx, t in enumerate(trainings, start=1):
-        if t.training_start_date and t.training_end_date:
-            period = (
-                f"{t.training_start_date.strftime('%d.%m.%Y')} – "
-                f"{t.training_end_date.strftime('%d.%m.%Y')}"
-            )
-        else:
-            period = ""
+# Готовые выгрузки хранятся на диске до изменения данных: повторное
+# скачивание неизменившегося журнала не строит файл заново.
+EXPORT_CACHE_DIR = os.path.join(DATA_DIR, "export_cache")
 
-        workplace_block = t.participant.workplace or ""
-        position_block = t.participant.position or ""
-        activity_block = t.participant.activity_type or ""
 
-        place_full = workplace_block
-        if position_block:
-            place_full += f", {position_block}"
-        if activity_block:
-            place_full += f", {activity_block}"
+def _export_cache_path(name, etag):
+    return os.path.join(EXPORT_CACHE_DIR, f"{name}-{etag}.xlsx")
 
-        exam_date_str = t.exam_date.strftime("%d.%m.%Y") if t.exam_date else ""
-        result_str = f"{t.exam_result} ({t.exam_percent:.1f} %)"
-        next_exam_str = (
-            t.next_exam_date.strftime("%d.%m.%Y") if t.next_exam_date else ""
-        )
 
-        row = [
-            idx,
-            t.participant.full_name,
-            place_full,
-            period,
-            exam_date_str,
-            result_str,
-            next_exam_str,
-        ]
-        ws.append(row)
+def cached_export(name, etag):
+    """Путь к сохранённой выгрузке для этой версии данных или None."""
+    path = _export_cache_path(name, etag)
+    return path if os.path.exists(path) else None
 
-    for column_cells in ws.columns:
-        length = max(
-            len(str(cell.value)) if cell.value is not None else 0
-            for cell in column_cells
+
+def save_export(name, etag, stream):
+    """
+    Сохраняет выгрузку на диск и удаляет устаревшие версии того же файла.
+    Запись идёт во временный файл, чтобы параллельный запрос не увидел
+    недописанный xlsx.
+    """
+    os.makedirs(EXPORT_CACHE_DIR, exist_ok=True)
+    path = _export_cache_path(name, etag)
+    fd, tmp_path = tempfile.mkstemp(dir=EXPORT_CACHE_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f, stream:
+            shutil.copyfileobj(stream, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+    prefix = f"{name}-"
+    for entry in os.scandir(EXPORT_CACHE_DIR):
+        if (
+            entry.name.startswith(prefix)
+            and entry.name.endswith(".xlsx")
+            and entry.path != path
+        ):
+            try:
+                os.unlink(entry.path)
+            except OSError:
+                pass
+    return path
+
+
+def journal_excel_row(idx, t: Training) -> list:
+    if t.training_start_date and t.training_end_date:
+        period = (
+            f"{t.training_start_date.strftime('%d.%m.%Y')} – "
+            f"{t.training_end_date.strftime('%d.%m.%Y')}"
         )
-        ws.column_dimensions[column_cells[0].column_letter].width = length + 2
+    else:
+        period = ""
+
+    workplace_block = t.participant.workplace or ""
+    position_block = t.participant.position or ""
+    activity_block = t.participant.activity_type or ""
+
+    place_full = workplace_block
+    if position_block:
+        place_full += f", {position_block}"
+    if activity_block:
+        place_full += f", {activity_block}"
+
+    exam_date_str = t.exam_date.strftime("%d.%m.%Y") if t.exam_date else ""
+    result_str = f"{t.exam_result} ({t.exam_percent:.1f} %)"
+    next_exam_str = (
+        t.next_exam_date.strftime("%d.%m.%Y") if t.next_exam_date else ""
+    )
+
+    return [
+        idx,
+        t.participant.full_name,
+        place_full,
+        period,
+        exam_date_str,
+        result_str,
+        next_exam_str,
+    ]
+
+
+def build_excel(sheet_title, headers, rows):
+    """
+    Собирает xlsx из итератора строк за один проход по данным.
 
-    stream = BytesIO()
+    Лист создаётся в режиме write-only, поэтому книга целиком в памяти
+    не держится. Ширина колонок у такого листа задаётся до первой строки,
+    так что строки по ходу подсчёта ширины складываются во временный файл,
+    а затем переписываются в лист. Результат — SpooledTemporaryFile,
+    установленный на начало.
+    """
+    from openpyxl import Workbook
+    from openpyxl.utils import get_column_letter
+
+    widths = [len(str(h)) for h in headers]
+
+    with tempfile.SpooledTemporaryFile(max_size=EXCEL_SPOOL_MAX_SIZE) as spool:
+        for row in rows:
+            for i, value in enumerate(row):
+                if value is not None:
+                    widths[i] = max(widths[i], len(str(value)))
+            pickle.dump(row, spool, pickle.HIGHEST_PROTOCOL)
+        spool.seek(0)
+
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet(sheet_title)
+        for i, width in enumerate(widths, start=1):
+            ws.column_dimensions[get_column_letter(i)].width = width + 2
+
+        ws.append(headers)
+        while True:
+            try:
+                ws.append(pickle.load(spool))
+            except EOFError:
+                break
+
+    stream = tempfile.SpooledTemporaryFile(max_size=EXCEL_SPOOL_MAX_SIZE)
     wb.save(stream)
     stream.seek(0)
+    return stream
+
+
+@app.route("/journal/excel")
+@conditional_get("participants", "trainings")
+def journal_excel():
+    path = cached_export("journal", g.data_etag)
+    if path is None:
+        date_from, date_to = journal_range()
+        rows = (
+            journal_excel_row(idx, t)
+            for idx, t in enumerate(journal_trainings(date_from, date_to), start=1)
+        )
+        stream = build_excel("Журнал", JOURNAL_HEADERS, rows)
+        path = save_export("journal", g.data_etag, stream)
 
     return send_file(
-    stream,
+    path,
     as_attachment=True,
     download_name="journal.xlsx",
     mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
@@ -584,101 +2293,2668 @@ def journal_excel():
 
 
 
-# -------------- СВИДЕТЕЛЬСТВО ---------------
+# ------------ ПОВТОРНЫЕ ЭКЗАМЕНЫ -------------
 
 
-@app.route("/certificate/<int:training_id>")
-def certificate(training_id):
-    training = Training.query.get_or_404(training_id)
+# Окно по умолчанию: просроченные за год и предстоящие в ближайший месяц
+DUE_DAYS_AHEAD = 30
+DUE_OVERDUE_DAYS = 365
+DUE_MAX_DAYS = 3650
 
-    # Контрольный код (аналог "цифровой подписи" документа)
-    control_hash = generate_control_hash(training)
+DUE_HEADERS = [
+    "№",
+    "ФИО слушателя",
+    "ИИН",
+    "Место работы, должность",
+    "Программа",
+    "Дата экзамена",
+    "Дата очередного экзамена",
+    "Статус",
+]
 
-    # Данные, включаемые в QR-код
-    qr_data = (
-        f"КГП \"Поликлиника № 2 города Костанай\"\n"
-        f"Свидетельство № {training.id}\n"
-        f"ФИО: {training.participant.full_name}\n"
-        f"Дата экзамена: {training.exam_date.strftime('%d.%m.%Y')}\n"
-        f"Результат: {training.exam_result} ({training.exam_percent:.1f} %)\n"
-        f"Контрольный код: {control_hash}"
+
+def due_window(args=None):
+    """
+    Читает окно из параметров запроса (или формы args):
+    (дней вперёд, дней просрочки).
+    """
+    args = request.args if args is None else args
+    try:
+        days_ahead = int(args.get("days_ahead") or DUE_DAYS_AHEAD)
+        overdue_days = int(args.get("overdue_days") or DUE_OVERDUE_DAYS)
+    except ValueError:
+        abort(400, "Число дней должно быть целым числом")
+    return (
+        max(0, min(days_ahead, DUE_MAX_DAYS)),
+        max(0, min(overdue_days, DUE_MAX_DAYS)),
+    )
+
+
+def due_trainings(days_ahead, overdue_days, today=None):
+    """
+    Последнее обучение каждого слушателя, у которого дата очередного
+    экзамена попадает в окно [сегодня - overdue_days, сегодня + days_ahead].
+
+    Один запрос: диапазон по индексу ix_trainings_next_exam_participant,
+    а "последнее ли это обучение слушателя" проверяется NOT EXISTS
+    по индексу ix_trainings_participant_exam.
+    """
+    today = today or date.today()
+    newer = aliased(Training)
+    has_newer = (
+        db.select(newer.id)
+        .where(
+            newer.participant_id == Training.participant_id,
+            tuple_(newer.exam_date, newer.id)
+            > tuple_(Training.exam_date, Training.id),
+        )
+        .exists()
+    )
+
+    return (
+        Training.query
+        .options(joinedload(Training.participant), joinedload(Training.program))
+        .filter(
+            Training.next_exam_date >= today - timedelta(days=overdue_days),
+            Training.next_exam_date <= today + timedelta(days=days_ahead),
+            ~has_newer,
+        )
+        .order_by(Training.next_exam_date.asc(), Training.id.asc())
+        .all()
     )
 
-    qr_image = generate_qr_base64(qr_data)
+
+def due_status(t: Training, today) -> str:
+    days = (t.next_exam_date - today).days
+    if days < 0:
+        return f"Просрочен на {-days} дн."
+    if days == 0:
+        return "Сегодня"
+    return f"Через {days} дн."
+
+
+@app.route("/due")
+@conditional_get("programs", "participants", "trainings", daily=True)
+def due():
+    days_ahead, overdue_days = due_window()
+    today = date.today()
+    trainings = due_trainings(days_ahead, overdue_days, today)
 
     return render_template(
-        "certificate.html",
-        training=training,
-        qr_image=qr_image,
-        control_hash=control_hash,
+        "due.html",
+        trainings=trainings,
+        statuses=[due_status(t, today) for t in trainings],
+        today=today,
+        days_ahead=days_ahead,
+        overdue_days=overdue_days,
     )
 
 
-# -------------- КЛАСС СЕРВЕРА  --------------
+def due_excel_rows(trainings, today):
+    for idx, t in enumerate(trainings, start=1):
+        place = t.participant.workplace or ""
+        if t.participant.position:
+            place += f", {t.participant.position}"
+        yield [
+            idx,
+            t.participant.full_name,
+            t.participant.iin or "",
+            place,
+            t.program.name,
+            t.exam_date.strftime("%d.%m.%Y"),
+            t.next_exam_date.strftime("%d.%m.%Y"),
+            due_status(t, today),
+        ]
 
 
-class ServerThread(threading.Thread):
-    def __init__(self, flask_app, host="127.0.0.1", port=5000):
-        super().__init__(daemon=True)
-        self.host = host
-        self.port = port
-        self.srv = make_server(host, port, flask_app)
-        self.ctx = flask_app.app_context()
-        self.ctx.push()
+def due_excel_name(today):
+    return f"due_{today.strftime('%Y-%m-%d')}.xlsx"
 
-    def run(self):
-        self.srv.serve_forever()
 
-    def shutdown(self):
-        self.srv.shutdown()
+@app.route("/due/excel")
+@conditional_get("programs", "participants", "trainings", daily=True)
+def due_excel():
+    days_ahead, overdue_days = due_window()
+    today = date.today()
 
+    trainings = due_trainings(days_ahead, overdue_days, today)
+    stream = build_excel("Повторные экзамены", DUE_HEADERS, due_excel_rows(trainings, today))
 
-# ----------------- ЗАПУСК -------------------
+    return send_file(
+        stream,
+        as_attachment=True,
+        download_name=due_excel_name(today),
+        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    )
 
 
-if __name__ == "__main__":
-    HOST = "127.0.0.1"
-    PORT = 5000
-    URL = f"http://{HOST}:{PORT}"
+# ---------------- СТАТИСТИКА ----------------
 
-    # Запускаем сервер в отдельном потоке
-    server = ServerThread(app, host=HOST, port=PORT)
-    server.start()
 
-    # Окно управления
-    root = tk.Tk()
-    root.title("Гигиеническое обучение — ИС")
-    root.geometry("420x170")
-    root.resizable(False, False)
+# Сколько мест работы показывать в статистике
+STATS_WORKPLACES_LIMIT = 100
 
-    lbl1 = tk.Label(root, text="Информационная система запущена", font=("Segoe UI", 12, "bold"))
-    lbl1.pack(pady=(18, 6))
 
-    lbl2 = tk.Label(root, text=URL, font=("Segoe UI", 10))
-    lbl2.pack(pady=(0, 14))
+def stats_query(group_sql, select_sql, order_sql, month_from, month_to, limit=None):
+    """
+    GROUP BY по сводной таблице training_stats за период месяцев
+    (строки 'ГГГГ-ММ', любая граница может быть None).
+    """
+    sql = (
+        f"SELECT {select_sql}, sum(s.total) AS total, sum(s.passed) AS passed, "
+        f"sum(s.percent_sum) / sum(s.total) AS avg_percent "
+        f"FROM training_stats s "
+        f"WHERE (:month_from IS NULL OR s.month >= :month_from) "
+        f"AND (:month_to IS NULL OR s.month <= :month_to) "
+        f"GROUP BY {group_sql} HAVING sum(s.total) > 0 ORDER BY {order_sql}"
+    )
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+    return db.session.execute(
+        db.text(sql), {"month_from": month_from, "month_to": month_to}
+    ).mappings().all()
+
+
+def stats_month_arg(name):
+    """Месяц ГГГГ-ММ из параметра запроса; 400, если он испорчен."""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        # Приводим к виду ключа сводки: 2025-3 -> 2025-03
+        return datetime.strptime(value, "%Y-%m").strftime("%Y-%m")
+    except ValueError:
+        abort(400, f"Неверный месяц: {name}")
+
+
+@app.route("/stats")
+@conditional_get("programs", "participants", "trainings")
+def stats():
+    month_from = stats_month_arg("month_from")
+    month_to = stats_month_arg("month_to")
+
+    by_program = stats_query(
+        "s.program_id",
+        "s.program_id, (SELECT name FROM programs WHERE id = s.program_id) AS name",
+        "total DESC",
+        month_from, month_to,
+    )
+    by_month = stats_query("s.month", "s.month", "s.month", month_from, month_to)
+    by_workplace = stats_query(
+        "s.workplace", "s.workplace", "total DESC",
+        month_from, month_to, STATS_WORKPLACES_LIMIT,
+    )
 
-    btn_frame = tk.Frame(root)
-    btn_frame.pack()
+    total = sum(row["total"] for row in by_month)
+    passed = sum(row["passed"] for row in by_month)
 
-    def open_site():
-        webbrowser.open(URL)
+    return render_template(
+        "stats.html",
+        month_from=month_from,
+        month_to=month_to,
+        by_program=by_program,
+        by_month=by_month,
+        by_workplace=by_workplace,
+        workplaces_limit=STATS_WORKPLACES_LIMIT,
+        total=total,
+        passed=passed,
+    )
+
+
+# ---------- ИМПОРТ ИЗ EXCEL / CSV -----------
+
+
+# Заголовки колонок файла импорта (без учёта регистра и "*") -> поле
+IMPORT_COLUMNS = {
+    "фио": "full_name",
+    "фио слушателя": "full_name",
+    "иин": "iin",
+    "дата рождения": "birth_date",
+    "пол": "sex",
+    "№ лмк": "lmk_number",
+    "лмк": "lmk_number",
+    "место работы": "workplace",
+    "должность": "position",
+    "вид деятельности/услуг": "activity_type",
+    "вид деятельности": "activity_type",
+    "программа": "program",
+    "дата начала обучения": "training_start_date",
+    "дата окончания обучения": "training_end_date",
+    "дата экзамена": "exam_date",
+    "всего вопросов": "questions_total",
+    "правильных ответов": "correct_answers",
+}
+
+# Сколько строк вставляется одной транзакцией
+IMPORT_BATCH_SIZE = 500
+
+# Сколько ошибок показывать в отчёте
+IMPORT_MAX_ERRORS = 1000
+
+# По началу CSV определяется его кодировка
+IMPORT_ENCODING_SAMPLE = 64 * 1024
+
+
+class ImportRowError(ValueError):
+    pass
+
+
+def iter_import_rows(file_storage):
+    """
+    Построчно читает загруженный .xlsx (openpyxl read-only) или .csv
+    и отдаёт (номер строки, {поле: значение}) по заголовкам IMPORT_COLUMNS.
+    """
+    filename = (file_storage.filename or "").lower()
+
+    if filename.endswith(".xlsx"):
+        from openpyxl import load_workbook
+        from openpyxl.utils.exceptions import InvalidFileException
 
-    def stop_app():
         try:
-            server.shutdown()
+            wb = load_workbook(file_storage.stream, read_only=True, data_only=True)
+        except (zipfile.BadZipFile, InvalidFileException, KeyError):
+            raise ImportRowError("Файл повреждён или не является книгой Excel (.xlsx)")
+        try:
+            rows = wb.worksheets[0].iter_rows(values_only=True)
+            yield from _map_import_rows(rows)
         finally:
-            root.destroy()
+            wb.close()
+    elif filename.endswith(".csv"):
+        encoding = _csv_encoding(file_storage.stream)
+        text = io.TextIOWrapper(file_storage.stream, encoding=encoding, newline="")
+        try:
+            sample = text.read(4096)
+            text.seek(0)
+            try:
+                dialect = csv.Sniffer().sniff(sample, delimiters=";,\t")
+            except csv.Error:
+                dialect = "excel"
+            yield from _map_import_rows(csv.reader(text, dialect))
+        except UnicodeDecodeError:
+            raise ImportRowError(
+                "Не удалось прочитать текст файла: сохраните CSV в кодировке UTF-8"
+            )
+    else:
+        raise ImportRowError("Поддерживаются только файлы .xlsx и .csv")
 
-    btn_open = tk.Button(btn_frame, text="Открыть в браузере", width=18, command=open_site)
-    btn_open.grid(row=0, column=0, padx=8)
 
-    btn_stop = tk.Button(btn_frame, text="Завершить работу", width=18, command=stop_app)
-    btn_stop.grid(row=0, column=1, padx=8)
+def _csv_encoding(stream):
+    """
+    UTF-8 (с BOM или без) либо cp1251 — в ней CSV сохраняет Excel
+    с русской локалью.
+    """
+    sample = stream.read(IMPORT_ENCODING_SAMPLE)
+    stream.seek(0)
+    try:
+        # Неполный последний символ образца ошибкой не считается
+        codecs.getincrementaldecoder("utf-8")().decode(sample)
+    except UnicodeDecodeError:
+        return "cp1251"
+    return "utf-8-sig"
+
+
+def _map_import_rows(rows):
+    header = next(rows, None)
+    if header is None:
+        return
+
+    fields = [
+        IMPORT_COLUMNS.get(str(h or "").replace("*", "").strip().lower())
+        for h in header
+    ]
+    if "full_name" not in fields:
+        raise ImportRowError("В первой строке файла нет колонки «ФИО»")
+
+    for row_number, row in enumerate(rows, start=2):
+        record = {}
+        for field, value in zip(fields, row):
+            if field is None:
+                continue
+            if isinstance(value, str):
+                value = value.strip() or None
+            record[field] = value
+        if any(v is not None for v in record.values()):
+            yield row_number, record
+
+
+def _import_date(value, label, required=False):
+    if value is None:
+        if required:
+            raise ImportRowError(f"не заполнено поле «{label}»")
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    for fmt in ("%d.%m.%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(str(value), fmt).date()
+        except ValueError:
+            pass
+    raise ImportRowError(f"неверная дата в поле «{label}»: {value}")
 
-    # Автооткрытие браузера через 1 сек (по желанию)
-    root.after(1000, open_site)
 
-    # Если пользователь закрывает окно крестиком — тоже корректно выключаем
-    root.protocol("WM_DELETE_WINDOW", stop_app)
+def _import_int(value, label):
+    if value is None:
+        raise ImportRowError(f"не заполнено поле «{label}»")
+    try:
+        number = float(str(value).replace(",", "."))
+    except ValueError:
+        raise ImportRowError(f"в поле «{label}» должно быть число: {value}")
+    if number != int(number) or number < 0:
+        raise ImportRowError(f"в поле «{label}» должно быть целое число: {value}")
+    return int(number)
 
-    root.mainloop()
+
+def parse_import_record(record, program_ids, policies):
+    """
+    Проверяет строку файла и возвращает (данные слушателя, данные обучения).
+    Данные обучения — None, если в строке нет экзамена.
+    program_ids — словарь "название программы в нижнем регистре" -> ID,
+    policies — правила оценки из load_scoring_policies().
+    """
+    if not record.get("full_name"):
+        raise ImportRowError("не заполнено поле «ФИО»")
+
+    iin = record.get("iin")
+    if isinstance(iin, (int, float)):
+        # Excel хранит ИИН числом и теряет ведущие нули
+        iin = str(int(iin)).zfill(12)
+    if iin is not None:
+        iin = str(iin)
+        if not (iin.isdigit() and len(iin) == 12):
+            raise ImportRowError(f"ИИН должен состоять из 12 цифр: {record.get('iin')}")
+
+    sex = record.get("sex")
+    if sex is not None:
+        sex = str(sex).strip().upper()[:1]
+        if sex not in ("М", "Ж"):
+            raise ImportRowError(f"пол должен быть «М» или «Ж»: {record.get('sex')}")
+
+    participant = {
+        "full_name": str(record["full_name"]),
+        "iin": iin,
+        "birth_date": _import_date(record.get("birth_date"), "Дата рождения"),
+        "sex": sex,
+        "lmk_number": _import_str(record.get("lmk_number")),
+        "workplace": _import_str(record.get("workplace")),
+        "position": _import_str(record.get("position")),
+        "activity_type": _import_str(record.get("activity_type")),
+    }
+
+    exam_fields = ("program", "exam_date", "questions_total", "correct_answers")
+    if all(record.get(f) is None for f in exam_fields):
+        return participant, None
+
+    program_name = record.get("program")
+    if program_name is None:
+        raise ImportRowError("не заполнено поле «Программа»")
+    program_id = program_ids.get(str(program_name).strip().lower())
+    if program_id is None:
+        raise ImportRowError(f"программа не найдена в справочнике: {program_name}")
+
+    exam_date = _import_date(record.get("exam_date"), "Дата экзамена", required=True)
+    questions_total = _import_int(record.get("questions_total"), "Всего вопросов")
+    correct_answers = _import_int(record.get("correct_answers"), "Правильных ответов")
+    # Как и в форме обучения, 0 вопросов допустим: процент будет 0
+    if correct_answers > questions_total:
+        raise ImportRowError("правильных ответов больше, чем вопросов")
+
+    exam_percent, exam_result, next_exam_date = compute_exam_result(
+        questions_total, correct_answers, exam_date, program_id, policies
+    )
+
+    training = {
+        "program_id": program_id,
+        "training_start_date": _import_date(
+            record.get("training_start_date"), "Дата начала обучения"
+        ),
+        "training_end_date": _import_date(
+            record.get("training_end_date"), "Дата окончания обучения"
+        ),
+        "exam_date": exam_date,
+        "questions_total": questions_total,
+        "correct_answers": correct_answers,
+        "exam_percent": exam_percent,
+        "exam_result": exam_result,
+        "next_exam_date": next_exam_date,
+    }
+    return participant, training
+
+
+def _import_str(value):
+    return str(value) if value is not None else None
+
+
+def import_batch(batch, iin_ids, stats):
+    """
+    Записывает пачку проверенных строк: новых слушателей и обучения
+    вставляет через executemany, в одной транзакции.
+    iin_ids — общий для всего импорта словарь ИИН -> ID слушателя.
+    """
+    lookup = {p["iin"] for p, _ in batch if p["iin"] and p["iin"] not in iin_ids}
+    if lookup:
+        rows = db.session.execute(
+            db.select(Participant.iin, Participant.id)
+            .where(Participant.iin.in_(lookup))
+            .order_by(Participant.id)
+        )
+        for iin, participant_id in rows:
+            iin_ids.setdefault(iin, participant_id)
+
+    # Для каждой строки — ID уже известного слушателя либо номер нового.
+    # Новый слушатель без ИИН заводится на каждую строку, с ИИН — один раз.
+    slots = []
+    new_participants = []
+    new_by_iin = {}
+    for participant, _ in batch:
+        iin = participant["iin"]
+        if iin in iin_ids:
+            slots.append((iin_ids[iin], None))
+        elif iin in new_by_iin:
+            slots.append((None, new_by_iin[iin]))
+        else:
+            if iin:
+                new_by_iin[iin] = len(new_participants)
+            slots.append((None, len(new_participants)))
+            new_participants.append(participant)
+
+    new_ids = []
+    if new_participants:
+        new_ids = list(db.session.execute(
+            insert(Participant).returning(
+                Participant.id, sort_by_parameter_order=True
+            ),
+            new_participants,
+        ).scalars())
+    for iin, index in new_by_iin.items():
+        iin_ids[iin] = new_ids[index]
+
+    trainings = []
+    for (participant_id, new_index), (_, training) in zip(slots, batch):
+        if training is None:
+            continue
+        if participant_id is None:
+            participant_id = new_ids[new_index]
+        trainings.append({**training, "participant_id": participant_id})
+
+    if trainings:
+        db.session.execute(insert(Training), trainings)
+    db.session.commit()
+
+    stats["participants"] += len(new_participants)
+    stats["trainings"] += len(trainings)
+
+
+@app.route("/import", methods=["GET", "POST"])
+def import_data():
+    if request.method == "GET":
+        return render_template("import.html", result=None)
+
+    file_storage = request.files.get("file")
+    if not file_storage or not file_storage.filename:
+        return render_template(
+            "import.html",
+            result={"fatal": "Выберите файл для загрузки."},
+        )
+
+    program_ids = {
+        name.strip().lower(): program_id
+        for program_id, name in db.session.execute(
+            db.select(Program.id, Program.name).order_by(Program.id.desc())
+        )
+    }
+    policies = load_scoring_policies()
+
+    stats = {"rows": 0, "participants": 0, "trainings": 0, "errors": 0}
+    errors = []
+    iin_ids = {}
+    batch = []
+
+    try:
+        for row_number, record in iter_import_rows(file_storage):
+            stats["rows"] += 1
+            try:
+                batch.append(parse_import_record(record, program_ids, policies))
+            except ImportRowError as e:
+                stats["errors"] += 1
+                if len(errors) < IMPORT_MAX_ERRORS:
+                    errors.append((row_number, str(e)))
+                continue
+
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                import_batch(batch, iin_ids, stats)
+                batch = []
+
+        if batch:
+            import_batch(batch, iin_ids, stats)
+    except ImportRowError as e:
+        db.session.rollback()
+        return render_template("import.html", result={"fatal": str(e)})
+
+    return render_template(
+        "import.html",
+        result={"stats": stats, "errors": errors},
+    )
+
+
+# -------------- СВИДЕТЕЛЬСТВО ---------------
+
+
+@app.route("/certificate/<int:training_id>")
+@conditional_get("programs", "participants", "trainings")
+def certificate(training_id):
+    training = db.session.get(Training, training_id)
+    if training is None:
+        # Старые ссылки и QR-коды ведут на свидетельства, перенесённые в архив
+        for year in archive_years():
+            if find_archived_training(year, training_id) is not None:
+                return redirect(url_for(
+                    "archived_certificate", year=year, training_id=training_id
+                ))
+        abort(404)
+
+    # Контрольный код (аналог "цифровой подписи" документа)
+    control_hash = generate_control_hash(training)
+
+    qr_data = certificate_qr_data(training, control_hash)
+    qr_image = qr_cache.get_or_create(qr_data)
+
+    return render_template(
+        "certificate.html",
+        training=training,
+        qr_image=qr_image,
+        control_hash=control_hash,
+    )
+
+
+# Больше свидетельств за раз браузер печатает с трудом
+CERTIFICATE_BATCH_LIMIT = 500
+
+
+@app.route("/certificates/batch")
+def certificates_batch():
+    programs = Program.query.order_by(Program.name).all()
+
+    date_from = date_arg("date_from")
+    date_to = date_arg("date_to")
+    filters = {
+        "date_from": request.args.get("date_from") or None,
+        "date_to": request.args.get("date_to") or None,
+        "program_id": int_arg("program_id"),
+        "id_from": int_arg("id_from"),
+        "id_to": int_arg("id_to"),
+        "passed_only": bool(request.args.get("passed_only")),
+    }
+
+    # Без параметров — только форма отбора
+    if not request.args:
+        filters["passed_only"] = True
+        return render_template(
+            "certificates_batch.html",
+            programs=programs,
+            filters=filters,
+            trainings=None,
+        )
+
+    query = Training.query.options(
+        joinedload(Training.participant),
+        joinedload(Training.program),
+    )
+    if date_from:
+        query = query.filter(Training.exam_date >= date_from)
+    if date_to:
+        query = query.filter(Training.exam_date <= date_to)
+    if filters["program_id"]:
+        query = query.filter(Training.program_id == filters["program_id"])
+    if filters["id_from"]:
+        query = query.filter(Training.id >= filters["id_from"])
+    if filters["id_to"]:
+        query = query.filter(Training.id <= filters["id_to"])
+    if filters["passed_only"]:
+        query = query.filter(Training.exam_result == "Положительный")
+
+    trainings = (
+        query
+        .order_by(Training.exam_date.asc(), Training.id.asc())
+        .limit(CERTIFICATE_BATCH_LIMIT + 1)
+        .all()
+    )
+    truncated = len(trainings) > CERTIFICATE_BATCH_LIMIT
+    trainings = trainings[:CERTIFICATE_BATCH_LIMIT]
+
+    qr_images = generate_qr_batch([
+        certificate_qr_data(t, generate_control_hash(t)) for t in trainings
+    ])
+
+    return render_template(
+        "certificates_batch.html",
+        programs=programs,
+        filters=filters,
+        trainings=trainings,
+        qr_images=qr_images,
+        truncated=truncated,
+        limit=CERTIFICATE_BATCH_LIMIT,
+    )
+
+
+# ---------- ПРОВЕРКА СВИДЕТЕЛЬСТВ -----------
+
+
+VERIFY_BATCH_LIMIT = 1000
+VERIFY_CHUNK_SIZE = 500
+
+# Контрольный код — 64 шестнадцатеричных символа; так его можно найти
+# и в тексте, считанном с QR-кода
+CONTROL_HASH_RE = re.compile(r"\b[0-9a-fA-F]{64}\b")
+
+
+def extract_control_hashes(text):
+    """Уникальные контрольные коды из текста в порядке появления."""
+    codes = OrderedDict()
+    for match in CONTROL_HASH_RE.finditer(text or ""):
+        codes[match.group(0).lower()] = None
+    return list(codes)
+
+
+def find_by_control_hashes(codes):
+    """Словарь код -> обучение; поиск идёт по индексу control_hash."""
+    # Строки, записанные в БД другими программами уже при работающей ИС
+    ensure_control_hashes()
+
+    found = {}
+    for start in range(0, len(codes), VERIFY_CHUNK_SIZE):
+        chunk = codes[start:start + VERIFY_CHUNK_SIZE]
+        trainings = (
+            Training.query
+            .options(joinedload(Training.participant), joinedload(Training.program))
+            .filter(Training.control_hash.in_(chunk))
+            .all()
+        )
+        for t in trainings:
+            found[t.control_hash] = t
+
+    # Не найденные в рабочей БД коды ищем в архивах (тоже по индексу)
+    missing = [code for code in codes if code not in found]
+    for year in archive_years():
+        if not missing:
+            break
+        for t in find_archived_by_control_hashes(year, missing):
+            found[t.control_hash] = t
+        missing = [code for code in missing if code not in found]
+    return found
+
+
+@app.route("/verify", methods=["GET", "POST"])
+def verify():
+    """Проверка списка контрольных кодов (по одному в строке или текст QR)."""
+    text = request.form.get("codes", "") if request.method == "POST" else ""
+    codes = extract_control_hashes(text)
+    truncated = len(codes) > VERIFY_BATCH_LIMIT
+    codes = codes[:VERIFY_BATCH_LIMIT]
+
+    found = find_by_control_hashes(codes)
+    results = [(code, found.get(code)) for code in codes]
+
+    return render_template(
+        "verify.html",
+        text=text,
+        results=results,
+        checked=request.method == "POST",
+        truncated=truncated,
+        limit=VERIFY_BATCH_LIMIT,
+    )
+
+
+@app.route("/verify/<code>")
+def verify_code(code):
+    codes = extract_control_hashes(code)
+    training = find_by_control_hashes(codes[:1]).get(codes[0]) if codes else None
+
+    return render_template(
+        "verify.html",
+        text=code,
+        results=[(code.lower(), training)],
+        checked=True,
+        truncated=False,
+        limit=VERIFY_BATCH_LIMIT,
+    )
+
+
+# ------------- ФОНОВЫЕ ЗАДАЧИ ---------------
+
+# Тяжёлые выгрузки строятся в отдельных потоках, а не в потоке запроса:
+# страница сразу получает номер задачи и опрашивает её прогресс.
+JOB_WORKERS = 2
+JOB_MAX_AGE = timedelta(hours=24)        # сколько хранить задачи и их файлы
+JOB_PROGRESS_INTERVAL = 0.5              # сек. между записями прогресса в БД
+EXPORTS_DIR = os.path.join(DATA_DIR, "exports")
+
+# вид задачи -> (название, функция(progress, **params) -> (поток, имя файла)
+# или None, если файла у задачи нет)
+JOB_KINDS = {}
+
+_job_executor = None
+_job_executor_lock = threading.Lock()
+
+
+def job_kind(kind, title):
+    """Регистрирует функцию как вид фоновой задачи."""
+    def decorator(func):
+        JOB_KINDS[kind] = (title, func)
+        return func
+    return decorator
+
+
+def get_job_executor():
+    global _job_executor
+    with _job_executor_lock:
+        if _job_executor is None:
+            _job_executor = ThreadPoolExecutor(
+                max_workers=JOB_WORKERS, thread_name_prefix="job"
+            )
+        return _job_executor
+
+
+def update_job(job_id, **values):
+    # Отдельное соединение: сессия задачи в это время читает данные
+    with db.engine.begin() as conn:
+        conn.execute(update(Job).where(Job.id == job_id).values(**values))
+
+
+class JobProgress:
+    """Счётчик обработанных строк; в БД пишется не чаще JOB_PROGRESS_INTERVAL."""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.done = 0
+        self._saved_at = 0.0
+
+    def set_total(self, total):
+        update_job(self.job_id, total=total)
+
+    def advance(self, count=1):
+        self.done += count
+        now = time.perf_counter()
+        if now - self._saved_at >= JOB_PROGRESS_INTERVAL:
+            self._saved_at = now
+            update_job(self.job_id, progress=self.done)
+
+    def track(self, iterable):
+        for item in iterable:
+            yield item
+            self.advance()
+
+
+def job_file_path(job):
+    return os.path.join(EXPORTS_DIR, job.file_name)
+
+
+def run_job(job_id):
+    with app.app_context():
+        job = db.session.get(Job, job_id)
+        func = JOB_KINDS[job.kind][1]
+        params = json.loads(job.params or "{}")
+        update_job(job_id, status="running")
+
+        try:
+            progress = JobProgress(job_id)
+            result = func(progress, **params)
+
+            # Задача без файла результата (например, пересчёт) возвращает None
+            file_name = download_name = None
+            if result is not None:
+                stream, download_name = result
+                os.makedirs(EXPORTS_DIR, exist_ok=True)
+                file_name = f"job-{job_id}{os.path.splitext(download_name)[1]}"
+                tmp_path = os.path.join(EXPORTS_DIR, file_name + ".tmp")
+                with stream, open(tmp_path, "wb") as f:
+                    shutil.copyfileobj(stream, f)
+                os.replace(tmp_path, os.path.join(EXPORTS_DIR, file_name))
+        except Exception as e:
+            app.logger.error(f"Job {job_id} ({job.kind}) failed", exc_info=e)
+            update_job(
+                job_id,
+                status="failed",
+                error=str(e) or e.__class__.__name__,
+                finished_at=datetime.utcnow(),
+            )
+        else:
+            update_job(
+                job_id,
+                status="done",
+                progress=progress.done,
+                file_name=file_name,
+                download_name=download_name,
+                finished_at=datetime.utcnow(),
+            )
+
+
+def submit_job(kind, **params):
+    """Ставит задачу в очередь и возвращает её ID."""
+    cleanup_jobs()
+    job = Job(kind=kind, params=json.dumps(params, ensure_ascii=False))
+    db.session.add(job)
+    db.session.commit()
+    get_job_executor().submit(run_job, job.id)
+    return job.id
+
+
+def cleanup_jobs():
+    """Удаляет задачи старше JOB_MAX_AGE вместе с их файлами."""
+    cutoff = datetime.utcnow() - JOB_MAX_AGE
+    old_jobs = Job.query.filter(
+        Job.created_at < cutoff,
+        Job.status.in_(("done", "failed")),
+    ).all()
+    if old_jobs:
+        for job in old_jobs:
+            db.session.delete(job)
+        db.session.commit()
+
+    # Файлы удаляем по возрасту: так уходят и остатки прерванных задач
+    if not os.path.isdir(EXPORTS_DIR):
+        return
+    cutoff_ts = time.time() - JOB_MAX_AGE.total_seconds()
+    for entry in os.scandir(EXPORTS_DIR):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff_ts:
+                os.unlink(entry.path)
+        except OSError:
+            pass
+
+
+def fail_interrupted_jobs():
+    """Задачи, не завершившиеся до перезапуска программы, уже не выполнятся."""
+    interrupted = (
+        update(Job)
+        .where(Job.status.in_(("queued", "running")))
+        .values(
+            status="failed",
+            error="Прервано перезапуском программы",
+            finished_at=datetime.utcnow(),
+        )
+    )
+    with db.engine.begin() as conn:
+        conn.execute(interrupted)
+
+
+def job_state(job):
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "title": JOB_KINDS.get(job.kind, (job.kind,))[0],
+        "status": job.status,
+        "progress": job.progress,
+        "total": job.total,
+        "error": job.error,
+        "download_url": (
+            url_for("job_download", job_id=job.id)
+            if job.status == "done" and job.file_name else None
+        ),
+    }
+
+
+@job_kind("journal_excel", "Журнал (Excel)")
+def journal_excel_job(progress, date_from=None, date_to=None):
+    date_from, date_to = journal_range({"date_from": date_from, "date_to": date_to})
+    progress.set_total(journal_count(date_from, date_to))
+    trainings = journal_trainings(date_from, date_to)
+    rows = (
+        journal_excel_row(idx, t)
+        for idx, t in enumerate(progress.track(trainings), start=1)
+    )
+    return build_excel("Журнал", JOURNAL_HEADERS, rows), "journal.xlsx"
+
+
+@job_kind("due_excel", "Повторные экзамены (Excel)")
+def due_excel_job(progress, days_ahead, overdue_days):
+    today = date.today()
+    trainings = due_trainings(days_ahead, overdue_days, today)
+    rows = due_excel_rows(progress.track(trainings), today)
+    return build_excel("Повторные экзамены", DUE_HEADERS, rows), due_excel_name(today)
+
+
+@app.route("/journal/excel/job", methods=["POST"])
+def journal_excel_start():
+    date_from, date_to = journal_range(request.form)
+    job_id = submit_job(
+        "journal_excel",
+        date_from=date_from.isoformat() if date_from else None,
+        date_to=date_to.isoformat() if date_to else None,
+    )
+    return redirect(url_for("job_page", job_id=job_id))
+
+
+@app.route("/due/excel/job", methods=["POST"])
+def due_excel_start():
+    days_ahead, overdue_days = due_window(request.form)
+    job_id = submit_job("due_excel", days_ahead=days_ahead, overdue_days=overdue_days)
+    return redirect(url_for("job_page", job_id=job_id))
+
+
+@app.route("/jobs")
+def list_jobs():
+    jobs = Job.query.order_by(Job.id.desc()).limit(100).all()
+    return render_template("jobs.html", jobs=[job_state(job) for job in jobs])
+
+
+@app.route("/jobs/<int:job_id>")
+def job_page(job_id):
+    job = db.get_or_404(Job, job_id)
+    return render_template("job.html", job=job_state(job))
+
+
+@app.route("/jobs/<int:job_id>.json")
+def job_status(job_id):
+    job = db.get_or_404(Job, job_id)
+    return jsonify(job_state(job))
+
+
+@app.route("/jobs/<int:job_id>/download")
+def job_download(job_id):
+    job = db.get_or_404(Job, job_id)
+    if (
+        job.status != "done"
+        or not job.file_name
+        or not os.path.exists(job_file_path(job))
+    ):
+        abort(404)
+    return send_file(
+        job_file_path(job),
+        as_attachment=True,
+        download_name=job.download_name,
+    )
+
+
+# ------------ ПРАВИЛА ОЦЕНКИ ---------------
+
+# Пересчёт идёт диапазонами ID, каждый — своей транзакцией
+RECOMPUTE_BATCH_SIZE = 5000
+
+# Новые значения считаются в SQL: процент — той же функцией, что и в Python,
+# дата — с переносом 31-го числа на последний день короткого месяца.
+RECOMPUTE_SQL = """
+UPDATE trainings
+SET exam_percent = n.percent,
+    exam_result = n.result,
+    next_exam_date = n.next_date
+FROM (
+    SELECT id, percent,
+        CASE WHEN percent >= :threshold
+            THEN 'Положительный' ELSE 'Отрицательный' END AS result,
+        CASE
+            WHEN percent < :threshold THEN NULL
+            WHEN strftime('%d', date(exam_date, :shift)) = strftime('%d', exam_date)
+                THEN date(exam_date, :shift)
+            ELSE date(exam_date, :shift, 'start of month', '-1 day')
+        END AS next_date
+    FROM (
+        SELECT id, exam_date,
+            exam_percent(questions_total, correct_answers) AS percent
+        FROM trainings
+        WHERE id > :id_from AND id <= :id_to
+          AND exam_date >= :date_from
+          AND {program_filter}
+    )
+) AS n
+WHERE trainings.id = n.id
+  AND (trainings.exam_percent IS NOT n.percent
+       OR trainings.exam_result IS NOT n.result
+       OR trainings.next_exam_date IS NOT n.next_date)
+"""
+
+
+def recompute_results(program_id=None, date_from=None, progress=None):
+    """
+    Пересчитывает exam_percent, exam_result и next_exam_date по текущим
+    правилам: для программы program_id или для всех программ. Строки,
+    значения которых не изменились, не перезаписываются.
+    Возвращает число изменённых обучений.
+    """
+    policies = load_scoring_policies()
+    own_policy = [pid for pid in policies if pid is not None]
+
+    # (фильтр по программе, правила) — по одному UPDATE на набор правил
+    targets = []
+    if program_id is not None:
+        targets.append(("program_id = :program_id", policies.get(program_id, policies[None])))
+    else:
+        for pid in own_policy:
+            targets.append((f"program_id = {int(pid)}", policies[pid]))
+        other = (
+            f"program_id NOT IN ({', '.join(str(int(pid)) for pid in own_policy)})"
+            if own_policy else "1"
+        )
+        targets.append((other, policies[None]))
+
+    bounds = db.select(db.func.min(Training.id), db.func.max(Training.id))
+    if program_id is not None:
+        bounds = bounds.where(Training.program_id == program_id)
+    min_id, max_id = db.session.execute(bounds).one()
+    db.session.commit()
+    if min_id is None:
+        return 0
+
+    if progress is not None:
+        progress.set_total(max_id - min_id + 1)
+
+    changed = 0
+    for id_from in range(min_id - 1, max_id, RECOMPUTE_BATCH_SIZE):
+        id_to = min(id_from + RECOMPUTE_BATCH_SIZE, max_id)
+        with db.engine.begin() as conn:
+            for program_filter, (threshold, months) in targets:
+                result = conn.execute(
+                    db.text(RECOMPUTE_SQL.format(program_filter=program_filter)),
+                    {
+                        "threshold": threshold,
+                        "shift": f"+{int(months)} months",
+                        "id_from": id_from,
+                        "id_to": id_to,
+                        "date_from": (date_from or date.min).isoformat(),
+                        "program_id": program_id,
+                    },
+                )
+                changed += result.rowcount
+            # Изменённый результат сбросил код свидетельства (сессии тут нет)
+            fill_control_hashes(conn)
+        if progress is not None:
+            progress.advance(id_to - id_from)
+
+    return changed
+
+
+@job_kind("recompute", "Пересчёт результатов экзаменов")
+def recompute_job(progress, program_id=None, date_from=None):
+    recompute_results(
+        program_id=program_id,
+        date_from=datetime.strptime(date_from, "%Y-%m-%d").date() if date_from else None,
+        progress=progress,
+    )
+
+
+def policy_form_values():
+    """(проходной %, срок в месяцах) из формы или abort(400)."""
+    threshold = request.form.get("pass_threshold", type=float)
+    months = request.form.get("validity_months", type=int)
+    if threshold is None or not 0 <= threshold <= 100:
+        abort(400, "Проходной процент должен быть от 0 до 100")
+    if months is None or not 1 <= months <= 120:
+        abort(400, "Срок действия — от 1 до 120 месяцев")
+    return threshold, months
+
+
+@app.route("/policies")
+def list_policies():
+    items = (
+        ScoringPolicy.query
+        .options(joinedload(ScoringPolicy.program))
+        .order_by(ScoringPolicy.program_id.is_not(None), ScoringPolicy.id)
+        .all()
+    )
+    used = {p.program_id for p in items}
+    programs = Program.query.order_by(Program.name).all()
+    return render_template(
+        "policies.html",
+        policies=items,
+        programs=programs,
+        free_programs=[pr for pr in programs if pr.id not in used],
+    )
+
+
+@app.route("/policies/save", methods=["POST"])
+def save_policy():
+    threshold, months = policy_form_values()
+    program_id = request.form.get("program_id", type=int)
+    if program_id is not None:
+        db.get_or_404(Program, program_id)
+
+    policy = ScoringPolicy.query.filter(
+        ScoringPolicy.program_id.is_(None) if program_id is None
+        else ScoringPolicy.program_id == program_id
+    ).first()
+    if policy is None:
+        policy = ScoringPolicy(program_id=program_id)
+        db.session.add(policy)
+    policy.pass_threshold = threshold
+    policy.validity_months = months
+    db.session.commit()
+    return redirect(url_for("list_policies"))
+
+
+@app.route("/policies/delete/<int:policy_id>", methods=["POST"])
+def delete_policy(policy_id):
+    policy = db.get_or_404(ScoringPolicy, policy_id)
+    if policy.program_id is None:
+        abort(400, "Общие правила удалить нельзя")
+    db.session.delete(policy)
+    db.session.commit()
+    return redirect(url_for("list_policies"))
+
+
+@app.route("/policies/recompute", methods=["POST"])
+def recompute_policies():
+    program_id = request.form.get("program_id", type=int)
+    if program_id is not None:
+        db.get_or_404(Program, program_id)
+    date_from = request.form.get("date_from") or None
+    if date_from:
+        try:
+            datetime.strptime(date_from, "%Y-%m-%d")
+        except ValueError:
+            abort(400, "Неверная дата")
+    job_id = submit_job("recompute", program_id=program_id, date_from=date_from)
+    return redirect(url_for("job_page", job_id=job_id))
+
+
+# ---------- РЕЗЕРВНОЕ КОПИРОВАНИЕ -----------
+
+# Копия снимается через SQLite backup API порциями страниц: между
+# порциями БД свободна для записи, а копия всё равно согласована.
+BACKUP_DIR = os.environ.get("HYGIENE_BACKUP_DIR") or os.path.join(DATA_DIR, "backups")
+BACKUP_PREFIX = "hygiene-"
+BACKUP_PAGES = 256                 # страниц за шаг
+BACKUP_STEP_SLEEP = 0.01           # пауза между шагами, сек.
+BACKUP_KEEP = int(os.environ.get("HYGIENE_BACKUP_KEEP", 14))
+BACKUP_INTERVAL_HOURS = float(os.environ.get("HYGIENE_BACKUP_INTERVAL_HOURS", 24))
+BACKUP_COMPRESS = os.environ.get("HYGIENE_BACKUP_COMPRESS", "1") != "0"
+
+_backup_lock = threading.Lock()
+
+
+def sqlite_connect(path):
+    """Соединение sqlite3 к файлу БД с функциями ИС (как у соединений пула)."""
+    conn = sqlite3.connect(path, timeout=int(SQLITE_PRAGMAS["busy_timeout"]) / 1000)
+    register_sqlite_functions(conn)
+    return conn
+
+
+def list_backups(backup_dir=None):
+    """Резервные копии, от новых к старым."""
+    backup_dir = backup_dir or BACKUP_DIR
+    if not os.path.isdir(backup_dir):
+        return []
+    paths = [
+        entry.path
+        for entry in os.scandir(backup_dir)
+        if entry.is_file()
+        and entry.name.startswith(BACKUP_PREFIX)
+        and entry.name.endswith((".db", ".db.gz"))
+    ]
+    return sorted(paths, key=os.path.getmtime, reverse=True)
+
+
+def backup_database(backup_dir=None, compress=None, keep=None, label=""):
+    """
+    Снимает резервную копию hygiene.db, при необходимости сжимает её
+    и удаляет старые копии сверх keep. Возвращает путь к копии.
+    """
+    backup_dir = backup_dir or BACKUP_DIR
+    compress = BACKUP_COMPRESS if compress is None else compress
+    keep = BACKUP_KEEP if keep is None else keep
+
+    with _backup_lock:
+        os.makedirs(backup_dir, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        name = f"{BACKUP_PREFIX}{stamp}{label}.db"
+        suffix = 1
+        while any(
+            os.path.exists(os.path.join(backup_dir, name + ext)) for ext in ("", ".gz")
+        ):
+            suffix += 1
+            name = f"{BACKUP_PREFIX}{stamp}{label}-{suffix}.db"
+        tmp_path = os.path.join(backup_dir, name + ".tmp")
+
+        source = sqlite_connect(db_path)
+        target = sqlite3.connect(tmp_path)
+        try:
+            source.backup(target, pages=BACKUP_PAGES, sleep=BACKUP_STEP_SLEEP)
+            # Копия — одиночный файл, без -wal рядом
+            target.execute("PRAGMA journal_mode = DELETE")
+        except BaseException:
+            target.close()
+            os.unlink(tmp_path)
+            raise
+        finally:
+            source.close()
+        target.close()
+
+        if compress:
+            name += ".gz"
+            with open(tmp_path, "rb") as src, gzip.open(tmp_path + ".gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.unlink(tmp_path)
+            tmp_path += ".gz"
+
+        path = os.path.join(backup_dir, name)
+        os.replace(tmp_path, path)
+
+        for old_path in list_backups(backup_dir)[keep:]:
+            try:
+                os.unlink(old_path)
+            except OSError:
+                pass
+
+    app.logger.info(f"Backup created: {path}")
+    return path
+
+
+def restore_database(path):
+    """
+    Восстанавливает БД из копии path (.db или .db.gz). Текущая БД
+    предварительно сохраняется отдельной копией. Работает и при
+    запущенном сервере: данные переписываются тем же backup API.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(db_path) or None) as tmp_dir:
+        snapshot_path = path
+        if path.endswith(".gz"):
+            snapshot_path = os.path.join(tmp_dir, "restore.db")
+            with gzip.open(path, "rb") as src, open(snapshot_path, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+
+        snapshot = sqlite3.connect(snapshot_path)
+        try:
+            check = snapshot.execute("PRAGMA quick_check").fetchone()[0]
+            if check != "ok":
+                raise ValueError(f"Резервная копия повреждена: {check}")
+
+            # Страховочная копия текущего состояния, без ротации
+            backup_database(keep=len(list_backups()) + 1, label="-before-restore")
+
+            with app.app_context():
+                versions = dict(
+                    db.session.execute(
+                        db.text("SELECT table_name, version FROM data_versions")
+                    ).all()
+                )
+                db.session.remove()
+                db.engine.dispose()
+
+                target = sqlite_connect(db_path)
+                try:
+                    snapshot.backup(target, pages=BACKUP_PAGES, sleep=BACKUP_STEP_SLEEP)
+                finally:
+                    target.close()
+                db.engine.dispose()
+
+                # Копия могла быть снята старой версией программы
+                upgrade_schema()
+                with db.engine.begin() as conn:
+                    fill_control_hashes(conn)
+
+                # Счётчики версий не должны вернуться к значениям, под
+                # которыми браузеры и кэш выгрузок помнят другие данные
+                with db.engine.begin() as conn:
+                    for table, version in versions.items():
+                        conn.execute(
+                            db.text(
+                                "UPDATE data_versions SET version = "
+                                "max(version, :version) + 1, "
+                                "changed_at = strftime('%Y-%m-%d %H:%M:%S', 'now') "
+                                "WHERE table_name = :table"
+                            ),
+                            {"table": table, "version": version},
+                        )
+        finally:
+            snapshot.close()
+
+    app.logger.info(f"Database restored from {path}")
+
+
+class BackupScheduler(threading.Thread):
+    """Делает копию, если последняя старше interval_hours, и ждёт следующей."""
+
+    def __init__(self, interval_hours=BACKUP_INTERVAL_HOURS, backup_dir=None):
+        super().__init__(daemon=True, name="backup")
+        self.interval = interval_hours * 3600
+        self.backup_dir = backup_dir
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            backups = list_backups(self.backup_dir)
+            last = os.path.getmtime(backups[0]) if backups else 0
+            wait = last + self.interval - time.time()
+            if wait > 0:
+                self._stop_event.wait(wait)
+                continue
+            try:
+                backup_database(self.backup_dir)
+            except Exception as e:
+                app.logger.error("Scheduled backup failed", exc_info=e)
+                self._stop_event.wait(min(self.interval, 3600))
+
+    def stop(self):
+        self._stop_event.set()
+
+
+# ------------- АРХИВ ПО ГОДАМ ---------------
+
+# Обучения прошлых лет (и слушатели, у которых других обучений нет)
+# переносятся в отдельные файлы archive/hygiene-archive-ГГГГ.db. Рабочая
+# БД и её индексы остаются маленькими; архивы открываются только на чтение
+# и только когда журнал или проверка спрашивают о прошлых годах.
+ARCHIVE_DIR = os.path.join(DATA_DIR, "archive")
+ARCHIVE_PREFIX = "hygiene-archive-"
+ARCHIVE_KEEP_YEARS = 2     # текущий год и столько прошлых лет не архивируются
+ARCHIVE_TABLES = ("programs", "participants", "trainings")
+
+
+def archive_path(year):
+    return os.path.join(ARCHIVE_DIR, f"{ARCHIVE_PREFIX}{year}.db")
+
+
+def archive_years():
+    """Годы, для которых есть архивы, по возрастанию."""
+    if not os.path.isdir(ARCHIVE_DIR):
+        return []
+    years = []
+    for name in os.listdir(ARCHIVE_DIR):
+        stem, ext = os.path.splitext(name)
+        year = stem[len(ARCHIVE_PREFIX):]
+        if stem.startswith(ARCHIVE_PREFIX) and ext == ".db" and year.isdigit():
+            years.append(int(year))
+    return sorted(years)
+
+
+def open_archive(year):
+    """Архив года только для чтения."""
+    uri = pathlib.Path(archive_path(year)).resolve().as_uri() + "?mode=ro"
+    conn = sqlite3.connect(uri, uri=True)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _archive_fields(model):
+    # Колонки синхронизации в архивах, созданных до их появления, отсутствуют,
+    # а для показа архивных записей не нужны
+    return [c for c in model.__table__.columns if c.name not in SYNC_TRACKING_COLUMNS]
+
+
+def _archive_columns(model, alias):
+    return [f"{alias}.{c.name} AS {alias}_{c.name}" for c in _archive_fields(model)]
+
+
+def _archive_object(model, alias, row):
+    values = {}
+    for column in _archive_fields(model):
+        value = row[f"{alias}_{column.name}"]
+        if isinstance(value, str):
+            if isinstance(column.type, db.DateTime):
+                value = datetime.fromisoformat(value)
+            elif isinstance(column.type, db.Date):
+                value = date.fromisoformat(value)
+        values[column.name] = value
+    return SimpleNamespace(**values)
+
+
+def _archive_select(where):
+    columns = (
+        _archive_columns(Training, "t")
+        + _archive_columns(Participant, "p")
+        + _archive_columns(Program, "pr")
+    )
+    return (
+        f"SELECT {', '.join(columns)} FROM trainings t "
+        "JOIN participants p ON p.id = t.participant_id "
+        "JOIN programs pr ON pr.id = t.program_id "
+        f"WHERE {where}"
+    )
+
+
+def archived_training(row, year):
+    """Обучение из архива с теми же полями, что у Training в шаблонах."""
+    t = _archive_object(Training, "t", row)
+    t.participant = _archive_object(Participant, "p", row)
+    t.program = _archive_object(Program, "pr", row)
+    t.archive_year = year
+    return t
+
+
+def iter_archived_trainings(year, date_from=None, date_to=None):
+    """Обучения из архива года по порядку (дата экзамена, ID)."""
+    conn = open_archive(year)
+    try:
+        cursor = conn.execute(
+            _archive_select("t.exam_date BETWEEN ? AND ?")
+            + " ORDER BY t.exam_date, t.id",
+            (
+                (date_from or date.min).isoformat(),
+                (date_to or date.max).isoformat(),
+            ),
+        )
+        for row in cursor:
+            yield archived_training(row, year)
+    finally:
+        conn.close()
+
+
+def find_archived_training(year, training_id):
+    if year not in archive_years():
+        return None
+    conn = open_archive(year)
+    try:
+        row = conn.execute(_archive_select("t.id = ?"), (training_id,)).fetchone()
+        return archived_training(row, year) if row is not None else None
+    finally:
+        conn.close()
+
+
+def find_archived_by_control_hashes(year, codes):
+    conn = open_archive(year)
+    try:
+        found = []
+        for start in range(0, len(codes), VERIFY_CHUNK_SIZE):
+            chunk = codes[start:start + VERIFY_CHUNK_SIZE]
+            placeholders = ", ".join("?" * len(chunk))
+            rows = conn.execute(
+                _archive_select(f"t.control_hash IN ({placeholders})"), chunk
+            )
+            found.extend(archived_training(row, year) for row in rows)
+        return found
+    finally:
+        conn.close()
+
+
+def archive_count(year, date_from=None, date_to=None):
+    conn = open_archive(year)
+    try:
+        return conn.execute(
+            "SELECT count(*) FROM trainings WHERE exam_date BETWEEN ? AND ?",
+            (
+                (date_from or date.min).isoformat(),
+                (date_to or date.max).isoformat(),
+            ),
+        ).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def journal_count(date_from=None, date_to=None):
+    """Сколько записей вернёт journal_trainings() за тот же период."""
+    query = db.session.query(db.func.count(Training.id))
+    if date_from:
+        query = query.filter(Training.exam_date >= date_from)
+    if date_to:
+        query = query.filter(Training.exam_date <= date_to)
+    total = query.scalar()
+    if date_from is not None or date_to is not None:
+        total += sum(
+            archive_count(year, date_from, date_to)
+            for year in archive_years()
+            if (date_from is None or year >= date_from.year)
+            and (date_to is None or year <= date_to.year)
+        )
+    return total
+
+
+def create_archive_schema(path):
+    """Таблицы и индексы архива — те же, что у моделей рабочей БД."""
+    conn = sqlite3.connect(path)
+    try:
+        dialect = db.engine.dialect
+        for name in ARCHIVE_TABLES:
+            table = db.metadata.tables[name]
+            conn.execute(str(CreateTable(table, if_not_exists=True).compile(dialect=dialect)))
+            existing = {row[1] for row in conn.execute(f"PRAGMA table_info({name})")}
+            for column in table.columns:
+                if column.name not in existing:
+                    conn.execute(
+                        f"ALTER TABLE {name} ADD COLUMN {column.name} "
+                        f"{column.type.compile(dialect=dialect)}"
+                    )
+            for index in table.indexes:
+                conn.execute(str(CreateIndex(index, if_not_exists=True).compile(dialect=dialect)))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def archivable_years(today=None):
+    """Годы рабочей БД, которые можно перенести в архив."""
+    today = today or date.today()
+    last_year = today.year - ARCHIVE_KEEP_YEARS - 1
+    rows = db.session.execute(
+        db.select(db.func.distinct(db.func.substr(Training.exam_date, 1, 4)))
+        .where(Training.exam_date < date(last_year + 1, 1, 1))
+    ).scalars()
+    return sorted(int(year) for year in rows)
+
+
+def archive_year(year):
+    """
+    Переносит обучения года в архив и удаляет из рабочей БД их и слушателей,
+    у которых не осталось обучений. Сводка training_stats продолжает учитывать
+    перенесённые обучения. Повторный запуск безопасен: строки архива
+    перезаписываются. Возвращает число перенесённых обучений.
+    """
+    path = archive_path(year)
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    create_archive_schema(path)
+
+    columns = {
+        name: ", ".join(c.name for c in db.metadata.tables[name].columns)
+        for name in ARCHIVE_TABLES
+    }
+
+    conn = sqlite_connect(db_path)
+    conn.isolation_level = None
+    conn.execute("ATTACH DATABASE ? AS arc", (path,))
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Перенос в архив не должен выглядеть для других установок удалением
+            conn.execute("INSERT INTO main.sync_suppress DEFAULT VALUES")
+            conn.execute(
+                "CREATE TEMP TABLE archived AS "
+                "SELECT id, participant_id, program_id FROM main.trainings "
+                "WHERE exam_date BETWEEN ? AND ?",
+                (f"{year}-01-01", f"{year}-12-31"),
+            )
+            count = conn.execute("SELECT count(*) FROM temp.archived").fetchone()[0]
+
+            # Архив только читается: коды свидетельств нужны в нём готовыми,
+            # иначе такие свидетельства не пройдут проверку
+            conn.execute(
+                "UPDATE main.trainings SET control_hash = "
+                f"{CONTROL_HASH_SQL.format(row='trainings')} "
+                "WHERE id IN (SELECT id FROM temp.archived) AND control_hash IS NULL"
+            )
+
+            conn.execute(
+                f"INSERT OR REPLACE INTO arc.programs ({columns['programs']}) "
+                f"SELECT {columns['programs']} FROM main.programs "
+                "WHERE id IN (SELECT program_id FROM temp.archived)"
+            )
+            conn.execute(
+                f"INSERT OR REPLACE INTO arc.participants ({columns['participants']}) "
+                f"SELECT {columns['participants']} FROM main.participants "
+                "WHERE id IN (SELECT participant_id FROM temp.archived)"
+            )
+            conn.execute(
+                f"INSERT OR REPLACE INTO arc.trainings ({columns['trainings']}) "
+                f"SELECT {columns['trainings']} FROM main.trainings "
+                "WHERE id IN (SELECT id FROM temp.archived)"
+            )
+
+            # Другие установки узнают о переносе и не вернут эти записи обратно
+            conn.execute(
+                "INSERT OR REPLACE INTO main.sync_archived "
+                "(uuid, table_name, archived_at, sync_seq) "
+                f"SELECT uuid, 'trainings', {SYNC_NOW_SQL}, {SYNC_NEXT_SEQ_SQL} "
+                "FROM main.trainings "
+                "WHERE id IN (SELECT id FROM temp.archived) AND uuid IS NOT NULL"
+            )
+
+            # Триггеры вычтут удаляемые обучения из сводки — запоминаем
+            # их вклад и возвращаем его после удаления
+            conn.execute(
+                "CREATE TEMP TABLE archived_stats AS "
+                "SELECT substr(t.exam_date, 1, 7) AS month, t.program_id, "
+                "coalesce(p.workplace, '') AS workplace, count(*) AS total, "
+                "sum(t.exam_result = 'Положительный') AS passed, "
+                "sum(t.exam_percent) AS percent_sum "
+                "FROM main.trainings t JOIN main.participants p ON p.id = t.participant_id "
+                "WHERE t.id IN (SELECT id FROM temp.archived) GROUP BY 1, 2, 3"
+            )
+            conn.execute(
+                "DELETE FROM main.trainings WHERE id IN (SELECT id FROM temp.archived)"
+            )
+            conn.execute(
+                "INSERT INTO main.training_stats "
+                "(month, program_id, workplace, total, passed, percent_sum) "
+                "SELECT month, program_id, workplace, total, passed, percent_sum "
+                "FROM temp.archived_stats WHERE 1 "
+                "ON CONFLICT (month, program_id, workplace) DO UPDATE SET "
+                "total = total + excluded.total, passed = passed + excluded.passed, "
+                "percent_sum = percent_sum + excluded.percent_sum"
+            )
+            orphans = (
+                "id IN (SELECT participant_id FROM temp.archived) "
+                "AND NOT EXISTS (SELECT 1 FROM main.trainings t "
+                "WHERE t.participant_id = participants.id)"
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO main.sync_archived "
+                "(uuid, table_name, archived_at, sync_seq) "
+                f"SELECT uuid, 'participants', {SYNC_NOW_SQL}, {SYNC_NEXT_SEQ_SQL} "
+                f"FROM main.participants WHERE {orphans} AND uuid IS NOT NULL"
+            )
+            conn.execute(f"DELETE FROM main.participants WHERE {orphans}")
+            conn.execute(SYNC_BUMP_SQL)
+            conn.execute("DROP TABLE temp.archived")
+            conn.execute("DROP TABLE temp.archived_stats")
+            conn.execute("DELETE FROM main.sync_suppress")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("ANALYZE main.trainings")
+    finally:
+        conn.execute("DETACH DATABASE arc")
+        conn.close()
+
+    app.logger.info(f"Archived {count} trainings of {year} to {path}")
+    return count
+
+
+@job_kind("archive", "Перенос в архив")
+def archive_job(progress, years):
+    for year in years:
+        progress.advance(archive_year(year))
+
+
+@app.route("/archive/<int:year>/certificate/<int:training_id>")
+def archived_certificate(year, training_id):
+    """Свидетельство обучения, перенесённого в архив года."""
+    training = find_archived_training(year, training_id)
+    if training is None:
+        abort(404)
+    control_hash = training.control_hash or generate_control_hash(training)
+    qr_image = qr_cache.get_or_create(certificate_qr_data(training, control_hash))
+    return render_template(
+        "certificate.html",
+        training=training,
+        qr_image=qr_image,
+        control_hash=control_hash,
+    )
+
+
+@app.route("/archive")
+def archive():
+    years = []
+    for year in archive_years():
+        years.append({
+            "year": year,
+            "trainings": archive_count(year),
+            "size": os.path.getsize(archive_path(year)),
+        })
+    return render_template(
+        "archive.html",
+        archives=years,
+        archivable=archivable_years(),
+        keep_years=ARCHIVE_KEEP_YEARS,
+    )
+
+
+@app.route("/archive/start", methods=["POST"])
+def archive_start():
+    up_to = request.form.get("up_to", type=int)
+    years = [year for year in archivable_years() if up_to is not None and year <= up_to]
+    if not years:
+        abort(400, "Нет лет для переноса в архив")
+    return redirect(url_for("job_page", job_id=submit_job("archive", years=years)))
+
+
+# ------------- СИНХРОНИЗАЦИЯ ----------------
+
+# Установки в разных местах обмениваются файлами-пакетами изменений, сети
+# между ними нет. У каждой программы, слушателя и обучения есть постоянный
+# UUID, время последнего изменения и локальный номер изменения (sync_seq),
+# удаления оставляют надгробия (sync_tombstones). Пакет для другой установки
+# содержит только изменения после предыдущего пакета для неё, поэтому его
+# размер зависит от числа изменений, а не от размера БД.
+#
+# При загрузке запись ищется по UUID; если её нет, то слушатель — по ИИН
+# (или ФИО и дате рождения), программа — по названию: такие записи считаются
+# одной и той же, обе установки оставляют меньший UUID. Из двух версий
+# записи остаётся изменённая позже, удаление побеждает более ранние
+# изменения. Итог не зависит от порядка загрузки пакетов. Перенос в архив
+# тоже передаётся в пакетах: перенесённые записи (sync_archived) пакеты
+# других установок в рабочую БД не возвращают.
+SYNC_FORMAT = "hygiene-sync"
+SYNC_FORMAT_VERSION = 1
+SYNC_PEER_MAX_LENGTH = 100
+# Ссылки на другие таблицы передаются UUID-ами, а не локальными ID
+SYNC_REFERENCES = {
+    "trainings": {"participant_id": "participants", "program_id": "programs"},
+}
+
+
+class SyncPackageError(ValueError):
+    pass
+
+
+def sync_now():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")[:23]
+
+
+def sync_site():
+    """(ID этой установки, номер последнего изменения)."""
+    return tuple(db.session.execute(db.text("SELECT site_id, seq FROM sync_state")).one())
+
+
+def _sync_select(table):
+    """Строки таблицы в виде пакета: uuid, updated_at и колонки данных."""
+    references = SYNC_REFERENCES.get(table, {})
+    columns = ["t.uuid", "t.updated_at"] + [
+        f"(SELECT uuid FROM {references[name]} WHERE id = t.{name})"
+        if name in references else f"t.{name}"
+        for name in sync_columns(table)
+    ]
+    return f"SELECT {', '.join(columns)} FROM {table} t"
+
+
+def sync_export(peer, full=False, peer_site_id=None):
+    """
+    Пакет для установки peer: изменения после предыдущего пакета для неё
+    (full — все записи). Изменения, загруженные из пакетов самой peer
+    (peer_site_id или запомненный ранее ID), в пакет не входят.
+    Возвращает (содержимое .json.gz, число записей).
+    """
+    known = db.session.execute(
+        db.text("SELECT exported_seq, site_id FROM sync_peers WHERE peer = :peer"),
+        {"peer": peer},
+    ).first()
+    since = 0
+    if known is not None:
+        if not full:
+            since = known.exported_seq
+        peer_site_id = peer_site_id or known.site_id
+    site_id, until = sync_site()
+    bounds = {"since": since, "until": until, "origin": peer_site_id}
+    # Изменения, пришедшие от самой установки-получателя, ей не нужны
+    not_from_peer = "(:origin IS NULL OR sync_origin IS NOT :origin)"
+
+    package = {
+        "format": SYNC_FORMAT,
+        "version": SYNC_FORMAT_VERSION,
+        "site_id": site_id,
+        "peer": peer,
+        "created_at": sync_now(),
+        "since": since,
+        "until": until,
+        "tables": {},
+    }
+    count = 0
+    for table in SYNC_TABLES:
+        rows = db.session.execute(
+            db.text(
+                f"{_sync_select(table)} "
+                "WHERE t.sync_seq > :since AND t.sync_seq <= :until "
+                f"AND {not_from_peer.replace('sync_origin', 't.sync_origin')} "
+                "ORDER BY t.sync_seq"
+            ),
+            bounds,
+        )
+        package["tables"][table] = {
+            "columns": ["uuid", "updated_at"] + sync_columns(table),
+            "rows": [list(row) for row in rows],
+        }
+        count += len(package["tables"][table]["rows"])
+    package["tombstones"] = [
+        list(row)
+        for row in db.session.execute(
+            db.text(
+                "SELECT table_name, uuid, deleted_at FROM sync_tombstones "
+                f"WHERE sync_seq > :since AND sync_seq <= :until AND {not_from_peer} "
+                "ORDER BY sync_seq"
+            ),
+            bounds,
+        )
+    ]
+    count += len(package["tombstones"])
+    package["archived"] = [
+        list(row)
+        for row in db.session.execute(
+            db.text(
+                "SELECT table_name, uuid FROM sync_archived "
+                f"WHERE sync_seq > :since AND sync_seq <= :until AND {not_from_peer} "
+                "ORDER BY sync_seq"
+            ),
+            bounds,
+        )
+    ]
+    count += len(package["archived"])
+
+    db.session.execute(
+        db.text(
+            "INSERT INTO sync_peers (peer, exported_seq, exported_at, site_id) "
+            "VALUES (:peer, :until, :now, :site_id) ON CONFLICT (peer) DO UPDATE SET "
+            "exported_seq = excluded.exported_seq, exported_at = excluded.exported_at, "
+            "site_id = excluded.site_id"
+        ),
+        {"peer": peer, "until": until, "now": sync_now(), "site_id": peer_site_id},
+    )
+    db.session.commit()
+
+    data = json.dumps(package, ensure_ascii=False, separators=(",", ":"))
+    return gzip.compress(data.encode("utf-8")), count
+
+
+def read_sync_package(stream):
+    """Пакет из загруженного файла (.json.gz или .json)."""
+    raw = stream.read()
+    try:
+        if raw[:2] == b"\x1f\x8b":
+            raw = gzip.decompress(raw)
+        package = json.loads(raw.decode("utf-8"))
+    except (OSError, EOFError, ValueError):
+        raise SyncPackageError("Файл не является пакетом синхронизации.")
+    if not isinstance(package, dict) or package.get("format") != SYNC_FORMAT:
+        raise SyncPackageError("Файл не является пакетом синхронизации.")
+    if package.get("version") != SYNC_FORMAT_VERSION:
+        raise SyncPackageError(f"Неподдерживаемая версия пакета: {package.get('version')}.")
+    return package
+
+
+def _sync_row(table, where, params):
+    return db.session.execute(
+        db.text(f"SELECT id, uuid, updated_at FROM {table} WHERE {where} ORDER BY id LIMIT 1"),
+        params,
+    ).first()
+
+
+def _sync_find(table, uuid):
+    """Локальная запись по UUID, в том числе по UUID слитой записи."""
+    row = _sync_row(table, "uuid = :uuid", {"uuid": uuid})
+    if row is None:
+        target = db.session.execute(
+            db.text("SELECT target FROM sync_aliases WHERE uuid = :uuid"), {"uuid": uuid}
+        ).scalar()
+        if target is not None:
+            row = _sync_row(table, "uuid = :uuid", {"uuid": target})
+    return row
+
+
+def _sync_archived(uuid):
+    """Запись (или слитая с ней) перенесена в архив здесь или в другой установке."""
+    return db.session.execute(
+        db.text(
+            "SELECT 1 FROM sync_archived WHERE uuid = :uuid "
+            "OR uuid IN (SELECT target FROM sync_aliases WHERE uuid = :uuid)"
+        ),
+        {"uuid": uuid},
+    ).first() is not None
+
+
+def _sync_match(table, values):
+    """Та же запись, заведённая в этой установке независимо."""
+    if table == "programs" and values.get("name"):
+        return _sync_row(table, "name = :name", {"name": values["name"]})
+    if table == "participants":
+        if values.get("iin"):
+            return _sync_row(table, "iin = :iin", {"iin": values["iin"]})
+        if values.get("full_name") and values.get("birth_date"):
+            return _sync_row(
+                table,
+                "full_name = :full_name AND birth_date = :birth_date "
+                "AND coalesce(iin, '') = ''",
+                {"full_name": values["full_name"], "birth_date": values["birth_date"]},
+            )
+    return None
+
+
+def _sync_merge(table, local, uuid):
+    """Оставляет у записи меньший из двух UUID, больший — псевдоним."""
+    old, new = max(local.uuid, uuid), min(local.uuid, uuid)
+    if new != local.uuid:
+        db.session.execute(
+            db.text(
+                f"UPDATE {table} SET uuid = :uuid, sync_seq = {SYNC_NEXT_SEQ_SQL}, "
+                "sync_origin = NULL WHERE id = :id"
+            ),
+            {"uuid": new, "id": local.id},
+        )
+        db.session.execute(db.text(SYNC_BUMP_SQL))
+    db.session.execute(
+        db.text("UPDATE sync_aliases SET target = :new WHERE target = :old"),
+        {"old": old, "new": new},
+    )
+    db.session.execute(
+        db.text("INSERT OR REPLACE INTO sync_aliases (uuid, target) VALUES (:old, :new)"),
+        {"old": old, "new": new},
+    )
+    return _sync_row(table, "id = :id", {"id": local.id})
+
+
+def _sync_newer(updated_at, values, local_updated_at, local_values):
+    """Побеждает более позднее изменение; при равном времени — одинаково везде."""
+    if values == local_values:
+        return False
+    if updated_at != local_updated_at:
+        return updated_at > (local_updated_at or "")
+    return (
+        json.dumps(values, ensure_ascii=False, sort_keys=True)
+        > json.dumps(local_values, ensure_ascii=False, sort_keys=True)
+    )
+
+
+def _sync_apply_row(table, values, stats, errors):
+    uuid = values.pop("uuid")
+    updated_at = values.pop("updated_at")
+    params = dict(values)
+
+    # Архив только для чтения: перенесённая запись в рабочую БД не возвращается
+    local = _sync_find(table, uuid)
+    if local is None and _sync_archived(uuid):
+        stats["skipped"] += 1
+        return
+
+    for name, target in SYNC_REFERENCES.get(table, {}).items():
+        if name not in values:
+            continue
+        ref = _sync_find(target, values[name])
+        if ref is None:
+            errors.append(f"{table} {uuid}: нет связанной записи {target} {values[name]}")
+            return
+        params[name] = ref.id
+        values[name] = ref.uuid
+
+    if local is None:
+        local = _sync_match(table, values)
+        if local is not None:
+            local = _sync_merge(table, local, uuid)
+            stats["merged"] += 1
+
+    if local is None:
+        deleted_at = db.session.execute(
+            db.text("SELECT deleted_at FROM sync_tombstones WHERE uuid = :uuid"), {"uuid": uuid}
+        ).scalar()
+        if deleted_at is not None and deleted_at >= updated_at:
+            stats["skipped"] += 1
+            return
+        columns = ["uuid", "updated_at"] + list(params)
+        db.session.execute(
+            db.text(
+                f"INSERT INTO {table} ({', '.join(columns)}) "
+                f"VALUES ({', '.join(':' + c for c in columns)})"
+            ),
+            dict(params, uuid=uuid, updated_at=updated_at),
+        )
+        stats["inserted"] += 1
+        return
+
+    current = db.session.execute(
+        db.text(f"{_sync_select(table)} WHERE t.id = :id"), {"id": local.id}
+    ).one()
+    local_values = dict(zip(["uuid", "updated_at"] + sync_columns(table), current))
+    local_values = {name: local_values[name] for name in values}
+    if not _sync_newer(updated_at, values, local.updated_at, local_values):
+        stats["skipped"] += 1
+        return
+    assignments = ", ".join(f"{name} = :{name}" for name in params)
+    db.session.execute(
+        db.text(
+            f"UPDATE {table} SET {assignments}, updated_at = :updated_at WHERE id = :id"
+        ),
+        dict(params, updated_at=updated_at, id=local.id),
+    )
+    stats["updated"] += 1
+
+
+def _sync_apply_archived(table, uuid):
+    # Запись, которой здесь нет, запоминается как перенесённая в архив:
+    # пакеты третьих установок её не добавят, следующие пакеты передадут дальше.
+    # Имеющаяся в рабочей БД запись остаётся — переносом здесь управляет эта установка
+    if _sync_find(table, uuid) is not None:
+        return
+    db.session.execute(
+        db.text(
+            "INSERT OR IGNORE INTO sync_archived "
+            "(uuid, table_name, archived_at, sync_seq, sync_origin) "
+            f"VALUES (:uuid, :table, :now, {SYNC_NEXT_SEQ_SQL}, {SYNC_ORIGIN_SQL})"
+        ),
+        {"uuid": uuid, "table": table, "now": sync_now()},
+    )
+    db.session.execute(db.text(SYNC_BUMP_SQL))
+
+
+def _sync_apply_tombstone(table, uuid, deleted_at, stats):
+    local = _sync_find(table, uuid)
+    if local is None:
+        # Запомнить удаление: более старая версия записи из другого пакета
+        # не должна её вернуть, а следующие пакеты передадут его дальше
+        db.session.execute(
+            db.text(
+                "INSERT OR IGNORE INTO sync_tombstones "
+                "(uuid, table_name, deleted_at, sync_seq, sync_origin) "
+                f"VALUES (:uuid, :table, :deleted_at, {SYNC_NEXT_SEQ_SQL}, {SYNC_ORIGIN_SQL})"
+            ),
+            {"uuid": uuid, "table": table, "deleted_at": deleted_at},
+        )
+        db.session.execute(db.text(SYNC_BUMP_SQL))
+        return
+    if (local.updated_at or "") > deleted_at:
+        stats["skipped"] += 1
+        return
+    db.session.execute(db.text(f"DELETE FROM {table} WHERE id = :id"), {"id": local.id})
+    db.session.execute(
+        db.text(
+            "UPDATE sync_tombstones SET deleted_at = :deleted_at, "
+            f"sync_origin = {SYNC_ORIGIN_SQL} WHERE uuid = :uuid"
+        ),
+        {"uuid": local.uuid, "deleted_at": deleted_at},
+    )
+    stats["deleted"] += 1
+
+
+def sync_import(package):
+    """
+    Применяет пакет другой установки одной транзакцией.
+    Возвращает ({таблица: счётчики}, ошибки).
+    """
+    site_id, _ = sync_site()
+    if package.get("site_id") == site_id:
+        raise SyncPackageError("Пакет выгружен из этой же установки.")
+
+    stats = {
+        table: {"inserted": 0, "updated": 0, "merged": 0, "deleted": 0, "skipped": 0}
+        for table in SYNC_TABLES
+    }
+    errors = []
+    try:
+        # Триггеры отметят загружаемые изменения как пришедшие от этой установки
+        db.session.execute(
+            db.text("INSERT INTO sync_applying (site_id) VALUES (:site_id)"),
+            {"site_id": package["site_id"]},
+        )
+        tables = package["tables"]
+        for table, uuid in package.get("archived", []):
+            if table in SYNC_TABLES:
+                _sync_apply_archived(table, uuid)
+        # Порядок SYNC_TABLES: программы и слушатели раньше ссылающихся на них обучений
+        for table in SYNC_TABLES:
+            if table not in tables:
+                continue
+            names = tables[table]["columns"]
+            allowed = {"uuid", "updated_at", *sync_columns(table)}
+            if "uuid" not in names or "updated_at" not in names:
+                raise SyncPackageError(f"В пакете нет UUID или времени изменения ({table}).")
+            for row in tables[table]["rows"]:
+                values = {
+                    name: value for name, value in zip(names, row) if name in allowed
+                }
+                _sync_apply_row(table, values, stats[table], errors)
+        for table, uuid, deleted_at in package.get("tombstones", []):
+            if table in SYNC_TABLES:
+                _sync_apply_tombstone(table, uuid, deleted_at, stats[table])
+
+        db.session.execute(
+            db.text(
+                "INSERT INTO sync_sources (site_id, imported_seq, imported_at) "
+                "VALUES (:site_id, :until, :now) ON CONFLICT (site_id) DO UPDATE SET "
+                "imported_seq = max(imported_seq, excluded.imported_seq), "
+                "imported_at = excluded.imported_at"
+            ),
+            {"site_id": package["site_id"], "until": package["until"], "now": sync_now()},
+        )
+        db.session.execute(db.text("DELETE FROM sync_applying"))
+    except SyncPackageError:
+        db.session.rollback()
+        raise
+    except (KeyError, TypeError, ValueError):
+        db.session.rollback()
+        raise SyncPackageError("Пакет повреждён или имеет неверную структуру.")
+    db.session.commit()
+    return stats, errors[:IMPORT_MAX_ERRORS]
+
+
+def render_sync(result=None):
+    site_id, seq = sync_site()
+    peers = db.session.execute(
+        db.text(
+            "SELECT peer, exported_seq, exported_at, site_id FROM sync_peers ORDER BY peer"
+        )
+    ).all()
+    sources = db.session.execute(
+        db.text(
+            "SELECT site_id, imported_seq, imported_at FROM sync_sources "
+            "ORDER BY imported_at DESC"
+        )
+    ).all()
+    return render_template(
+        "sync.html",
+        site_id=site_id,
+        seq=seq,
+        peers=peers,
+        sources=sources,
+        result=result,
+    )
+
+
+@app.route("/sync")
+def sync():
+    return render_sync()
+
+
+@app.route("/sync/export", methods=["POST"])
+def sync_export_package():
+    peer = (request.form.get("peer") or "").strip()
+    if not peer or len(peer) > SYNC_PEER_MAX_LENGTH:
+        abort(400, "Укажите название установки-получателя")
+    peer_site_id = request.form.get("site_id") or None
+    if peer_site_id is not None and not db.session.execute(
+        db.text("SELECT 1 FROM sync_sources WHERE site_id = :site_id"),
+        {"site_id": peer_site_id},
+    ).first():
+        abort(400, "Неизвестная установка")
+    data, _ = sync_export(peer, full=bool(request.form.get("full")), peer_site_id=peer_site_id)
+    site_id, _ = sync_site()
+    safe_peer = re.sub(r"[^\w-]+", "_", peer)
+    return send_file(
+        BytesIO(data),
+        mimetype="application/gzip",
+        as_attachment=True,
+        download_name=(
+            f"hygiene-sync-{site_id[:8]}-{safe_peer}-{datetime.now():%Y%m%d-%H%M}.json.gz"
+        ),
+    )
+
+
+@app.route("/sync/import", methods=["POST"])
+def sync_import_package():
+    file_storage = request.files.get("file")
+    if not file_storage or not file_storage.filename:
+        return render_sync({"fatal": "Выберите файл пакета."})
+    try:
+        stats, errors = sync_import(read_sync_package(file_storage.stream))
+    except SyncPackageError as e:
+        return render_sync({"fatal": str(e)})
+    return render_sync({"stats": stats, "errors": errors})
+
+
+# ----------------- JSON API -----------------
+
+# Для внешних систем (кадровый учёт и т.п.) вместо разбора HTML-страниц:
+# записи в JSON с выбором полей (fields=id,exam_date,...), фильтрами и
+# keyset-курсором (after=next_cursor предыдущей страницы). Варианты .ndjson
+# отдают всю выборку потоком — по строке JSON на запись, читая БД порциями,
+# так что память не растёт ни у сервера, ни у клиента. Курсор принимают и
+# они: прерванную выгрузку можно продолжить с последней полученной записи.
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 1000
+API_YIELD_PER = 1000
+
+TRAINING_API_FIELDS = {
+    "id": Training.id,
+    "uuid": Training.uuid,
+    "participant_id": Training.participant_id,
+    "participant_name": Participant.full_name,
+    "iin": Participant.iin,
+    "workplace": Participant.workplace,
+    "position": Participant.position,
+    "program_id": Training.program_id,
+    "program_name": Program.name,
+    "training_start_date": Training.training_start_date,
+    "training_end_date": Training.training_end_date,
+    "exam_date": Training.exam_date,
+    "questions_total": Training.questions_total,
+    "correct_answers": Training.correct_answers,
+    "exam_percent": Training.exam_percent,
+    "exam_result": Training.exam_result,
+    "next_exam_date": Training.next_exam_date,
+    "control_hash": Training.control_hash,
+    "updated_at": Training.updated_at,
+}
+
+PARTICIPANT_API_FIELDS = {
+    "id": Participant.id,
+    "uuid": Participant.uuid,
+    "iin": Participant.iin,
+    "full_name": Participant.full_name,
+    "birth_date": Participant.birth_date,
+    "sex": Participant.sex,
+    "lmk_number": Participant.lmk_number,
+    "workplace": Participant.workplace,
+    "position": Participant.position,
+    "activity_type": Participant.activity_type,
+    "updated_at": Participant.updated_at,
+}
+
+
+def api_error(message):
+    abort(make_response(jsonify({"error": message}), 400))
+
+
+def api_fields(available):
+    """Поля из параметра fields (по умолчанию — все)."""
+    value = request.args.get("fields")
+    if not value:
+        return list(available)
+    names = list(dict.fromkeys(name.strip() for name in value.split(",") if name.strip()))
+    unknown = [name for name in names if name not in available]
+    if unknown or not names:
+        api_error(
+            f"Неизвестные поля: {', '.join(unknown)}. Доступны: {', '.join(available)}"
+        )
+    return names
+
+
+def api_int(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        api_error(f"{name}: ожидается число")
+
+
+def api_date(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        api_error(f"{name}: ожидается дата ГГГГ-ММ-ДД")
+
+
+def api_limit():
+    limit = api_int("limit") or API_PAGE_SIZE
+    return max(1, min(limit, API_MAX_PAGE_SIZE))
+
+
+def api_item(row, fields):
+    item = {}
+    for name in fields:
+        value = row._mapping[name]
+        if isinstance(value, (date, datetime)):
+            value = value.isoformat()
+        item[name] = value
+    return item
+
+
+def api_training_query(fields):
+    """
+    Обучения с фильтрами date_from/date_to (дата экзамена), program_id,
+    participant_id и курсором after, по порядку (дата экзамена, ID).
+    """
+    if "control_hash" in fields:
+        ensure_control_hashes()
+    query = db.select(
+        *(TRAINING_API_FIELDS[name].label(name) for name in fields),
+        Training.exam_date.label("cursor_date"),
+        Training.id.label("cursor_id"),
+    ).select_from(Training)
+    # Слушатели и программы присоединяются, только если нужны их поля
+    models = {TRAINING_API_FIELDS[name].class_ for name in fields}
+    if Participant in models:
+        query = query.join(Participant, Participant.id == Training.participant_id)
+    if Program in models:
+        query = query.join(Program, Program.id == Training.program_id)
+
+    date_from, date_to = api_date("date_from"), api_date("date_to")
+    program_id, participant_id = api_int("program_id"), api_int("participant_id")
+    if date_from:
+        query = query.where(Training.exam_date >= date_from)
+    if date_to:
+        query = query.where(Training.exam_date <= date_to)
+    if program_id is not None:
+        query = query.where(Training.program_id == program_id)
+    if participant_id is not None:
+        query = query.where(Training.participant_id == participant_id)
+
+    after = request.args.get("after")
+    if after:
+        key = parse_cursor(after)
+        if key is None:
+            api_error("after: неверный курсор")
+        query = query.where(tuple_(Training.exam_date, Training.id) > key)
+    return query.order_by(Training.exam_date.asc(), Training.id.asc())
+
+
+def api_participant_query(fields):
+    """
+    Слушатели по порядку ID с фильтрами iin и program_id/date_from/date_to
+    (есть обучение по программе и/или с экзаменом в периоде).
+    """
+    query = db.select(
+        *(PARTICIPANT_API_FIELDS[name].label(name) for name in fields),
+        Participant.id.label("cursor_id"),
+    )
+
+    iin = (request.args.get("iin") or "").strip()
+    if iin:
+        query = query.where(Participant.iin == iin)
+    date_from, date_to = api_date("date_from"), api_date("date_to")
+    program_id = api_int("program_id")
+    if date_from or date_to or program_id is not None:
+        trained = db.select(Training.id).where(Training.participant_id == Participant.id)
+        if date_from:
+            trained = trained.where(Training.exam_date >= date_from)
+        if date_to:
+            trained = trained.where(Training.exam_date <= date_to)
+        if program_id is not None:
+            trained = trained.where(Training.program_id == program_id)
+        query = query.where(trained.exists())
+
+    after = request.args.get("after")
+    if after:
+        if not after.isdigit():
+            api_error("after: неверный курсор")
+        query = query.where(Participant.id > int(after))
+    return query.order_by(Participant.id.asc())
+
+
+def api_page(query, fields, make_key):
+    limit = api_limit()
+    rows = db.session.execute(query.limit(limit + 1)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = make_key(rows[-1]._mapping)
+    return jsonify({
+        "items": [api_item(row, fields) for row in rows],
+        "next_cursor": next_cursor,
+    })
+
+
+def api_stream(query, fields):
+    """Вся выборка в NDJSON; строки читаются из курсора БД порциями."""
+    def generate():
+        result = db.session.execute(query.execution_options(yield_per=API_YIELD_PER))
+        try:
+            for row in result:
+                yield json.dumps(api_item(row, fields), ensure_ascii=False) + "\n"
+        finally:
+            result.close()
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+def training_api_key(row):
+    return f"{row['cursor_date'].strftime('%Y-%m-%d')}.{row['cursor_id']}"
+
+
+def participant_api_key(row):
+    return str(row["cursor_id"])
+
+
+@app.route("/api/trainings")
+@conditional_get("programs", "participants", "trainings")
+def api_trainings():
+    fields = api_fields(TRAINING_API_FIELDS)
+    return api_page(api_training_query(fields), fields, training_api_key)
+
+
+@app.route("/api/trainings.ndjson")
+@conditional_get("programs", "participants", "trainings")
+def api_trainings_ndjson():
+    fields = api_fields(TRAINING_API_FIELDS)
+    return api_stream(api_training_query(fields), fields)
+
+
+@app.route("/api/participants")
+@conditional_get("participants", "trainings")
+def api_participants():
+    fields = api_fields(PARTICIPANT_API_FIELDS)
+    return api_page(api_participant_query(fields), fields, participant_api_key)
+
+
+@app.route("/api/participants.ndjson")
+@conditional_get("participants", "trainings")
+def api_participants_ndjson():
+    fields = api_fields(PARTICIPANT_API_FIELDS)
+    return api_stream(api_participant_query(fields), fields)
+
+
+startup_mark("инициализация приложения")
+
+
+# -------------- КЛАСС СЕРВЕРА  --------------
+
+
+# Сколько запросов обрабатывается одновременно и сколько соединений
+# может ждать в очереди. Пул соединений с БД (HYGIENE_DB_POOL_SIZE)
+# должен быть не меньше числа потоков.
+SERVER_THREADS = 8
+SERVER_QUEUE_SIZE = 64
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """
+    WSGI-сервер werkzeug, обрабатывающий запросы в пуле потоков.
+    Каждый запрос получает свой контекст приложения, а вместе с ним —
+    свою сессию БД (Flask-SQLAlchemy привязывает сессию к контексту),
+    так что долгий экспорт не задерживает остальные запросы.
+    """
+
+    multithread = True
+
+    def __init__(self, host, port, flask_app,
+                 threads=SERVER_THREADS, queue_size=SERVER_QUEUE_SIZE):
+        # Размер очереди нужен до listen(), который вызывается в __init__
+        self.request_queue_size = queue_size
+        super().__init__(host, port, flask_app)
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="http")
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_worker, request, client_address)
+
+    def process_request_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False)
+
+
+class ServerThread(threading.Thread):
+    def __init__(self, flask_app, host="127.0.0.1", port=5000,
+                 threads=SERVER_THREADS, queue_size=SERVER_QUEUE_SIZE):
+        super().__init__(daemon=True)
+        self.host = host
+        self.port = port
+        self.srv = PooledWSGIServer(host, port, flask_app, threads, queue_size)
+        self.ctx = flask_app.app_context()
+        self.ctx.push()
+
+    def run(self):
+        self.srv.serve_forever()
+
+    def shutdown(self):
+        self.srv.shutdown()
+        self.srv.server_close()
+
+
+# ----------------- ЗАПУСК -------------------
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=APP_NAME)
+    parser.add_argument(
+        "--headless", action="store_true",
+        help="запуск без окна управления (сервер работает в консоли)",
+    )
+    parser.add_argument(
+        "--host", default="127.0.0.1",
+        help="адрес сервера; 0.0.0.0 — доступ с других компьютеров сети",
+    )
+    parser.add_argument("--port", type=int, default=5000, help="порт сервера")
+    parser.add_argument(
+        "--threads", type=int, default=SERVER_THREADS,
+        help="число одновременно обрабатываемых запросов",
+    )
+    parser.add_argument(
+        "--queue-size", type=int, default=SERVER_QUEUE_SIZE,
+        help="сколько соединений может ждать в очереди",
+    )
+    parser.add_argument(
+        "--profile-startup", action="store_true",
+        help="вывести время этапов запуска",
+    )
+    parser.add_argument(
+        "--backup", action="store_true",
+        help="сделать резервную копию БД и выйти",
+    )
+    parser.add_argument(
+        "--restore", metavar="FILE",
+        help="восстановить БД из резервной копии и выйти",
+    )
+    parser.add_argument(
+        "--backup-dir", default=None,
+        help=f"папка резервных копий (по умолчанию {BACKUP_DIR})",
+    )
+    parser.add_argument(
+        "--no-compress", action="store_true",
+        help="не сжимать резервные копии",
+    )
+    return parser.parse_args(argv)
+
+
+def finish_startup(profile=False):
+    """Проверка схемы БД — уже после того, как сервер слушает порт."""
+    init_db()
+    startup_mark("проверка схемы БД")
+    if BACKUP_INTERVAL_HOURS > 0:
+        BackupScheduler().start()
+    if profile:
+        print_startup_report()
+
+
+def run_headless(server, url, profile=False):
+    print(f"{APP_NAME} {APP_VERSION}")
+    print(f"Сервер запущен: {url} (Ctrl+C — остановить)")
+    threading.Thread(target=finish_startup, args=(profile,), daemon=True).start()
+    try:
+        server.srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.srv.server_close()
+
+
+def run_launcher(server, url, profile=False):
+    import tkinter as tk
+    from tkinter import filedialog, messagebox
+
+    # Запускаем сервер в отдельном потоке
+    server.start()
+
+    # Окно управления
+    root = tk.Tk()
+    root.title("Гигиеническое обучение — ИС")
+    root.geometry("420x210")
+    root.resizable(False, False)
+
+    lbl1 = tk.Label(root, text="Информационная система запущена", font=("Segoe UI", 12, "bold"))
+    lbl1.pack(pady=(18, 6))
+
+    lbl2 = tk.Label(root, text=url, font=("Segoe UI", 10))
+    lbl2.pack(pady=(0, 14))
+
+    btn_frame = tk.Frame(root)
+    btn_frame.pack()
+
+    def open_site():
+        webbrowser.open(url)
+
+    def stop_app():
+        try:
+            server.shutdown()
+        finally:
+            root.destroy()
+
+    btn_open = tk.Button(btn_frame, text="Открыть в браузере", width=18, command=open_site)
+    btn_open.grid(row=0, column=0, padx=8)
+
+    btn_stop = tk.Button(btn_frame, text="Завершить работу", width=18, command=stop_app)
+    btn_stop.grid(row=0, column=1, padx=8)
+
+    def run_in_background(action, done_message):
+        # Копирование идёт в отдельном потоке, окно не замирает
+        def worker():
+            try:
+                result = action()
+            except Exception as e:
+                app.logger.error("Backup/restore failed", exc_info=e)
+                # e удаляется по выходе из except, а окно покажется позже
+                msg = str(e)
+                root.after(0, lambda: messagebox.showerror("Ошибка", msg))
+            else:
+                root.after(0, lambda: messagebox.showinfo("Готово", done_message(result)))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def make_backup():
+        run_in_background(backup_database, lambda path: f"Резервная копия сохранена:\n{path}")
+
+    def restore_backup():
+        path = filedialog.askopenfilename(
+            title="Выберите резервную копию",
+            initialdir=BACKUP_DIR if os.path.isdir(BACKUP_DIR) else DATA_DIR,
+            filetypes=[("Резервные копии", "*.db *.db.gz"), ("Все файлы", "*.*")],
+        )
+        if not path:
+            return
+        if not messagebox.askyesno(
+            "Восстановление",
+            "Текущие данные будут заменены данными из копии\n"
+            f"{path}\n\nТекущая БД будет предварительно сохранена. Продолжить?",
+        ):
+            return
+        run_in_background(
+            lambda: restore_database(path),
+            lambda _: "Данные восстановлены из резервной копии.",
+        )
+
+    btn_backup = tk.Button(btn_frame, text="Резервная копия", width=18, command=make_backup)
+    btn_backup.grid(row=1, column=0, padx=8, pady=(8, 0))
+
+    btn_restore = tk.Button(btn_frame, text="Восстановить…", width=18, command=restore_backup)
+    btn_restore.grid(row=1, column=1, padx=8, pady=(8, 0))
+
+    # Автооткрытие браузера через 1 сек (по желанию)
+    root.after(1000, open_site)
+
+    # Если пользователь закрывает окно крестиком — тоже корректно выключаем
+    root.protocol("WM_DELETE_WINDOW", stop_app)
+
+    startup_mark("окно управления")
+    root.after(
+        0,
+        lambda: threading.Thread(
+            target=finish_startup, args=(profile,), daemon=True
+        ).start(),
+    )
+
+    root.mainloop()
+
+
+if __name__ == "__main__":
+    # Нужно для пула процессов QR-кодов в собранном exe
+    multiprocessing.freeze_support()
+
+    args = parse_args()
+
+    if args.backup_dir:
+        BACKUP_DIR = args.backup_dir
+    if args.no_compress:
+        BACKUP_COMPRESS = False
+
+    if args.backup or args.restore:
+        init_db()
+        if args.restore:
+            restore_database(args.restore)
+            print(f"БД восстановлена из {args.restore}")
+        else:
+            print(f"Резервная копия: {backup_database()}")
+        sys.exit(0)
+
+    # При 0.0.0.0 браузер на этом компьютере открываем по локальному адресу
+    browse_host = "127.0.0.1" if args.host in ("0.0.0.0", "") else args.host
+    URL = f"http://{browse_host}:{args.port}"
+
+    server = ServerThread(
+        app,
+        host=args.host,
+        port=args.port,
+        threads=args.threads,
+        queue_size=args.queue_size,
+    )
+    startup_mark("сервер слушает порт")
+
+    if args.headless:
+        run_headless(server, URL, args.profile_startup)
+    else:
+        run_launcher(server, URL, args.profile_startup)
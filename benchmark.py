@@ -0,0 +1,474 @@
+"""
+Нагрузочные замеры ИС на синтетических данных.
+
+Для каждого размера (число записей об обучении) создаётся воспроизводимая
+синтетическая БД, после чего через тестовый клиент Flask замеряются все
+страницы: задержка (перцентили), число SQL-запросов на страницу и пиковая
+память. Результаты сохраняются в JSON для сравнения запусков.
+
+    python benchmark.py --sizes 1000 100000 1000000 --out bench.json
+
+Каждый размер замеряется в отдельном процессе со своей БД (HYGIENE_DB),
+готовые БД кэшируются в --db-dir и при повторном запуске не пересоздаются.
+Даты в них отсчитываются от DATA_ANCHOR, а не от сегодняшнего дня, поэтому
+БД с тем же зерном одинакова при любой дате запуска. Замер идёт на копии
+готовой БД: записи POST-запросов не попадают в кэш и в следующие запуски.
+Журналы и кэши ИС при замерах тоже пишутся в --db-dir (HYGIENE_DATA_DIR).
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+
+SURNAMES = [
+    "Иванов", "Петров", "Сидоров", "Смирнов", "Кузнецов", "Попов", "Васильев",
+    "Соколов", "Михайлов", "Новиков", "Фёдоров", "Морозов", "Волков", "Алексеев",
+    "Лебедев", "Семёнов", "Егоров", "Павлов", "Козлов", "Степанов", "Ахметов",
+    "Серикбаев", "Жумабаев", "Нурланов", "Касымов", "Бекмухамбетов", "Оспанов",
+    "Абдрахманов", "Исаев", "Сулейменов",
+]
+FIRST_NAMES = [
+    ("Александр", "Александра"), ("Сергей", "Светлана"), ("Дмитрий", "Дарья"),
+    ("Андрей", "Анна"), ("Алексей", "Алия"), ("Ерлан", "Елена"),
+    ("Нурсултан", "Наталья"), ("Асхат", "Айгуль"), ("Бауыржан", "Жанар"),
+    ("Марат", "Мария"), ("Тимур", "Татьяна"), ("Руслан", "Ольга"),
+]
+PATRONYMICS = [
+    ("Александрович", "Александровна"), ("Сергеевич", "Сергеевна"),
+    ("Николаевич", "Николаевна"), ("Ерланович", "Ерлановна"),
+    ("Маратович", "Маратовна"), ("Викторович", "Викторовна"),
+]
+WORKPLACES = [
+    "ТОО «Береке»", "ИП Ахметова", "КГУ «Школа-гимназия № 5»",
+    "ТОО «Костанай Нан»", "ГККП «Ясли-сад № 12»", "ТОО «Магнум Кэш энд Керри»",
+    "ИП Сулейменов", "ТОО «Агрофирма Жана Жол»", "КГП «Городская больница»",
+    "ТОО «Кафе Дастархан»",
+]
+POSITIONS = [
+    "повар", "продавец", "воспитатель", "учитель", "официант", "пекарь",
+    "технолог", "кассир", "медицинская сестра", "уборщица",
+]
+ACTIVITIES = [
+    "общественное питание", "торговля продуктами", "образование",
+    "производство пищевых продуктов", "медицинские услуги",
+]
+PROGRAMS = [
+    ("Гигиеническое обучение работников пищевой промышленности", "Пищевая промышленность"),
+    ("Гигиеническое обучение работников общественного питания", "Общественное питание"),
+    ("Гигиеническое обучение работников торговли", "Торговля"),
+    ("Гигиеническое обучение работников образования", "Образование"),
+    ("Гигиеническое обучение работников детских дошкольных учреждений", "Образование"),
+    ("Гигиеническое обучение медицинских работников", "Здравоохранение"),
+]
+
+
+# Последняя дата экзамена в синтетических данных; записи охватывают пять лет до неё
+DATA_ANCHOR = date(2025, 1, 1)
+
+
+def log(message):
+    print(message, file=sys.stderr, flush=True)
+
+
+# ----------------- ДАННЫЕ -------------------
+
+
+def generate_database(app_module, size, seed):
+    """Заполняет пустую БД size записями об обучении (и ~size/3 слушателями)."""
+    rnd = random.Random(seed)
+    # Соединение с функциями ИС, которые могут понадобиться триггерам
+    con = app_module.sqlite_connect(app_module.db_path)
+    con.execute("PRAGMA synchronous = OFF")
+
+    con.executemany(
+        "INSERT INTO programs (name, category, theory_hours, exam_hours) "
+        "VALUES (?, ?, ?, ?)",
+        [(name, category, 10, 2) for name, category in PROGRAMS],
+    )
+    program_ids = [row[0] for row in con.execute("SELECT id FROM programs")]
+
+    participants_count = max(1, size // 3)
+    rows = []
+    for i in range(participants_count):
+        female = rnd.random() < 0.6
+        surname = rnd.choice(SURNAMES) + ("а" if female else "")
+        first = rnd.choice(FIRST_NAMES)[female]
+        patronymic = rnd.choice(PATRONYMICS)[female]
+        birth = date(1960, 1, 1) + timedelta(days=rnd.randint(0, 365 * 45))
+        iin = f"{birth.strftime('%y%m%d')}{rnd.randint(0, 999999):06d}"
+        rows.append((
+            iin,
+            f"{surname} {first} {patronymic}",
+            birth.isoformat(),
+            "Ж" if female else "М",
+            f"ЛМК-{rnd.randint(10000, 99999)}",
+            rnd.choice(WORKPLACES),
+            rnd.choice(POSITIONS),
+            rnd.choice(ACTIVITIES),
+        ))
+        if len(rows) >= 10000:
+            _insert_participants(con, rows)
+            rows = []
+    _insert_participants(con, rows)
+
+    # Правила оценки читаются из БД один раз, а не на каждую строку
+    with app_module.app.app_context():
+        policies = app_module.load_scoring_policies()
+
+    first_exam = DATA_ANCHOR - timedelta(days=365 * 5)
+    rows = []
+    for i in range(size):
+        exam_date = first_exam + timedelta(days=rnd.randint(0, 365 * 5))
+        questions_total = rnd.choice((10, 20, 30))
+        correct_answers = rnd.randint(questions_total // 2, questions_total)
+        participant_id = rnd.randint(1, participants_count)
+        program_id = rnd.choice(program_ids)
+        exam_percent, exam_result, next_exam_date = app_module.compute_exam_result(
+            questions_total, correct_answers, exam_date, program_id, policies
+        )
+        rows.append((
+            participant_id,
+            program_id,
+            (exam_date - timedelta(days=5)).isoformat(),
+            (exam_date - timedelta(days=1)).isoformat(),
+            exam_date.isoformat(),
+            questions_total,
+            correct_answers,
+            exam_percent,
+            exam_result,
+            next_exam_date.isoformat() if next_exam_date else None,
+            f"{exam_date.isoformat()} 09:00:00",
+        ))
+        if len(rows) >= 10000:
+            _insert_trainings(con, rows)
+            rows = []
+    _insert_trainings(con, rows)
+
+    # Контрольные коды считаются так же, как при записи через ИС
+    with app_module.app.app_context():
+        with app_module.db.engine.begin() as conn:
+            app_module.fill_control_hashes(conn)
+
+    con.execute("ANALYZE")
+    con.commit()
+    con.close()
+
+
+def _insert_participants(con, rows):
+    con.executemany(
+        "INSERT INTO participants (iin, full_name, birth_date, sex, lmk_number, "
+        "workplace, position, activity_type) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+    con.commit()
+
+
+def _insert_trainings(con, rows):
+    con.executemany(
+        "INSERT INTO trainings (participant_id, program_id, training_start_date, "
+        "training_end_date, exam_date, questions_total, correct_answers, "
+        "exam_percent, exam_result, next_exam_date, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+    con.commit()
+
+
+# ------------------ ЗАМЕРЫ ------------------
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def consume(response):
+    """Читает ответ по частям (как браузер) и возвращает его размер в байтах."""
+    size = 0
+    for chunk in response.iter_encoded():
+        size += len(chunk)
+    response.close()
+    return size
+
+
+def route_plan(app_module):
+    """
+    Список (название, метод, URL, данные формы, тяжёлая ли страница,
+    выгрузка ли это). Готовые выгрузки ИС кэширует на диске, поэтому перед
+    каждым замером выгрузки кэш очищается — иначе замерялась бы отдача файла.
+    """
+    with app_module.app.app_context():
+        db = app_module.db
+        training = db.session.execute(
+            db.select(app_module.Training)
+            .order_by(app_module.Training.exam_date.desc())
+            .limit(1)
+        ).scalar_one()
+        middle = db.session.execute(
+            db.select(app_module.Training)
+            .order_by(app_module.Training.id)
+            .offset(db.session.query(app_module.Training).count() // 2)
+            .limit(1)
+        ).scalar_one()
+        cursor = app_module.make_cursor(middle)
+        surname = training.participant.full_name.split()[0]
+        training_form = {
+            "participant_id": training.participant_id,
+            "program_id": training.program_id,
+            "training_start_date": "",
+            "training_end_date": "",
+            "exam_date": training.exam_date.isoformat(),
+            "questions_total": training.questions_total,
+            "correct_answers": training.correct_answers,
+        }
+        participant_form = {
+            "full_name": "Тестов Тест Тестович",
+            "iin": "",
+            "birth_date": "1990-01-01",
+            "sex": "М",
+        }
+        training_id = training.id
+        participant_id = training.participant_id
+
+    # Окно «Очередного экзамена» привязано к DATA_ANCHOR, а не к сегодняшнему
+    # дню: иначе со временем оно смещалось бы к концу данных и пустело
+    overdue_days = min(
+        (date.today() - DATA_ANCHOR).days + app_module.DUE_OVERDUE_DAYS,
+        app_module.DUE_MAX_DAYS,
+    )
+
+    return [
+        ("GET /trainings", "GET", "/trainings", None, False, False),
+        ("GET /trainings (середина)", "GET", f"/trainings?after={cursor}", None, False, False),
+        ("GET /trainings?q=", "GET", f"/trainings?q={surname}", None, False, False),
+        ("GET /participants", "GET", "/participants", None, True, False),
+        ("GET /participants?q=", "GET", f"/participants?q={surname}", None, False, False),
+        ("GET /programs", "GET", "/programs", None, False, False),
+        ("GET /journal", "GET", "/journal", None, True, False),
+        ("GET /journal/excel", "GET", "/journal/excel", None, True, True),
+        ("GET /due", "GET", f"/due?overdue_days={overdue_days}", None, False, False),
+        ("GET /certificate/<id>", "GET", f"/certificate/{training_id}", None, False, False),
+        ("GET /trainings/new", "GET", "/trainings/new", None, False, False),
+        ("GET /trainings/edit/<id>", "GET", f"/trainings/edit/{training_id}", None, False, False),
+        ("GET /participants/edit/<id>", "GET", f"/participants/edit/{participant_id}", None, False, False),
+        ("POST /trainings/new", "POST", "/trainings/new", training_form, False, False),
+        ("POST /trainings/edit/<id>", "POST", f"/trainings/edit/{training_id}", training_form, False, False),
+        ("POST /participants/new", "POST", "/participants/new", participant_form, False, False),
+    ]
+
+
+def run_generate(args):
+    # Импорт после того, как HYGIENE_DB задан родительским процессом
+    import app as app_module
+
+    app_module.init_db()
+    log(f"  генерация БД на {args.size} записей…")
+    started = time.perf_counter()
+    generate_database(app_module, args.size, args.seed)
+    # Закрываем соединения: WAL переносится в файл БД, и его можно переименовать
+    with app_module.app.app_context():
+        app_module.db.engine.dispose()
+    log(f"  готово за {time.perf_counter() - started:.1f} с")
+
+
+def run_worker(args):
+    # Импорт после того, как HYGIENE_DB задан родительским процессом
+    import app as app_module
+    from sqlalchemy import event
+
+    app_module.qr_cache = app_module.QRCache(app_module.QR_CACHE_SIZE, None)
+    app_module.init_db()
+
+    statements = {"count": 0}
+
+    def count_statement(*_):
+        statements["count"] += 1
+
+    with app_module.app.app_context():
+        event.listen(app_module.db.engine, "before_cursor_execute", count_statement)
+
+    client = app_module.app.test_client()
+    results = {}
+
+    def drop_export_cache():
+        shutil.rmtree(app_module.EXPORT_CACHE_DIR, ignore_errors=True)
+
+    for name, method, url, data, heavy, export in route_plan(app_module):
+        repeat = max(1, args.repeat // 5) if heavy else args.repeat
+        log(f"  {name}: {repeat} раз")
+
+        # Прогрев (кэши SQLite, шаблоны, ленивые импорты)
+        consume(client.open(url, method=method, data=data))
+
+        latencies = []
+        sql_counts = []
+        status = None
+        size = 0
+        for _ in range(repeat):
+            if export:
+                drop_export_cache()
+            statements["count"] = 0
+            started = time.perf_counter()
+            response = client.open(url, method=method, data=data)
+            size = consume(response)
+            latencies.append((time.perf_counter() - started) * 1000)
+            sql_counts.append(statements["count"])
+            status = response.status_code
+
+        # Память — отдельным запросом: tracemalloc заметно замедляет работу
+        if export:
+            drop_export_cache()
+        tracemalloc.start()
+        consume(client.open(url, method=method, data=data))
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        latencies.sort()
+        results[name] = {
+            "status": status,
+            "requests": repeat,
+            "response_bytes": size,
+            "latency_ms": {
+                "p50": round(percentile(latencies, 50), 2),
+                "p90": round(percentile(latencies, 90), 2),
+                "p99": round(percentile(latencies, 99), 2),
+                "max": round(latencies[-1], 2),
+                "mean": round(statistics.mean(latencies), 2),
+            },
+            "sql_statements": max(sql_counts),
+            "peak_memory_kb": round(peak / 1024, 1),
+        }
+
+    print(json.dumps(results, ensure_ascii=False))
+
+
+def remove_database(path):
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def copy_database(source, target):
+    """Копия БД через backup API: вместе с тем, что ещё лежит в WAL."""
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(target)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+
+
+def run_size(args, size, db_dir):
+    # Дата отсчёта — в имени: БД, построенная от другой даты, не подхватится
+    name = f"bench-{size}-{args.seed}-{DATA_ANCHOR:%Y%m%d}"
+    db_file = os.path.join(db_dir, f"{name}.db")
+    # Журналы, кэши и выгрузки ИС — рядом с БД замера, а не в папке программы
+    env = dict(os.environ, HYGIENE_DATA_DIR=os.path.join(db_dir, name))
+    command = [
+        sys.executable, os.path.abspath(__file__),
+        "--size", str(size), "--repeat", str(args.repeat), "--seed", str(args.seed),
+    ]
+
+    if not os.path.exists(db_file):
+        # БД строится во временном файле и переименовывается только после
+        # успешной генерации: прерванный запуск не оставит недописанную БД,
+        # которую следующий принял бы за готовую
+        partial = f"{db_file}.partial"
+        remove_database(partial)
+        try:
+            subprocess.run(
+                command + ["--generate"], env=dict(env, HYGIENE_DB=partial), check=True
+            )
+            os.replace(partial, db_file)
+        finally:
+            remove_database(partial)
+
+    # Замеры пишут в БД (POST-запросы), поэтому каждый запуск получает
+    # свежую копию готовой БД, а сама она остаётся неизменной
+    run_file = os.path.join(db_dir, f"{name}-run.db")
+    remove_database(run_file)
+    copy_database(db_file, run_file)
+    try:
+        completed = subprocess.run(
+            command + ["--worker"], env=dict(env, HYGIENE_DB=run_file),
+            stdout=subprocess.PIPE, text=True, check=True,
+        )
+    finally:
+        remove_database(run_file)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def print_table(size, results):
+    print(f"\n{size} записей")
+    print(f"  {'страница':<32} {'p50, мс':>9} {'p90, мс':>9} {'p99, мс':>9} {'SQL':>6} {'память, КБ':>11}")
+    for name, r in results.items():
+        lat = r["latency_ms"]
+        print(
+            f"  {name:<32} {lat['p50']:>9} {lat['p90']:>9} {lat['p99']:>9} "
+            f"{r['sql_statements']:>6} {r['peak_memory_kb']:>11}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замеры ИС на синтетических данных")
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1000, 100000],
+        help="размеры БД (число записей об обучении)",
+    )
+    parser.add_argument("--repeat", type=int, default=20, help="запросов на страницу")
+    parser.add_argument("--seed", type=int, default=2025, help="зерно генератора данных")
+    parser.add_argument(
+        "--db-dir", default=os.path.join(tempfile.gettempdir(), "hygiene-bench"),
+        help="где хранить сгенерированные БД",
+    )
+    parser.add_argument("--out", default="bench_results.json", help="файл результатов")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--generate", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.generate:
+        run_generate(args)
+        return
+    if args.worker:
+        run_worker(args)
+        return
+
+    os.makedirs(args.db_dir, exist_ok=True)
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "seed": args.seed,
+        "sizes": {},
+    }
+    for size in args.sizes:
+        log(f"Размер {size}:")
+        results = run_size(args, size, args.db_dir)
+        report["sizes"][str(size)] = results
+        print_table(size, results)
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nРезультаты сохранены в {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Общие фикстуры тестов. Каждый тест работает с новой БД во временной папке
+данных (HYGIENE_DATA_DIR), поэтому файлы программы не затрагиваются.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+from datetime import date
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = tempfile.mkdtemp(prefix="hygiene-tests-")
+
+os.environ["HYGIENE_DATA_DIR"] = DATA_DIR
+os.environ.pop("HYGIENE_DB", None)
+sys.path.insert(0, ROOT)
+
+import app as hygiene  # noqa: E402
+
+# Журналы открыты обработчиками logging на всё время тестов
+KEEP_FILES = {"error.log", "slow.log"}
+
+
+def reset_data_dir():
+    with hygiene.app.app_context():
+        hygiene.db.session.remove()
+        hygiene.db.engine.dispose()
+    for name in os.listdir(DATA_DIR):
+        if name in KEEP_FILES:
+            continue
+        path = os.path.join(DATA_DIR, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+
+
+@pytest.fixture(autouse=True)
+def database():
+    """Пустая БД с актуальной схемой."""
+    reset_data_dir()
+    hygiene._db_ready = False
+    hygiene.init_db()
+    yield hygiene
+    with hygiene.app.app_context():
+        hygiene.db.session.remove()
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def ctx():
+    with hygiene.app.app_context():
+        yield hygiene.db.session
+
+
+@pytest.fixture
+def client():
+    return hygiene.app.test_client()
+
+
+@pytest.fixture
+def add_program(ctx):
+    def add(name="Общая программа", **values):
+        program = hygiene.Program(name=name, **values)
+        ctx.add(program)
+        ctx.commit()
+        return program
+    return add
+
+
+@pytest.fixture
+def add_participant(ctx):
+    def add(full_name="Иванов Иван", **values):
+        participant = hygiene.Participant(full_name=full_name, **values)
+        ctx.add(participant)
+        ctx.commit()
+        return participant
+    return add
+
+
+@pytest.fixture
+def add_training(ctx):
+    def add(participant, program, exam_date=date(2025, 3, 1), questions_total=10,
+            correct_answers=9, **values):
+        exam_percent, exam_result, next_exam_date = hygiene.compute_exam_result(
+            questions_total, correct_answers, exam_date, program.id
+        )
+        # values может и заменить рассчитанные поля
+        training = hygiene.Training(**dict(
+            dict(
+                participant_id=participant.id,
+                program_id=program.id,
+                exam_date=exam_date,
+                questions_total=questions_total,
+                correct_answers=correct_answers,
+                exam_percent=exam_percent,
+                exam_result=exam_result,
+                next_exam_date=next_exam_date,
+            ),
+            **values,
+        ))
+        ctx.add(training)
+        ctx.commit()
+        return training
+    return add
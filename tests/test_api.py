@@ -0,0 +1,80 @@
+import json
+from datetime import date, timedelta
+
+import pytest
+
+ENDPOINTS = ["/api/trainings", "/api/trainings.ndjson", "/api/participants", "/api/participants.ndjson"]
+
+
+@pytest.fixture
+def trainings(add_program, add_participant, add_training):
+    program = add_program()
+    rows = []
+    for i in range(12):
+        participant = add_participant(f"Слушатель {i:02d}", iin=f"{900000000000 + i}")
+        # По две записи на дату: порядок внутри даты задаёт ID
+        rows.append(add_training(participant, program, exam_date=date(2025, 1, 1) + timedelta(days=i // 2)))
+    return [t.id for t in rows]
+
+
+def walk(client, url, **params):
+    ids, after = [], None
+    while True:
+        query = dict(params, fields="id", limit=5)
+        if after:
+            query["after"] = after
+        response = client.get(url, query_string=query)
+        assert response.status_code == 200
+        page = response.get_json()
+        ids.extend(item["id"] for item in page["items"])
+        after = page["next_cursor"]
+        if after is None:
+            return ids
+
+
+def ndjson_ids(client, url, **params):
+    response = client.get(url, query_string=dict(params, fields="id"))
+    assert response.status_code == 200
+    return [json.loads(line)["id"] for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_training_pages_cover_all_rows_once(client, trainings):
+    assert walk(client, "/api/trainings") == trainings
+    assert ndjson_ids(client, "/api/trainings.ndjson") == trainings
+    assert walk(client, "/api/trainings", date_from="2025-01-03", date_to="2025-01-04") == trainings[4:8]
+
+
+def test_participant_pages_and_filters(client, trainings):
+    assert len(walk(client, "/api/participants")) == 12
+    assert len(ndjson_ids(client, "/api/participants.ndjson", date_from="2025-01-06")) == 2
+    assert len(walk(client, "/api/participants", iin="900000000003")) == 1
+
+
+def test_fields_are_selected(client, trainings):
+    item = client.get("/api/trainings", query_string={"fields": "id,participant_name"}).get_json()["items"][0]
+    assert item == {"id": trainings[0], "participant_name": "Слушатель 00"}
+
+
+@pytest.mark.parametrize("url", ENDPOINTS)
+@pytest.mark.parametrize("params", [
+    {"fields": "id,nonexistent"},
+    {"fields": ","},
+    {"date_from": "2025-02-30"},
+    {"date_to": "01.01.2025"},
+    {"program_id": "первая"},
+    {"after": "x.y"},
+])
+def test_bad_arguments_are_rejected(client, url, params):
+    response = client.get(url, query_string=params)
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+@pytest.mark.parametrize("url", ["/api/trainings", "/api/participants"])
+def test_bad_limit_is_rejected(client, url):
+    assert client.get(url, query_string={"limit": "много"}).status_code == 400
+
+
+def test_bad_participant_id_is_rejected(client):
+    response = client.get("/api/trainings", query_string={"participant_id": "1.5"})
+    assert response.status_code == 400
@@ -0,0 +1,47 @@
+import sqlite3
+from datetime import date
+
+import pytest
+
+from conftest import hygiene
+
+
+@pytest.fixture
+def archived(ctx, add_program, add_participant, add_training):
+    """Обучение 2019 года, код которого записан в обход ИС и потому пуст."""
+    training = add_training(add_participant(), add_program(), exam_date=date(2019, 6, 1))
+    training_id, expected = training.id, hygiene.generate_control_hash(training)
+    con = sqlite3.connect(hygiene.db_path)
+    with con:
+        con.execute("UPDATE trainings SET control_hash = NULL")
+    con.close()
+    assert hygiene.archive_year(2019) == 1
+    ctx.expire_all()
+    return training_id, expected
+
+
+def test_archive_keeps_control_hash(ctx, client, archived):
+    training_id, code = archived
+    assert hygiene.Training.query.count() == 0
+    found = hygiene.find_by_control_hashes([code])
+    assert found[code].id == training_id and found[code].archive_year == 2019
+
+    html = client.post("/verify", data={"codes": code}).get_data(as_text=True)
+    assert "Подлинное" in html
+    assert f"/archive/2019/certificate/{training_id}" in html
+
+
+def test_archived_certificate_is_served(client, archived):
+    training_id, code = archived
+    response = client.get(f"/certificate/{training_id}")
+    assert response.status_code == 302
+    assert response.headers["Location"].endswith(f"/archive/2019/certificate/{training_id}")
+
+    html = client.get(f"/archive/2019/certificate/{training_id}").get_data(as_text=True)
+    assert "Иванов Иван" in html
+    assert client.get(f"/archive/2019/certificate/{training_id + 1}").status_code == 404
+    assert client.get(f"/archive/2018/certificate/{training_id}").status_code == 404
+
+
+def test_archive_keeps_stats(ctx, archived):
+    assert ctx.execute(hygiene.db.text("SELECT sum(total) FROM training_stats")).scalar() == 1
@@ -0,0 +1,61 @@
+import gzip
+import os
+import sqlite3
+
+import pytest
+
+from conftest import hygiene
+
+
+def program_names():
+    return [p.name for p in hygiene.Program.query.order_by(hygiene.Program.id)]
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_backup_is_consistent_copy(ctx, add_program, tmp_path, compress):
+    add_program("Программа в копии")
+    path = hygiene.backup_database(str(tmp_path), compress=compress)
+    assert path.endswith(".db.gz" if compress else ".db")
+
+    copy_path = path
+    if compress:
+        copy_path = str(tmp_path / "copy.db")
+        with gzip.open(path) as src, open(copy_path, "wb") as dst:
+            dst.write(src.read())
+    conn = sqlite3.connect(copy_path)
+    try:
+        assert conn.execute("PRAGMA journal_mode").fetchone() == ("delete",)
+        assert conn.execute("SELECT name FROM programs").fetchall() == [("Программа в копии",)]
+    finally:
+        conn.close()
+    assert not os.path.exists(copy_path + "-wal")
+
+
+def test_old_backups_are_rotated(ctx, tmp_path):
+    paths = [hygiene.backup_database(str(tmp_path), keep=2) for _ in range(3)]
+    assert sorted(hygiene.list_backups(str(tmp_path))) == sorted(paths[1:])
+
+
+def test_restore(ctx, client, add_program):
+    add_program("До копии")
+    backup = hygiene.backup_database()
+    add_program("После копии")
+    etag = client.get("/programs").headers["ETag"]
+
+    hygiene.restore_database(backup)
+    assert program_names() == ["До копии"]
+    # Перед восстановлением сохранено текущее состояние
+    assert any("-before-restore" in path for path in hygiene.list_backups())
+    # Браузер не получит 304 на старую страницу
+    response = client.get("/programs", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+
+
+def test_corrupt_backup_is_rejected(ctx, add_program, tmp_path):
+    add_program("Текущая программа")
+    broken = tmp_path / "hygiene-broken.db"
+    broken.write_bytes(b"SQLite format 3\x00" + b"\xff" * 4096)
+
+    with pytest.raises((ValueError, sqlite3.DatabaseError)):
+        hygiene.restore_database(str(broken))
+    assert program_names() == ["Текущая программа"]
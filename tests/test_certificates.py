@@ -0,0 +1,28 @@
+from datetime import date
+
+import pytest
+
+
+def test_batch_filters_by_dates(client, add_program, add_participant, add_training):
+    program = add_program()
+    add_training(add_participant("Иванов Иван"), program, exam_date=date(2025, 3, 1))
+    add_training(add_participant("Петров Пётр"), program, exam_date=date(2025, 5, 1))
+
+    response = client.get(
+        "/certificates/batch", query_string={"date_from": "2025-02-01", "date_to": "2025-03-31"}
+    )
+    assert response.status_code == 200
+    html = response.get_data(as_text=True)
+    assert "Иванов Иван" in html
+    assert "Петров Пётр" not in html
+
+
+@pytest.mark.parametrize("name", ["date_from", "date_to"])
+@pytest.mark.parametrize("value", ["2025-02-30", "01.03.2025", "вчера"])
+def test_batch_bad_date_is_rejected(client, name, value):
+    assert client.get("/certificates/batch", query_string={name: value}).status_code == 400
+
+
+@pytest.mark.parametrize("name", ["program_id", "id_from", "id_to"])
+def test_batch_bad_number_is_rejected(client, name):
+    assert client.get("/certificates/batch", query_string={name: "пять"}).status_code == 400
@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+from conftest import hygiene
+
+
+@pytest.fixture
+def training(add_program, add_participant, add_training):
+    return add_training(add_participant(), add_program())
+
+
+@pytest.mark.parametrize("url", ["/trainings", "/journal", "/journal/excel"])
+def test_unchanged_page_is_not_rebuilt(client, training, url):
+    first = client.get(url)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert first.headers["Last-Modified"]
+
+    again = client.get(url, headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.get_data() == b""
+    again = client.get(url, headers={"If-Modified-Since": first.headers["Last-Modified"]})
+    assert again.status_code == 304
+
+
+def test_change_invalidates_etag(ctx, client, training):
+    url = f"/certificate/{training.id}"
+    etag = client.get(url).headers["ETag"]
+
+    training.correct_answers = 8
+    ctx.commit()
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_etag_depends_on_query(client, training):
+    assert (
+        client.get("/trainings").headers["ETag"]
+        != client.get("/trainings?page_size=50").headers["ETag"]
+    )
+
+
+def test_excel_is_served_from_cache(ctx, client, training, monkeypatch):
+    first = client.get("/journal/excel").get_data()
+    cached = os.listdir(hygiene.EXPORT_CACHE_DIR)
+    assert len(cached) == 1
+
+    def not_rebuilt(*args):
+        raise AssertionError("выгрузка построена заново")
+
+    monkeypatch.setattr(hygiene, "build_excel", not_rebuilt)
+    assert client.get("/journal/excel").get_data() == first
+
+    # После изменения данных файл строится заново, а старый удаляется
+    monkeypatch.undo()
+    training.participant.full_name = "Петров Пётр"
+    ctx.commit()
+    assert client.get("/journal/excel").get_data() != first
+    assert len(os.listdir(hygiene.EXPORT_CACHE_DIR)) == 1
+    assert os.listdir(hygiene.EXPORT_CACHE_DIR) != cached
@@ -0,0 +1,79 @@
+import sqlite3
+from datetime import date
+
+import pytest
+
+from conftest import hygiene
+
+
+def stored_hash(session, training_id):
+    return session.execute(
+        hygiene.db.text("SELECT control_hash FROM trainings WHERE id = :id"),
+        {"id": training_id},
+    ).scalar()
+
+
+def expected_hash(session, training_id):
+    session.expire_all()
+    return hygiene.generate_control_hash(session.get(hygiene.Training, training_id))
+
+
+@pytest.fixture
+def training(add_program, add_participant, add_training):
+    return add_training(add_participant(), add_program())
+
+
+def test_hash_on_insert(ctx, training):
+    assert stored_hash(ctx, training.id) == expected_hash(ctx, training.id)
+
+
+def test_hash_follows_training_update(ctx, training):
+    training.exam_date = date(2025, 4, 2)
+    ctx.commit()
+    assert stored_hash(ctx, training.id) == expected_hash(ctx, training.id)
+
+
+def test_hash_follows_participant_rename(ctx, training):
+    old = stored_hash(ctx, training.id)
+    training.participant.full_name = "Петров Пётр"
+    ctx.commit()
+    assert stored_hash(ctx, training.id) != old
+    assert stored_hash(ctx, training.id) == expected_hash(ctx, training.id)
+
+
+def test_plain_sqlite_writer(ctx, training):
+    # Сторонняя программа без функций ИС: запись не должна падать
+    ctx.commit()
+    con = sqlite3.connect(hygiene.db_path)
+    with con:
+        con.execute(
+            "UPDATE participants SET full_name = 'Сидоров Сидор' WHERE id = ?",
+            (training.participant_id,),
+        )
+        cursor = con.execute(
+            "INSERT INTO trainings (participant_id, program_id, exam_date, "
+            "questions_total, correct_answers, exam_percent, exam_result) "
+            "SELECT participant_id, program_id, '2025-05-05', 10, 10, 100, 'Положительный' "
+            "FROM trainings WHERE id = ?",
+            (training.id,),
+        )
+    new_id = cursor.lastrowid
+    con.close()
+
+    assert stored_hash(ctx, new_id) is None
+    found = hygiene.find_by_control_hashes([expected_hash(ctx, new_id)])
+    assert [t.id for t in found.values()] == [new_id]
+    assert stored_hash(ctx, training.id) == expected_hash(ctx, training.id)
+
+
+def test_api_returns_hash_of_externally_written_row(ctx, client, training):
+    con = sqlite3.connect(hygiene.db_path)
+    with con:
+        con.execute(
+            "UPDATE trainings SET exam_result = 'Отрицательный' WHERE id = ?", (training.id,)
+        )
+    con.close()
+    assert stored_hash(ctx, training.id) is None
+
+    item = client.get("/api/trainings", query_string={"fields": "id,control_hash"}).get_json()["items"][0]
+    assert item["control_hash"] == expected_hash(ctx, training.id)
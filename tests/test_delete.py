@@ -0,0 +1,38 @@
+import pytest
+
+from conftest import hygiene
+
+
+@pytest.fixture
+def trainings(add_program, add_participant, add_training):
+    program = add_program()
+    ivanov, petrov = add_participant(), add_participant(full_name="Петров Пётр")
+    return [add_training(ivanov, program), add_training(ivanov, program),
+            add_training(petrov, program)]
+
+
+def test_bulk_delete_trainings(ctx, client, trainings):
+    ids = [trainings[0].id, trainings[2].id]
+    response = client.post("/trainings/delete", data={"ids": ids, "next": "/trainings?q=x&page=2"})
+    assert response.status_code == 302
+    assert response.headers["Location"] == "/trainings?q=x&page=2"
+    ctx.expire_all()
+    assert [t.id for t in hygiene.Training.query] == [trainings[1].id]
+
+
+def test_bulk_delete_participants_cascades(ctx, client, trainings):
+    ivanov_id = trainings[0].participant_id
+    client.post("/participants/delete", data={"ids": [ivanov_id]})
+    ctx.expire_all()
+    assert hygiene.db.session.get(hygiene.Participant, ivanov_id) is None
+    assert [t.id for t in hygiene.Training.query] == [trainings[2].id]
+    assert ctx.execute(hygiene.db.text("SELECT sum(total) FROM training_stats")).scalar() == 1
+
+
+@pytest.mark.parametrize("next_url", [
+    "https://evil.example/", "//evil.example", "/\\evil.example", "\\\\evil.example",
+    "/\t/evil.example", "javascript:alert(1)", "trainings",
+])
+def test_bulk_delete_redirects_only_to_own_pages(client, next_url):
+    response = client.post("/programs/delete", data={"next": next_url})
+    assert response.headers["Location"] == "/programs"
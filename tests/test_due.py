@@ -0,0 +1,26 @@
+from datetime import date, timedelta
+
+import pytest
+
+
+def test_due_window(client, add_program, add_participant, add_training):
+    program = add_program()
+    today = date.today()
+    add_training(add_participant("Скоро Экзамен"), program, next_exam_date=today + timedelta(days=10))
+    add_training(add_participant("Не Скоро"), program, next_exam_date=today + timedelta(days=200))
+
+    html = client.get("/due", query_string={"days_ahead": 30}).get_data(as_text=True)
+    assert "Скоро Экзамен" in html
+    assert "Не Скоро" not in html
+
+
+@pytest.mark.parametrize("url, method", [
+    ("/due", "get"), ("/due/excel", "get"), ("/due/excel/job", "post"),
+])
+@pytest.mark.parametrize("params", [{"days_ahead": "месяц"}, {"overdue_days": "1.5"}])
+def test_bad_window_is_rejected(client, url, method, params):
+    if method == "get":
+        response = client.get(url, query_string=params)
+    else:
+        response = client.post(url, data=params)
+    assert response.status_code == 400
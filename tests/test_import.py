@@ -0,0 +1,77 @@
+import io
+from datetime import date
+
+import pytest
+
+from conftest import hygiene
+
+
+@pytest.fixture
+def import_row(ctx, add_program):
+    program = add_program()
+
+    def parse(**values):
+        record = dict(
+            full_name="Иванов Иван", program=program.name, exam_date="2025-03-01",
+            questions_total=10, correct_answers=9,
+        )
+        record.update(values)
+        return hygiene.parse_import_record(
+            record, {program.name.lower(): program.id}, hygiene.load_scoring_policies()
+        )
+    return parse
+
+
+def test_zero_questions_accepted_like_the_form(import_row, client, add_participant):
+    _, training = import_row(questions_total=0, correct_answers=0)
+    assert training["exam_percent"] == 0.0
+    assert training["exam_result"] == "Отрицательный"
+
+    # Форма обучения принимает то же значение
+    participant = add_participant()
+    response = client.post("/trainings/new", data={
+        "participant_id": participant.id,
+        "program_id": training["program_id"],
+        "exam_date": "2025-03-01",
+        "questions_total": 0,
+        "correct_answers": 0,
+    })
+    assert response.status_code == 302
+    assert hygiene.Training.query.one().exam_date == date(2025, 3, 1)
+
+
+@pytest.mark.parametrize("values", [
+    {"questions_total": 10, "correct_answers": 11},
+    {"questions_total": -1},
+    {"correct_answers": "девять"},
+])
+def test_bad_numbers_rejected(import_row, values):
+    with pytest.raises(hygiene.ImportRowError):
+        import_row(**values)
+
+
+def post_file(client, name, content):
+    return client.post(
+        "/import", data={"file": (io.BytesIO(content), name)},
+        content_type="multipart/form-data",
+    )
+
+
+def test_cp1251_csv_is_imported(ctx, client, add_program):
+    program = add_program()
+    text = (
+        "ФИО;Программа;Дата экзамена;Всего вопросов;Правильных ответов\r\n"
+        f"Сидоров Сидор;{program.name};01.03.2025;10;9\r\n"
+    )
+    response = post_file(client, "журнал.csv", text.encode("cp1251"))
+    assert response.status_code == 200
+    assert hygiene.Participant.query.one().full_name == "Сидоров Сидор"
+    assert hygiene.Training.query.one().exam_date == date(2025, 3, 1)
+
+
+@pytest.mark.parametrize("content", [b"not a zip file", b"PK\x03\x04broken"])
+def test_corrupt_xlsx_is_reported(ctx, client, content):
+    response = post_file(client, "журнал.xlsx", content)
+    assert response.status_code == 200
+    assert "Импорт не выполнен" in response.get_data(as_text=True)
+    assert hygiene.Training.query.count() == 0
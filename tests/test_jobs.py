@@ -0,0 +1,86 @@
+import os
+import time
+from datetime import datetime, timedelta
+from io import BytesIO
+
+import pytest
+
+from conftest import hygiene
+
+
+def wait_for(client, job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while True:
+        state = client.get(f"/jobs/{job_id}.json").get_json()
+        if state["status"] in ("done", "failed") or time.monotonic() > deadline:
+            return state
+        time.sleep(0.05)
+
+
+def test_journal_export_job(client, add_program, add_participant, add_training):
+    from openpyxl import load_workbook
+
+    program = add_program()
+    add_training(add_participant("Первый Слушатель"), program)
+    add_training(add_participant("Второй Слушатель"), program)
+
+    response = client.post("/journal/excel/job", data={"date_from": "2025-01-01"})
+    assert response.status_code == 302
+    job_id = int(response.headers["Location"].rsplit("/", 1)[1])
+
+    state = wait_for(client, job_id)
+    assert state["status"] == "done"
+    assert (state["progress"], state["total"]) == (2, 2)
+
+    download = client.get(state["download_url"])
+    assert download.status_code == 200
+    ws = load_workbook(BytesIO(download.get_data())).active
+    assert [row[1].value for row in ws.iter_rows(min_row=2)] == [
+        "Первый Слушатель", "Второй Слушатель",
+    ]
+
+
+def test_failed_job_keeps_error(ctx, client, monkeypatch):
+    def broken(progress):
+        raise RuntimeError("нет места на диске")
+
+    monkeypatch.setitem(hygiene.JOB_KINDS, "broken", ("Сломанная выгрузка", broken))
+    job_id = hygiene.submit_job("broken")
+
+    state = wait_for(client, job_id)
+    assert state["status"] == "failed"
+    assert state["error"] == "нет места на диске"
+    assert state["download_url"] is None
+    assert client.get(f"/jobs/{job_id}/download").status_code == 404
+
+
+def add_job(ctx, **values):
+    job = hygiene.Job(kind="journal_excel", **values)
+    ctx.add(job)
+    ctx.commit()
+    return job.id
+
+
+def test_old_jobs_are_cleaned_up(ctx):
+    old = datetime.utcnow() - hygiene.JOB_MAX_AGE - timedelta(minutes=1)
+    add_job(ctx, status="done", file_name="job-old.xlsx", created_at=old)
+    fresh_id = add_job(ctx, status="done", file_name="job-fresh.xlsx")
+
+    os.makedirs(hygiene.EXPORTS_DIR, exist_ok=True)
+    for name in ("job-old.xlsx", "job-fresh.xlsx"):
+        open(os.path.join(hygiene.EXPORTS_DIR, name), "wb").close()
+    stamp = old.timestamp()
+    os.utime(os.path.join(hygiene.EXPORTS_DIR, "job-old.xlsx"), (stamp, stamp))
+
+    hygiene.cleanup_jobs()
+    assert [job.id for job in hygiene.Job.query] == [fresh_id]
+    assert os.listdir(hygiene.EXPORTS_DIR) == ["job-fresh.xlsx"]
+
+
+@pytest.mark.parametrize("status", ["queued", "running"])
+def test_interrupted_jobs_fail_on_restart(ctx, status):
+    job_id = add_job(ctx, status=status)
+    hygiene.fail_interrupted_jobs()
+    ctx.expire_all()
+    job = ctx.get(hygiene.Job, job_id)
+    assert job.status == "failed" and job.error
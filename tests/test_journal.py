@@ -0,0 +1,82 @@
+from datetime import date, timedelta
+from io import BytesIO
+
+import pytest
+
+from conftest import hygiene
+
+
+def test_journal_is_streamed(client, add_program, add_participant, add_training):
+    program = add_program()
+    for i in range(30):
+        add_training(add_participant(f"Слушатель {i:02d}"), program,
+                     exam_date=date(2025, 1, 1) + timedelta(days=i))
+
+    response = client.get("/journal")
+    assert response.status_code == 200
+    assert response.is_streamed
+    html = response.get_data(as_text=True)
+    positions = [html.index(f"Слушатель {i:02d}") for i in range(30)]
+    assert positions == sorted(positions)
+    assert html.rstrip().endswith("</html>")
+
+
+@pytest.mark.parametrize("url", ["/journal", "/journal/excel"])
+@pytest.mark.parametrize("name", ["date_from", "date_to"])
+def test_bad_period_is_rejected(client, url, name):
+    assert client.get(url, query_string={name: "2025-02-30"}).status_code == 400
+
+
+def test_bad_period_is_rejected_for_excel_job(client):
+    response = client.post("/journal/excel/job", data={"date_from": "31.12.2024"})
+    assert response.status_code == 400
+
+
+def test_period_includes_archive(client, add_program, add_participant, add_training):
+    program = add_program()
+    add_training(add_participant("Архивный Слушатель"), program, exam_date=date(2019, 5, 1))
+    add_training(add_participant("Текущий Слушатель"), program, exam_date=date(2025, 5, 1))
+    hygiene.archive_year(2019)
+
+    html = client.get(
+        "/journal", query_string={"date_from": "2019-01-01", "date_to": "2025-12-31"}
+    ).get_data(as_text=True)
+    assert "Архивный Слушатель" in html and "Текущий Слушатель" in html
+    html = client.get("/journal", query_string={"date_from": "2025-01-01"}).get_data(as_text=True)
+    assert "Архивный Слушатель" not in html
+
+
+def test_build_excel_sizes_columns_in_one_pass():
+    from openpyxl import load_workbook
+
+    rows = iter([[1, "Короткое"], [2, "Значительно более длинное значение"], [3, None]])
+    with hygiene.build_excel("Лист", ["№", "Текст"], rows) as stream:
+        wb = load_workbook(BytesIO(stream.read()))
+    ws = wb["Лист"]
+    assert [[c.value for c in row] for row in ws.iter_rows()] == [
+        ["№", "Текст"], [1, "Короткое"], [2, "Значительно более длинное значение"], [3, None],
+    ]
+    assert ws.column_dimensions["A"].width == len("№") + 2
+    assert ws.column_dimensions["B"].width == len("Значительно более длинное значение") + 2
+
+
+def test_journal_excel_rows(client, add_program, add_participant, add_training):
+    from openpyxl import load_workbook
+
+    program = add_program()
+    add_training(add_participant("Второй Слушатель", workplace="Столовая", position="повар"),
+                 program, exam_date=date(2025, 2, 1),
+                 training_start_date=date(2025, 1, 27), training_end_date=date(2025, 1, 31))
+    add_training(add_participant("Первый Слушатель"), program, exam_date=date(2025, 1, 1),
+                 correct_answers=5)
+
+    response = client.get("/journal/excel")
+    assert response.status_code == 200
+    ws = load_workbook(BytesIO(response.get_data())).active
+    rows = [[c.value for c in row] for row in ws.iter_rows()]
+    assert rows[0] == hygiene.JOURNAL_HEADERS
+    assert rows[1:] == [
+        [1, "Первый Слушатель", None, None, "01.01.2025", "Отрицательный (50.0 %)", None],
+        [2, "Второй Слушатель", "Столовая, повар", "27.01.2025 – 31.01.2025",
+         "01.02.2025", "Положительный (90.0 %)", "01.02.2026"],
+    ]
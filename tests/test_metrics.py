@@ -0,0 +1,25 @@
+import pytest
+from flask import g
+from sqlalchemy.exc import OperationalError
+
+from conftest import hygiene
+
+
+def test_failed_statement_does_not_skew_timing(ctx):
+    g.request_metrics = hygiene.RequestMetrics()
+    ctx.execute(hygiene.db.text("SELECT 1"))
+    with pytest.raises(OperationalError):
+        ctx.execute(hygiene.db.text("SELECT * FROM no_such_table"))
+    ctx.rollback()
+    ctx.execute(hygiene.db.text("SELECT 2"))
+
+    statements = [statement for _, statement in g.request_metrics.statements]
+    assert statements == ["SELECT 1", "SELECT 2"]
+    assert all(seconds >= 0 for seconds, _ in g.request_metrics.statements)
+
+
+def test_request_metrics_are_exported(client, add_program):
+    add_program()
+    assert client.get("/programs").status_code == 200
+    text = client.get("/metrics").get_data(as_text=True)
+    assert 'hygiene_sql_statements_total{endpoint="list_programs"}' in text
@@ -0,0 +1,145 @@
+import gzip
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+from conftest import hygiene, reset_data_dir
+
+# Схема и данные hygiene.db, созданной первой версией программы
+BASELINE_SCHEMA = [
+    "CREATE TABLE programs ("
+    "id INTEGER NOT NULL, name VARCHAR(255) NOT NULL, category VARCHAR(255), "
+    "theory_hours INTEGER, exam_hours INTEGER, PRIMARY KEY (id))",
+    "CREATE TABLE participants ("
+    "id INTEGER NOT NULL, iin VARCHAR(12), full_name VARCHAR(255) NOT NULL, "
+    "birth_date DATE, sex VARCHAR(10), lmk_number VARCHAR(100), "
+    "workplace VARCHAR(255), position VARCHAR(255), activity_type VARCHAR(255), "
+    "PRIMARY KEY (id))",
+    "CREATE TABLE trainings ("
+    "id INTEGER NOT NULL, participant_id INTEGER NOT NULL, program_id INTEGER NOT NULL, "
+    "training_start_date DATE, training_end_date DATE, exam_date DATE NOT NULL, "
+    "questions_total INTEGER NOT NULL, correct_answers INTEGER NOT NULL, "
+    "exam_percent FLOAT NOT NULL, exam_result VARCHAR(50) NOT NULL, "
+    "next_exam_date DATE, created_at DATETIME, PRIMARY KEY (id), "
+    "FOREIGN KEY(participant_id) REFERENCES participants (id), "
+    "FOREIGN KEY(program_id) REFERENCES programs (id))",
+    "INSERT INTO programs VALUES (1, 'Общая программа', NULL, 10, 2)",
+    "INSERT INTO participants VALUES "
+    "(1, '900101300001', 'Иванов Иван', '1990-01-01', 'М', NULL, 'Столовая', NULL, NULL), "
+    "(2, NULL, 'Петрова Анна', NULL, 'Ж', NULL, 'Магазин', NULL, NULL)",
+    "INSERT INTO trainings VALUES "
+    "(1, 1, 1, NULL, NULL, '2024-03-01', 10, 9, 90.0, 'Положительный', '2025-03-01', "
+    "'2024-03-01 10:00:00.000000'), "
+    "(2, 1, 1, NULL, NULL, '2025-03-01', 10, 5, 50.0, 'Отрицательный', NULL, NULL), "
+    "(3, 2, 1, NULL, NULL, '2025-04-01', 20, 20, 100.0, 'Положительный', '2026-04-01', NULL)",
+]
+
+
+def open_baseline(extra=()):
+    """Записывает БД первой версии (и строки extra) и открывает её текущей версией."""
+    reset_data_dir()
+    conn = sqlite3.connect(hygiene.db_path)
+    with conn:
+        for sql in [*BASELINE_SCHEMA, *extra]:
+            conn.execute(sql)
+    conn.close()
+    hygiene._db_ready = False
+    hygiene.init_db()
+
+
+@pytest.fixture
+def upgraded():
+    """Рабочая БД первой версии, открытая текущей версией программы."""
+    open_baseline()
+    with hygiene.app.app_context():
+        yield hygiene.db.session
+
+
+def scalar(session, sql):
+    return session.execute(hygiene.db.text(sql)).scalar()
+
+
+def test_schema_reaches_latest_version(upgraded):
+    assert scalar(upgraded, "PRAGMA user_version") == len(hygiene.MIGRATIONS)
+    triggers = {
+        row[0] for row in upgraded.execute(
+            hygiene.db.text("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+        )
+    }
+    for name in ("participants_fts_ai", "training_stats_ai", "trainings_sync_ai",
+                 "trainings_control_hash_au", "participants_control_hash_au"):
+        assert name in triggers
+    # Триггеры не должны требовать функций, которых нет у других программ
+    assert "trainings_control_hash_ai" not in triggers
+    assert scalar(upgraded, "PRAGMA foreign_key_check") is None
+
+
+def test_existing_rows_are_backfilled(upgraded):
+    trainings = hygiene.Training.query.order_by(hygiene.Training.id).all()
+    assert len(trainings) == 3
+    for t in trainings:
+        assert t.control_hash == hygiene.generate_control_hash(t)
+        assert t.uuid and t.updated_at and t.sync_seq
+    assert scalar(upgraded, "SELECT count(*) FROM participants WHERE uuid IS NULL") == 0
+    assert scalar(upgraded, "SELECT sum(total) FROM training_stats") == 3
+    assert scalar(
+        upgraded, "SELECT count(*) FROM participants_fts WHERE participants_fts MATCH 'петрова'"
+    ) == 1
+    assert scalar(
+        upgraded, "SELECT pass_threshold FROM scoring_policies WHERE program_id IS NULL"
+    ) == hygiene.DEFAULT_PASS_THRESHOLD
+
+
+def test_deleting_participant_cascades(upgraded):
+    upgraded.execute(hygiene.db.text("DELETE FROM participants WHERE id = 1"))
+    upgraded.commit()
+    assert scalar(upgraded, "SELECT count(*) FROM trainings") == 1
+    assert scalar(upgraded, "SELECT sum(total) FROM training_stats") == 1
+
+
+def test_old_control_hash_triggers_are_replaced(upgraded):
+    # БД, обновлённая до версии 8 прежними шагами: триггер вызывает control_hash()
+    upgraded.execute(hygiene.db.text(
+        "CREATE TRIGGER trainings_control_hash_ai AFTER INSERT ON trainings BEGIN "
+        "UPDATE trainings SET control_hash = control_hash(NEW.id, '', NEW.exam_date, "
+        "NEW.exam_result) WHERE id = NEW.id; END"
+    ))
+    upgraded.execute(hygiene.db.text("PRAGMA user_version = 8"))
+    upgraded.commit()
+    hygiene.upgrade_schema()
+
+    assert scalar(upgraded, "PRAGMA user_version") == len(hygiene.MIGRATIONS)
+    conn = sqlite3.connect(hygiene.db_path)
+    with conn:
+        conn.execute(
+            "INSERT INTO trainings (participant_id, program_id, exam_date, questions_total, "
+            "correct_answers, exam_percent, exam_result) "
+            "VALUES (2, 1, '2025-06-01', 10, 10, 100.0, 'Положительный')"
+        )
+    conn.close()
+
+
+def test_orphan_rows_are_backed_up(ctx):
+    # Первая версия не включала foreign_keys: обучение удалённого слушателя осталось
+    open_baseline([
+        "INSERT INTO trainings VALUES "
+        "(4, 99, 1, NULL, NULL, '2025-05-01', 10, 9, 90.0, 'Положительный', NULL, NULL)",
+    ])
+    assert scalar(ctx, "SELECT count(*) FROM trainings") == 3
+    assert scalar(ctx, "PRAGMA foreign_key_check") is None
+
+    # В копии — БД до удаления, вместе с осиротевшей строкой
+    backups = hygiene.list_backups()
+    assert len(backups) == 1 and "-orphans" in backups[0]
+    copy_path = os.path.join(hygiene.DATA_DIR, "copy.db")
+    with gzip.open(backups[0]) as src, open(copy_path, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    conn = sqlite3.connect(copy_path)
+    assert conn.execute("SELECT count(*) FROM trainings WHERE participant_id = 99").fetchone() == (1,)
+    conn.close()
+
+
+def test_clean_database_is_not_backed_up(upgraded):
+    assert hygiene.list_backups() == []
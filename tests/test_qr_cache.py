@@ -0,0 +1,52 @@
+import base64
+
+import pytest
+
+from conftest import hygiene
+
+
+@pytest.fixture
+def generated(monkeypatch):
+    """Строки, для которых QR-код строился заново."""
+    calls = []
+
+    def fake_qr(data):
+        calls.append(data)
+        return base64.b64encode(data.encode()).decode()
+
+    monkeypatch.setattr(hygiene, "generate_qr_base64", fake_qr)
+    return calls
+
+
+def test_lru_eviction(generated):
+    cache = hygiene.QRCache(2)
+    for data in ("a", "b", "a", "c", "a", "b"):
+        cache.get_or_create(data)
+    # «b» вытеснен «c», а «a» использовался недавно и остался
+    assert generated == ["a", "b", "c", "b"]
+
+
+def test_disk_cache_survives_restart(generated, tmp_path):
+    first = hygiene.QRCache(2, str(tmp_path))
+    image = first.get_or_create("a")
+
+    second = hygiene.QRCache(2, str(tmp_path))
+    assert second.get_or_create("a") == image
+    assert generated == ["a"]
+
+
+def test_certificate_reuses_qr_until_data_changes(ctx, client, generated, tmp_path,
+                                                  monkeypatch, add_program,
+                                                  add_participant, add_training):
+    monkeypatch.setattr(hygiene, "qr_cache", hygiene.QRCache(8, str(tmp_path)))
+    training = add_training(add_participant(), add_program())
+
+    for _ in range(3):
+        assert client.get(f"/certificate/{training.id}").status_code == 200
+    assert len(generated) == 1
+
+    training.participant.full_name = "Петров Пётр"
+    ctx.commit()
+    assert client.get(f"/certificate/{training.id}").status_code == 200
+    assert len(generated) == 2
+    assert "Петров Пётр" in generated[1]
@@ -0,0 +1,66 @@
+from datetime import date
+
+import pytest
+
+from conftest import hygiene
+
+EXAM_DATES = [date(2024, 1, 31), date(2024, 2, 29), date(2023, 8, 31), date(2025, 3, 15)]
+
+
+@pytest.fixture
+def trainings(ctx, add_program, add_participant, add_training):
+    strict, general = add_program("Строгая"), add_program("Общая")
+    participant = add_participant()
+    rows = []
+    for i, exam_date in enumerate(EXAM_DATES):
+        for program in (strict, general):
+            for correct in (6, 7, 9):
+                rows.append(add_training(participant, program, exam_date=exam_date,
+                                         questions_total=10 + i, correct_answers=correct))
+    return strict, general, rows
+
+
+def set_policy(ctx, program_id, threshold, months):
+    policy = hygiene.ScoringPolicy.query.filter_by(program_id=program_id).first()
+    if policy is None:
+        policy = hygiene.ScoringPolicy(program_id=program_id)
+        ctx.add(policy)
+    policy.pass_threshold, policy.validity_months = threshold, months
+    ctx.commit()
+
+
+def test_sql_recompute_matches_python(ctx, trainings):
+    strict, _, rows = trainings
+    set_policy(ctx, None, 60.0, 6)
+    set_policy(ctx, strict.id, 75.0, 13)
+
+    changed = hygiene.recompute_results()
+    assert changed > 0
+
+    policies = hygiene.load_scoring_policies()
+    ctx.expire_all()
+    for t in rows:
+        t = ctx.get(hygiene.Training, t.id)
+        assert (t.exam_percent, t.exam_result, t.next_exam_date) == hygiene.compute_exam_result(
+            t.questions_total, t.correct_answers, t.exam_date, t.program_id, policies
+        )
+        assert t.exam_percent == hygiene.calc_exam_percent(t.questions_total, t.correct_answers)
+        # Пересчёт идёт мимо сессии, код свидетельства должен быть досчитан
+        assert t.control_hash == hygiene.generate_control_hash(t)
+
+    # Повторный пересчёт ничего не меняет
+    assert hygiene.recompute_results() == 0
+
+
+def test_month_end_dates(ctx, trainings):
+    _, general, _ = trainings
+    set_policy(ctx, None, 50.0, 1)
+    hygiene.recompute_results(program_id=general.id)
+    ctx.expire_all()
+    next_dates = {
+        t.exam_date: t.next_exam_date
+        for t in hygiene.Training.query.filter_by(program_id=general.id)
+    }
+    assert next_dates[date(2024, 1, 31)] == date(2024, 2, 29)
+    assert next_dates[date(2024, 2, 29)] == date(2024, 3, 29)
+    assert next_dates[date(2023, 8, 31)] == date(2023, 9, 30)
@@ -0,0 +1,57 @@
+import pytest
+
+from conftest import hygiene
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Иванов", '"Иванов"*'),
+    ("  иван   ст ", '"иван"* "ст"*'),
+    ('ТОО "Береке"', '"ТОО"* "Береке"*'),
+    ("*-- ()", None),
+    ("", None),
+])
+def test_fts_query(text, expected):
+    assert hygiene.fts_query(text) == expected
+
+
+def found(text):
+    match = hygiene.fts_query(text)
+    return [p.full_name for p in hygiene.search_participants(match, 10)]
+
+
+@pytest.fixture
+def people(add_participant):
+    return [
+        add_participant("Иванов Иван", workplace="Столовая № 5"),
+        add_participant("Иванова Мария", iin="900101400001"),
+        add_participant("Петров Пётр", position="повар"),
+    ]
+
+
+def test_prefix_search_over_all_fields(ctx, people):
+    assert sorted(found("иван")) == ["Иванов Иван", "Иванова Мария"]
+    assert found("ивановА") == ["Иванова Мария"]
+    assert found("9001014") == ["Иванова Мария"]
+    assert found("столов") == ["Иванов Иван"]
+    assert found("пов") == ["Петров Пётр"]
+    assert found("иван мар") == ["Иванова Мария"]
+
+
+def test_index_follows_changes(ctx, people):
+    ivanov, ivanova, _ = people
+    ivanov.full_name = "Сидоров Сидор"
+    ctx.delete(ivanova)
+    ctx.commit()
+    assert found("иван") == []
+    assert found("сидор") == ["Сидоров Сидор"]
+
+
+def test_pages_are_filtered(client, people, add_program, add_training):
+    program = add_program()
+    for p in people:
+        add_training(p, program)
+
+    html = client.get("/participants", query_string={"q": "петр"}).get_data(as_text=True)
+    assert "Петров Пётр" in html and "Иванов Иван" not in html
+    html = client.get("/trainings", query_string={"q": "иванова"}).get_data(as_text=True)
+    assert "Иванова Мария" in html and "Петров Пётр" not in html
@@ -0,0 +1,79 @@
+import threading
+import urllib.request
+
+import pytest
+
+from conftest import hygiene
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(wsgi_app, **options):
+        server = hygiene.PooledWSGIServer("127.0.0.1", 0, wsgi_app, **options)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def fetch(url):
+    with urllib.request.urlopen(url, timeout=10) as response:
+        return response.status, response.read().decode("utf-8")
+
+
+def test_slow_request_does_not_block_others(serve):
+    release = threading.Event()
+
+    def wsgi_app(environ, start_response):
+        if environ["PATH_INFO"] == "/slow":
+            release.wait(10)
+        start_response("200 OK", [("Content-Type", "text/plain")])
+        return [environ["PATH_INFO"].encode()]
+
+    url = serve(wsgi_app, threads=2)
+    slow = threading.Thread(target=fetch, args=(url + "/slow",))
+    slow.start()
+    try:
+        # Ответ приходит, пока первый запрос ещё занимает свой поток
+        assert fetch(url + "/fast") == (200, "/fast")
+        assert slow.is_alive()
+    finally:
+        release.set()
+        slow.join()
+
+
+def test_serves_the_application(serve, add_program):
+    add_program("Программа для сервера")
+    url = serve(hygiene.app, threads=4)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(fetch(url + "/programs")))
+        for _ in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(results) == 8
+    assert all(status == 200 and "Программа для сервера" in html for status, html in results)
+
+
+def test_headless_arguments():
+    args = hygiene.parse_args(
+        ["--headless", "--host", "0.0.0.0", "--port", "8080",
+         "--threads", "16", "--queue-size", "128"]
+    )
+    assert (args.headless, args.host, args.port, args.threads, args.queue_size) == (
+        True, "0.0.0.0", 8080, 16, 128,
+    )
+    defaults = hygiene.parse_args([])
+    assert not defaults.headless
+    assert (defaults.threads, defaults.queue_size) == (
+        hygiene.SERVER_THREADS, hygiene.SERVER_QUEUE_SIZE,
+    )
@@ -0,0 +1,36 @@
+import sqlite3
+
+from conftest import hygiene
+
+
+def pragma(session, name):
+    return session.execute(hygiene.db.text(f"PRAGMA {name}")).scalar()
+
+
+def test_connection_profile(ctx):
+    assert pragma(ctx, "journal_mode") == "wal"
+    assert pragma(ctx, "synchronous") == 1          # NORMAL
+    assert pragma(ctx, "foreign_keys") == 1
+    assert pragma(ctx, "busy_timeout") == 5000
+    assert pragma(ctx, "temp_store") == 2           # MEMORY
+    assert pragma(ctx, "cache_size") == -16000
+
+
+def test_pool_is_sized_for_server_threads(ctx):
+    assert hygiene.db.engine.pool.size() >= hygiene.SERVER_THREADS
+
+
+def test_readers_are_not_blocked_by_writer(ctx, add_program):
+    add_program()
+    writer = sqlite3.connect(hygiene.db_path)
+    try:
+        writer.execute("BEGIN IMMEDIATE")
+        writer.execute("INSERT INTO programs (name) VALUES ('Новая программа')")
+
+        # Незавершённая запись не мешает читать и не видна читателям
+        hygiene.db.session.remove()
+        names = [p.name for p in hygiene.Program.query.order_by(hygiene.Program.id)]
+        assert names == ["Общая программа"]
+    finally:
+        writer.rollback()
+        writer.close()
@@ -0,0 +1,42 @@
+import json
+import os
+import subprocess
+import sys
+
+from conftest import ROOT, hygiene
+
+IMPORT_CHECK = """
+import json, os, sys
+import app
+print(json.dumps({
+    "modules": sorted(m for m in ("tkinter", "qrcode", "PIL", "openpyxl") if m in sys.modules),
+    "db_exists": os.path.exists(app.db_path),
+    "timings": [label for label, _ in app.STARTUP_TIMINGS],
+}))
+"""
+
+
+def test_import_is_lazy(tmp_path):
+    env = dict(os.environ, HYGIENE_DATA_DIR=str(tmp_path))
+    env.pop("HYGIENE_DB", None)
+    completed = subprocess.run(
+        [sys.executable, "-c", IMPORT_CHECK], cwd=ROOT, env=env,
+        stdout=subprocess.PIPE, text=True, check=True,
+    )
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    # Тяжёлые библиотеки и схема БД — только по требованию
+    assert result["modules"] == []
+    assert not result["db_exists"]
+    assert result["timings"] == ["импорт модулей", "инициализация приложения"]
+
+
+def test_startup_report(capsys, monkeypatch):
+    t0 = hygiene.STARTUP_T0
+    monkeypatch.setattr(hygiene, "STARTUP_TIMINGS", [("импорт модулей", t0 + 0.25),
+                                                     ("проверка схемы БД", t0 + 0.5)])
+    hygiene.print_startup_report()
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0] == "Время запуска:"
+    assert lines[1].split() == ["импорт", "модулей", "250.0", "мс"]
+    assert lines[2].split() == ["проверка", "схемы", "БД", "250.0", "мс"]
+    assert lines[3].split() == ["итого", "500.0", "мс"]
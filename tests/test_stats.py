@@ -0,0 +1,74 @@
+from collections import defaultdict
+from datetime import date
+
+import pytest
+
+from conftest import hygiene
+
+
+def summary(session):
+    rows = session.execute(hygiene.db.text(
+        "SELECT month, program_id, workplace, total, passed, percent_sum "
+        "FROM training_stats WHERE total <> 0"
+    ))
+    return {
+        (month, program_id, workplace): (total, passed, round(percent_sum, 3))
+        for month, program_id, workplace, total, passed, percent_sum in rows
+    }
+
+
+def expected_summary(session):
+    """Та же сводка, посчитанная в Python по самим обучениям."""
+    groups = defaultdict(lambda: [0, 0, 0.0])
+    for t in session.query(hygiene.Training).all():
+        key = (t.exam_date.strftime("%Y-%m"), t.program_id, t.participant.workplace or "")
+        groups[key][0] += 1
+        groups[key][1] += t.exam_result == "Положительный"
+        groups[key][2] += t.exam_percent
+    return {key: (total, passed, round(s, 3)) for key, (total, passed, s) in groups.items()}
+
+
+def test_summary_follows_changes(ctx, add_program, add_participant, add_training):
+    first, second = add_program("Первая"), add_program("Вторая")
+    cook = add_participant("Иванов Иван", workplace="Столовая")
+    seller = add_participant("Петров Пётр", workplace="Магазин")
+    trainings = [
+        add_training(cook, first, exam_date=date(2025, 1, 10)),
+        add_training(cook, second, exam_date=date(2025, 1, 20), correct_answers=5),
+        add_training(seller, first, exam_date=date(2025, 2, 5)),
+        add_training(seller, first, exam_date=date(2025, 2, 6), correct_answers=10),
+    ]
+    assert summary(ctx) == expected_summary(ctx)
+
+    trainings[0].exam_date = date(2025, 3, 1)
+    trainings[1].program_id = first.id
+    trainings[2].exam_percent, trainings[2].exam_result = 50.0, "Отрицательный"
+    ctx.commit()
+    assert summary(ctx) == expected_summary(ctx)
+
+    seller.workplace = "Рынок"
+    ctx.commit()
+    assert summary(ctx) == expected_summary(ctx)
+
+    ctx.delete(trainings[3])
+    ctx.commit()
+    ctx.delete(cook)
+    ctx.commit()
+    ctx.expire_all()
+    assert summary(ctx) == expected_summary(ctx)
+
+
+def test_stats_page_filters_by_month(client, add_program, add_participant, add_training):
+    program, participant = add_program(), add_participant()
+    add_training(participant, program, exam_date=date(2025, 3, 1))
+    add_training(participant, program, exam_date=date(2025, 5, 1))
+
+    html = client.get("/stats", query_string={"month_from": "2025-3", "month_to": "2025-03"}).get_data(as_text=True)
+    assert "2025-03" in html
+    assert "2025-05" not in html
+
+
+@pytest.mark.parametrize("name", ["month_from", "month_to"])
+@pytest.mark.parametrize("value", ["2025-13", "март", "2025-03-01"])
+def test_bad_month_is_rejected(client, name, value):
+    assert client.get("/stats", query_string={name: value}).status_code == 400
@@ -0,0 +1,38 @@
+import pytest
+
+
+def labels(client, url, **params):
+    response = client.get(url, query_string=params)
+    assert response.status_code == 200
+    return sorted(item["label"] for item in response.get_json())
+
+
+@pytest.fixture
+def programs(add_program):
+    for name in ("Скидка 100% персоналу", "Скидка 1000 руб", "Курс_А", "КурсБА", "Путь C:\\temp"):
+        add_program(name)
+
+
+@pytest.mark.parametrize("q, expected", [
+    ("100%", ["Скидка 100% персоналу"]),
+    ("с_", ["Курс_А"]),
+    ("%", ["Скидка 100% персоналу"]),
+    ("C:\\", ["Путь C:\\temp"]),
+    ("курс", ["Курс_А", "КурсБА"]),
+])
+def test_program_suggest_treats_wildcards_literally(client, programs, q, expected):
+    assert labels(client, "/api/programs/suggest", q=q) == expected
+
+
+def test_participant_suggest_by_name_and_iin(client, add_participant):
+    add_participant("Иванов Иван", iin="900101300001")
+    add_participant("Петров Пётр", iin="850202400002")
+    assert [item["label"].split(",")[0] for item in client.get(
+        "/api/participants/suggest", query_string={"q": "9001"}).get_json()] == ["Иванов Иван"]
+    assert len(client.get("/api/participants/suggest", query_string={"q": "Петров"}).get_json()) == 1
+
+
+@pytest.mark.parametrize("url", ["/api/participants/suggest", "/api/programs/suggest"])
+@pytest.mark.parametrize("limit", ["десять", "1e3"])
+def test_bad_limit_is_rejected(client, url, limit):
+    assert client.get(url, query_string={"q": "ив", "limit": limit}).status_code == 400
@@ -0,0 +1,164 @@
+import gzip
+import json
+from datetime import date
+
+import pytest
+
+from conftest import hygiene
+
+OTHER_SITE = "f" * 32
+
+
+def export(peer="Филиал", full=False, peer_site_id=None):
+    data, _ = hygiene.sync_export(peer, full=full, peer_site_id=peer_site_id)
+    return json.loads(gzip.decompress(data))
+
+
+def from_other_site(package):
+    return dict(package, site_id=OTHER_SITE)
+
+
+def journal_ids(year):
+    return [t.id for t in hygiene.journal_trainings(date(year, 1, 1), date(year, 12, 31))]
+
+
+@pytest.fixture
+def archived(ctx, add_program, add_participant, add_training):
+    """Обучение 2019 года, выгруженное полным пакетом и затем перенесённое в архив."""
+    training = add_training(add_participant(), add_program(), exam_date=date(2019, 6, 1))
+    training_uuid, participant_uuid = training.uuid, training.participant.uuid
+    package = export(full=True)
+    assert hygiene.archive_year(2019) == 1
+    ctx.expire_all()
+    return package, training_uuid, participant_uuid
+
+
+def test_archived_rows_are_not_reimported(ctx, archived):
+    package, _, _ = archived
+    stats, errors = hygiene.sync_import(from_other_site(package))
+
+    assert errors == []
+    assert stats["trainings"]["inserted"] == 0
+    assert stats["participants"]["inserted"] == 0
+    assert hygiene.Training.query.count() == 0
+    assert len(journal_ids(2019)) == 1
+
+
+def test_archived_rows_are_exported_as_markers(ctx, archived):
+    _, training_uuid, participant_uuid = archived
+    package = export()
+    assert sorted(map(tuple, package["archived"])) == sorted([
+        ("participants", participant_uuid), ("trainings", training_uuid),
+    ])
+    # Следующий пакет уже без них
+    assert export()["archived"] == []
+
+
+def test_archive_markers_block_third_party_copies(ctx, archived):
+    package, training_uuid, _ = archived
+    markers = export()
+    ctx.execute(hygiene.db.text("DELETE FROM sync_archived"))
+    ctx.commit()
+
+    # Маркеры пришли раньше, чем копия записи от третьей установки
+    hygiene.sync_import(dict(markers, site_id="e" * 32, tables={}))
+    stats, _ = hygiene.sync_import(from_other_site(package))
+    assert stats["trainings"]["inserted"] == 0
+    assert hygiene.Training.query.filter_by(uuid=training_uuid).count() == 0
+
+
+def package_from_other_site():
+    stamp = "2025-01-01 00:00:00.000"
+    return {
+        "format": hygiene.SYNC_FORMAT,
+        "version": hygiene.SYNC_FORMAT_VERSION,
+        "site_id": OTHER_SITE,
+        "until": 3,
+        "tables": {
+            "programs": {
+                "columns": ["uuid", "updated_at", "name"],
+                "rows": [["a" * 32, stamp, "Программа филиала"]],
+            },
+            "participants": {
+                "columns": ["uuid", "updated_at", "full_name", "iin"],
+                "rows": [["b" * 32, stamp, "Петров Пётр", "900101300000"]],
+            },
+            "trainings": {
+                "columns": ["uuid", "updated_at", "participant_id", "program_id",
+                            "exam_date", "questions_total", "correct_answers",
+                            "exam_percent", "exam_result"],
+                "rows": [["c" * 32, stamp, "b" * 32, "a" * 32, "2025-02-03",
+                          10, 10, 100.0, "Положительный"]],
+            },
+        },
+        "tombstones": [["trainings", "d" * 32, stamp]],
+    }
+
+
+def exported_uuids(package):
+    return sorted(
+        [row[0] for t in package["tables"].values() for row in t["rows"]]
+        + [uuid for _, uuid, _ in package["tombstones"]]
+    )
+
+
+def test_imported_changes_are_not_echoed(ctx):
+    stats, errors = hygiene.sync_import(package_from_other_site())
+    assert errors == []
+    assert stats["trainings"]["inserted"] == 1
+
+    assert exported_uuids(export("Филиал", peer_site_id=OTHER_SITE)) == []
+    # Третьей установке пакет передаёт их дальше
+    assert exported_uuids(export("Центр")) == ["a" * 32, "b" * 32, "c" * 32, "d" * 32]
+
+    # Изменение, сделанное здесь, получает и источник; ID установки запомнен
+    ctx.execute(hygiene.db.text("UPDATE trainings SET correct_answers = 9"))
+    ctx.commit()
+    assert exported_uuids(export("Филиал")) == ["c" * 32]
+
+
+def test_export_for_unknown_site_is_rejected(client):
+    response = client.post("/sync/export", data={"peer": "Филиал", "site_id": OTHER_SITE})
+    assert response.status_code == 400
+
+
+def tracking(session, table, row_id):
+    return session.execute(
+        hygiene.db.text(f"SELECT uuid, updated_at, sync_seq FROM {table} WHERE id = :id"),
+        {"id": row_id},
+    ).one()
+
+
+def site_seq():
+    return hygiene.sync_site()[1]
+
+
+def test_sync_columns_follow_changes(ctx, add_program, add_participant, add_training):
+    program, participant = add_program(), add_participant()
+    training = add_training(participant, program)
+    uuid, updated_at, seq = tracking(ctx, "trainings", training.id)
+    assert len(uuid) == 32 and int(uuid, 16) >= 0
+    assert seq == site_seq()
+
+    # Изменение данных: новый номер и время, тот же UUID
+    training.correct_answers = 8
+    ctx.commit()
+    uuid2, updated_at2, seq2 = tracking(ctx, "trainings", training.id)
+    assert (uuid2, seq2) == (uuid, site_seq())
+    assert seq2 > seq and updated_at2 >= updated_at
+
+    # Служебные колонки (код свидетельства) изменением не считаются
+    participant_seq = tracking(ctx, "participants", participant.id).sync_seq
+    participant.full_name = "Сидоров Сидор"
+    ctx.commit()
+    assert tracking(ctx, "trainings", training.id).sync_seq == seq2
+    assert tracking(ctx, "participants", participant.id).sync_seq > participant_seq
+
+    # Удаление оставляет надгробие со следующим номером
+    ctx.delete(training)
+    ctx.commit()
+    tombstone = ctx.execute(hygiene.db.text(
+        "SELECT table_name, sync_seq FROM sync_tombstones WHERE uuid = :uuid"
+    ), {"uuid": uuid}).one()
+    assert tombstone == ("trainings", site_seq())
+    assert [uuid] == [row[1] for row in export("Филиал")["tombstones"]]
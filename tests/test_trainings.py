@@ -0,0 +1,67 @@
+import re
+from datetime import date, timedelta
+
+import pytest
+
+PAGE_SIZE = 25
+
+
+def page(client, **params):
+    response = client.get("/trainings", query_string=dict(params, page_size=PAGE_SIZE))
+    assert response.status_code == 200
+    html = response.get_data(as_text=True)
+    ids = [int(i) for i in re.findall(r'name="ids" value="(\d+)"', html)]
+    # Курсоры — из ссылок «Старше»/«Новее» (не из скрытого поля next)
+    after = re.search(r'href="[^"]*after=([\d-]+\.\d+)', html)
+    before = re.search(r'href="[^"]*before=([\d-]+\.\d+)', html)
+    return ids, after and after.group(1), before and before.group(1)
+
+
+@pytest.fixture
+def trainings(ctx, add_program, add_participant, add_training):
+    program = add_program()
+    participant = add_participant()
+    # По три обучения на дату: порядок внутри даты задаёт ID
+    rows = [
+        add_training(participant, program, exam_date=date(2025, 1, 1) + timedelta(days=i // 3))
+        for i in range(60)
+    ]
+    return [t.id for t in sorted(rows, key=lambda t: (t.exam_date, t.id), reverse=True)]
+
+
+def test_keyset_pages_forward_and_back(client, trainings):
+    pages = []
+    ids, after, before = page(client)
+    assert before is None
+    pages.append(ids)
+    while after:
+        ids, after, before = page(client, after=after)
+        pages.append(ids)
+
+    assert [len(p) for p in pages] == [25, 25, 10]
+    assert sum(pages, []) == trainings
+
+    # Назад с последней страницы — те же страницы в обратном порядке
+    ids, _, before = page(client, before=before)
+    assert ids == pages[1]
+    ids, _, before = page(client, before=before)
+    assert ids == pages[0]
+    assert before is None
+
+
+@pytest.mark.parametrize("name", ["after", "before"])
+@pytest.mark.parametrize("value", ["bad", "2025-13-01.5", "2025-01-01.x"])
+def test_bad_cursor_is_rejected(client, name, value):
+    assert client.get("/trainings", query_string={name: value}).status_code == 400
+
+
+def test_page_size(client, trainings):
+    ids, _, _ = page(client)
+    assert len(ids) == PAGE_SIZE
+    # Размер не из списка — размер по умолчанию, а не ошибка
+    response = client.get("/trainings", query_string={"page_size": 7})
+    assert response.status_code == 200
+
+
+def test_bad_page_size_is_rejected(client):
+    assert client.get("/trainings", query_string={"page_size": "все"}).status_code == 400